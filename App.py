@@ -1,10 +1,12 @@
 import csv
-import pandas as pd
 
-from YF import returns_of_12_minus_1_months
+from YF import backtests_for, trading_calendar
 from Strategy import Strategy_M_12_minus_1 as Strategy1
 from CLI import println, br
+import Trace
+from RunStore import backtest
 from DateUtil import to_string, nearest_friday_of, past_month_dates, date_from
+from Checkpoint import checkpoint_file
 
 def read_nse_index(file_path):
     values = []
@@ -21,6 +23,7 @@ def read_nse_index(file_path):
     return values
 
 if __name__ == "__main__":
+    Trace.enable_from_env()
     
     # Get stocks from NSE 500 - DONE!
     download_folder = "/Users/akhil/Downloads/"
@@ -29,19 +32,28 @@ if __name__ == "__main__":
     nifty_50 = f"{download_folder}ind_nifty50list.csv"
     tickers = read_nse_index(nifty_50)
     
+    # Past memberships come from snapshots recorded with Constituents.py, without
+    # any the current file is used for every date
+    index_name = "NIFTY 50"
+    
     # Backtest
     
     # Get dates of past 12 months
     testing_date = date_from("2025-06-28")
-    lookback_dates = past_month_dates(testing_date, 12)  
+    lookback_dates = past_month_dates(testing_date, 12, trading_calendar())  
 
     # For each date in the past month, create a list of stocks ranked by momentum score of past 12-1 months
-    backtests = []
-    for (i, target_date) in enumerate(lookback_dates[:1]):
-        # Function to fetch 12 months data for each stock in the list and rank them according to returns
-        backtests.append(returns_of_12_minus_1_months(tickers, target_date))
+    # Fetch 12 months data for each stock once and score every date in one pass
+    backtests = backtests_for(tickers, lookback_dates[:1], index_name=index_name)
     br("=")
     print("Back testing Strategy.... ")
-    Strategy1(backtests).run()
+    Strategy1(backtests).run(checkpoint=checkpoint_file("strategy"))
+    
+    # Weights engine run of the same window, kept in the run store and served
+    # from it when nothing changed
+    run = backtest(tickers, lookback_dates[0], testing_date, index_name=index_name)
+    println(f"Run {run.key[:12]}: {run.metrics}")
     print("\nDone! ")
-    br("=")
\ No newline at end of file
+    br("=")
+    if Trace.enabled:
+        Trace.print_summary()
\ No newline at end of file
@@ -0,0 +1,160 @@
+import numpy as np
+
+# Array backed portfolio engine.
+#
+# Positions are columns indexed by ticker id (the column of the ticker in the price
+# panel) instead of a dict of Holding objects, and every fill goes to a Tradebook
+# backed by a preallocated structured array. No state is shared between instances,
+# so many portfolios can run side by side in one process.
+
+FILL_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("ticker", np.int32),
+    ("qty", np.float64),            # positive buys, negative sells
+    ("price", np.float64),
+    ("realized_pnl", np.float64),
+])
+
+class Tradebook:
+
+    def __init__(self, chunk_size=4096):
+        self.chunk_size = chunk_size
+        self.fills = np.zeros(chunk_size, dtype=FILL_DTYPE)
+        self.size = 0
+
+    def append(self, date, tickers, qty, price, realized_pnl):
+        n = len(tickers)
+        if n == 0:
+            return
+        self._reserve(n)
+        rows = self.fills[self.size:self.size + n]
+        rows["date"] = np.datetime64(date, "D")
+        rows["ticker"] = tickers
+        rows["qty"] = qty
+        rows["price"] = price
+        rows["realized_pnl"] = realized_pnl
+        self.size += n
+
+    # Append fills that are already in FILL_DTYPE records
+    def extend(self, records):
+        self._reserve(len(records))
+        self.fills[self.size:self.size + len(records)] = records
+        self.size += len(records)
+
+    def _reserve(self, n):
+        if self.size + n > len(self.fills):
+            chunks = -(-(self.size + n) // self.chunk_size)
+            grown = np.zeros(chunks * self.chunk_size, dtype=FILL_DTYPE)
+            grown[:self.size] = self.fills[:self.size]
+            self.fills = grown
+
+    def records(self):
+        return self.fills[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return f"Tradebook(Fills: {self.size})"
+
+    def __repr__(self):
+        return str(self)
+
+
+class ArrayPortfolio:
+
+    def __init__(self, n_tickers, cash=1.0, tradebook_chunk=4096):
+        self.cash = float(cash)
+        self.qty = np.zeros(n_tickers)
+        self.cost_basis = np.zeros(n_tickers)             # average entry price per share
+        self.entry_date = np.full(n_tickers, np.datetime64("NaT"), dtype="datetime64[D]")
+        self.realized_pnl = 0.0
+        self.tradebook = Tradebook(tradebook_chunk)
+
+    def held(self):
+        return np.flatnonzero(self.qty != 0)
+
+    def market_value(self, prices):
+        return np.nansum(self.qty * prices)
+
+    def equity(self, prices):
+        return self.cash + self.market_value(prices)
+
+    def weights(self, prices):
+        equity = self.equity(prices)
+        return np.where(self.qty != 0, self.qty * prices / equity, 0.0) if equity > 0 else np.zeros_like(self.qty)
+
+    # Move to the target weights (one per ticker, summing to <= 1) at the given prices.
+    # Tickers without a price keep their current quantity.
+    def rebalance(self, target_weights, prices, date):
+        prices = np.asarray(prices, dtype=np.float64)
+        priced = np.isfinite(prices) & (prices > 0)
+        equity = self.equity(np.where(priced, prices, 0.0))
+        self.trade_to(np.where(priced, np.asarray(target_weights) * equity / np.where(priced, prices, 1.0), self.qty), prices, date)
+
+    # Move to the target quantities, every traded ticker fills at its given price
+    def trade_to(self, target_qty, prices, date):
+        prices = np.asarray(prices, dtype=np.float64)
+        delta = np.asarray(target_qty, dtype=np.float64) - self.qty
+        traded = np.flatnonzero(np.abs(delta) > 1e-12)
+        if len(traded) == 0:
+            return
+
+        delta, price, old_qty = delta[traded], prices[traded], self.qty[traded]
+        sold = np.minimum(-delta, old_qty).clip(min=0)
+        realized = sold * (price - self.cost_basis[traded])
+
+        new_qty = old_qty + delta
+        bought = delta.clip(min=0)
+        new_cost = np.where(new_qty > 0, (old_qty - sold) * self.cost_basis[traded] + bought * price, 0.0)
+        self.cost_basis[traded] = np.where(new_qty > 0, new_cost / np.where(new_qty > 0, new_qty, 1.0), 0.0)
+
+        opened = (old_qty == 0) & (new_qty != 0)
+        closed = new_qty == 0
+        self.entry_date[traded[opened]] = np.datetime64(date, "D")
+        self.entry_date[traded[closed]] = np.datetime64("NaT")
+
+        self.qty[traded] = new_qty
+        self.cash -= np.sum(delta * price)
+        self.realized_pnl += np.sum(realized)
+        self.tradebook.append(date, traded, delta, price, realized)
+
+    # Equal weight over the given ticker ids, everything else is sold
+    def rebalance_to(self, ticker_ids, prices, date):
+        weights = np.zeros_like(self.qty)
+        ticker_ids = np.asarray(ticker_ids)
+        ticker_ids = ticker_ids[ticker_ids >= 0]
+        if len(ticker_ids) > 0:
+            weights[ticker_ids] = 1.0 / len(ticker_ids)
+        self.rebalance(weights, prices, date)
+
+    # Plain lists of the positions and the fills, for checkpoints
+    def state(self):
+        fills = self.tradebook.records()
+        return {
+            "cash": self.cash,
+            "realized_pnl": self.realized_pnl,
+            "qty": self.qty.tolist(),
+            "cost_basis": self.cost_basis.tolist(),
+            "entry_date": self.entry_date.astype(str).tolist(),
+            "fills": [fills[name].astype(str).tolist() if name == "date" else fills[name].tolist() for name in FILL_DTYPE.names],
+        }
+
+    @classmethod
+    def from_state(cls, state, tradebook_chunk=4096):
+        portfolio = cls(len(state["qty"]), state["cash"], tradebook_chunk)
+        portfolio.realized_pnl = state["realized_pnl"]
+        portfolio.qty[:] = state["qty"]
+        portfolio.cost_basis[:] = state["cost_basis"]
+        portfolio.entry_date[:] = np.array(state["entry_date"], dtype="datetime64[D]")
+        fills = np.zeros(len(state["fills"][0]), dtype=FILL_DTYPE)
+        for name, values in zip(FILL_DTYPE.names, state["fills"]):
+            fills[name] = np.array(values, dtype=FILL_DTYPE[name])
+        portfolio.tradebook.extend(fills)
+        return portfolio
+
+    def __str__(self):
+        return f"ArrayPortfolio(Positions: {len(self.held())}, Cash: {self.cash}, Realized PnL: {self.realized_pnl}, Fills: {len(self.tradebook)})"
+
+    def __repr__(self):
+        return str(self)
@@ -0,0 +1,155 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import numpy as np
+
+from datetime import datetime
+
+# Benchmark suite for the backtest pipeline on synthetic NSE-like data.
+#
+#   python Bench.py                          # all sizes, report in bench_results/<commit>.json
+#   python Bench.py --tickers 50 --years 5   # a single case
+#   python Bench.py --compare bench_results/abc123.json
+#
+# Every case runs in its own temporary working directory, so the price store,
+# calendar and oracle are built from the synthetic data only and nothing touches
+# the network.
+
+TICKER_COUNTS = (50, 500, 2000)
+YEAR_COUNTS = (5, 20, 30)
+
+def timed(stage_times, stage, fn, repeat=1):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    stage_times[stage] = best
+    return result
+
+def run_case(n_tickers, years, repeat=3, seed=0):
+    from Synthetic import synthetic_frame, synthetic_tickers, write_index_csv
+    from App import read_nse_index
+    from PriceStore import PriceStore
+    from YF import extract_returns, window_of, backtests_for
+    from Strategy import Strategy_M_12_minus_1
+    from DateUtil import to_datetimes
+    import Metrics
+    import YF
+
+    stages = {}
+    data = synthetic_frame(n_tickers, years, seed)
+    first_day, last_day = data.index[0].to_pydatetime(), data.index[-1].to_pydatetime()
+
+    write_index_csv("index.csv", synthetic_tickers(n_tickers))
+    tickers = timed(stages, "read_nse_index", lambda: read_nse_index("index.csv"), repeat)
+
+    store = YF.price_store()
+    timed(stages, "store_ingest", lambda: store.write(data, list(data.columns.get_level_values("Ticker").unique()), first_day, last_day))
+    calendar = YF.trading_calendar()
+
+    rebalance_dates = to_datetimes(calendar.month_ends(first_day, last_day))[-12:]
+    curr_date = rebalance_dates[-1]
+    start_date, end_date = window_of(curr_date)
+    yf_tickers = [f"{ticker}.NS" for ticker in tickers]
+
+    window = timed(stages, "cache_load", lambda: PriceStore().read(yf_tickers, start_date, curr_date), repeat)
+    results = timed(stages, "extract_returns", lambda: extract_returns(yf_tickers, window, curr_date, end_date), repeat)
+    backtests = timed(stages, "score_all_dates", lambda: backtests_for(tickers, rebalance_dates, store), repeat)
+
+    strategy = Strategy_M_12_minus_1(backtests)
+    timed(stages, "strategy_rank", lambda: strategy.rank(results), repeat)
+
+    def rebalance_all():
+        portfolio = strategy.portfolio(strategy.rank(backtests[0].test_results)[:10], backtests[0].target_date)
+        for backtest in backtests[1:]:
+            strategy.rebalance(portfolio, strategy.rank(backtest.test_results)[:10], backtest.target_date)
+        return portfolio
+    timed(stages, "portfolio_rebalance", rebalance_all, repeat)
+
+    # Cold start: a fresh `python Rank.py --offline` process up to its first ranking
+    rank_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Rank.py")
+    command = [sys.executable, rank_script, "index.csv", "--date", curr_date.strftime("%Y-%m-%d"), "--offline"]
+    timed(stages, "cold_start_first_ranking", lambda: subprocess.run(command, capture_output=True, check=True), repeat)
+
+    closes = data["Close"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_returns = closes[1:] / closes[:-1] - 1
+    timed(stages, "metrics", lambda: Metrics.summary(daily_returns), repeat)
+
+    return {
+        "tickers": n_tickers,
+        "years": years,
+        "days": len(data),
+        "bars": int(data["Close"].notna().to_numpy().sum()),
+        "seconds": stages,
+    }
+
+def run_isolated(n_tickers, years, repeat):
+    # Fresh interpreter per case so module level singletons start empty
+    code = f"import json, Bench; print(json.dumps(Bench.run_case({n_tickers}, {years}, {repeat})))"
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory(prefix="bench-") as folder:
+        env = {**os.environ, "PYTHONPATH": here + os.pathsep + os.environ.get("PYTHONPATH", "")}
+        output = subprocess.run([sys.executable, "-c", code], cwd=folder, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def git_commit():
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def compare(report, baseline_file):
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline_cases = {(c["tickers"], c["years"]): c for c in baseline["cases"]}
+    print(f"\nCompared with {baseline['commit']} (ratio = new / old):")
+    for case in report["cases"]:
+        old = baseline_cases.get((case["tickers"], case["years"]))
+        if old is None:
+            continue
+        ratios = {stage: seconds / old["seconds"][stage] for (stage, seconds) in case["seconds"].items() if old["seconds"].get(stage)}
+        print(f"  {case['tickers']} x {case['years']}y: " + ", ".join(f"{stage} {ratio:.2f}" for (stage, ratio) in ratios.items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each stage of the backtest pipeline on synthetic data")
+    parser.add_argument("--tickers", type=int, nargs="*", default=list(TICKER_COUNTS))
+    parser.add_argument("--years", type=int, nargs="*", default=list(YEAR_COUNTS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cases": [],
+    }
+    for n_tickers in args.tickers:
+        for years in args.years:
+            case = run_isolated(n_tickers, years, args.repeat)
+            report["cases"].append(case)
+            print(f"{n_tickers} tickers x {years} years: " + ", ".join(f"{stage} {seconds * 1000:.1f}ms" for (stage, seconds) in case["seconds"].items()))
+
+    output = args.output or os.path.join("bench_results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"\nReport written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
@@ -0,0 +1,122 @@
+import numpy as np
+
+from CLI import println
+from Factors import FactorContext
+from Scoring import as_of_rows, last_valid_rows
+
+# Benchmark indices kept in the price store next to the constituents.
+#
+# Index levels are stored under their Yahoo symbols like any other ticker, so
+# they are fetched once, extended incrementally and memory mapped with the rest
+# of the panel. A benchmark is aligned to the dates of a price panel by taking
+# its last close at or before each session, so index holidays that differ from
+# the exchange calendar never leave gaps.
+#
+# relative_analytics then scores every (rebalance date, ticker) pair against a
+# benchmark from the cumulative sums in FactorContext: relative momentum, beta,
+# alpha, tracking error and information ratio, with no per-ticker loop.
+
+BENCHMARKS = {
+    "NIFTY 50": "^NSEI",
+    "NIFTY 500": "^CRSLDX",
+    "NIFTY NEXT 50": "^NSMIDCP",
+    "NIFTY BANK": "^NSEBANK",
+    "NIFTY IT": "^CNXIT",
+    "NIFTY PHARMA": "^CNXPHARMA",
+    "NIFTY AUTO": "^CNXAUTO",
+    "NIFTY FMCG": "^CNXFMCG",
+    "NIFTY METAL": "^CNXMETAL",
+    "NIFTY ENERGY": "^CNXENERGY",
+}
+
+def benchmark_symbol(name):
+    if name in BENCHMARKS:
+        return BENCHMARKS[name]
+    if name in BENCHMARKS.values():
+        return name
+    raise ValueError(f"Unknown benchmark {name}, expected one of {list(BENCHMARKS)} or their symbols")
+
+# (dates x benchmarks) closes of the named benchmarks aligned to `dates`,
+# fetching only what the price store does not have yet. Raises when a benchmark
+# has no close at all, e.g. it could not be fetched or the given panel lacks it.
+def benchmark_closes(names, dates, store=None, panel=None):
+    from YF import price_store, download_missing
+    from Panel import current_panel
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    symbols = [benchmark_symbol(name) for name in names]
+    if len(dates) == 0:
+        return np.empty((0, len(symbols)))
+    if panel is None:
+        store = store or price_store()
+        failed = download_missing(store, symbols, dates[0].astype(object), dates[-1].astype(object))
+        if failed:
+            println(f"Benchmarks {sorted(failed)} could not be fetched")
+        panel = current_panel(store)
+    # Start a little early so the first session has a close to carry forward
+    source_dates, _, closes = panel.window(symbols, (dates[0] - 10).astype(object), dates[-1].astype(object))
+    aligned = align(source_dates, closes, dates)
+    missing = [name for (name, empty) in zip(names, np.isnan(aligned).all(axis=0)) if empty]
+    if missing:
+        raise ValueError(f"No closes for benchmarks {missing} between {dates[0]} and {dates[-1]}")
+    return aligned
+
+def benchmark_close(name, dates, store=None, panel=None):
+    return benchmark_closes([name], dates, store, panel)[:, 0]
+
+# Last close at or before each of `dates`, NaN before the first one
+def align(source_dates, closes, dates):
+    closes = np.asarray(closes, dtype=np.float64)
+    closes = closes[:, None] if closes.ndim == 1 else closes
+    if len(source_dates) == 0:
+        return np.full((len(dates), closes.shape[1]), np.nan)
+    last_valid = last_valid_rows(closes)
+    rows = as_of_rows(np.asarray(source_dates, dtype="datetime64[D]"), np.asarray(dates, dtype="datetime64[D]"))
+    valid_rows = np.where(rows[:, None] >= 0, last_valid[np.maximum(rows, 0)], -1)
+    return np.where(valid_rows >= 0, closes[np.maximum(valid_rows, 0), np.arange(closes.shape[1])], np.nan)
+
+# Each ticker's benchmark as a (dates x tickers) matrix from a
+# {ticker: benchmark name} map, tickers without an entry use `default`
+def sector_benchmarks(tickers, sectors, dates, default="NIFTY 50", store=None, panel=None):
+    names = [sectors.get(ticker, default) for ticker in tickers]
+    distinct = sorted(set(names))
+    closes = benchmark_closes(distinct, dates, store, panel)
+    return closes[:, [distinct.index(name) for name in names]]
+
+# {metric: (rebalance dates x tickers)} of every ticker against `benchmark`, a
+# close series aligned to dates or a (dates x tickers) matrix of per-ticker
+# benchmarks. Returns are taken over the lookback window, beta, alpha,
+# tracking error and information ratio from the daily returns inside it.
+def relative_analytics(dates, closes, benchmark, rebalance_dates, lookback_months=12, skip_months=0, periods_per_year=252):
+    context = FactorContext(dates, closes, rebalance_dates, benchmark)
+    stock_return = context.window_return(lookback_months, skip_months)
+    benchmark_return = context.benchmark_window_return(lookback_months, skip_months)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = (1 + stock_return) / (1 + benchmark_return) - 1
+    return {
+        "return": stock_return,
+        "benchmark_return": benchmark_return,
+        "relative_return": relative,
+        **context.benchmark_stats(lookback_months, skip_months, periods_per_year),
+    }
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+    from YF import price_panel
+    from DateUtil import date_from
+    from Scoring import month_end_rows
+
+    parser = argparse.ArgumentParser(description="Benchmark relative analytics of an index's constituents")
+    parser.add_argument("index_csv")
+    parser.add_argument("--benchmark", default="NIFTY 50")
+    parser.add_argument("--start", default="2024-01-01")
+    parser.add_argument("--end", default="2025-06-27")
+    args = parser.parse_args()
+
+    dates, yf_tickers, closes = price_panel(read_nse_index(args.index_csv), date_from(args.start), date_from(args.end))
+    rebalance_dates = dates[month_end_rows(dates)]
+    analytics = relative_analytics(dates, closes, benchmark_close(args.benchmark, dates), rebalance_dates)
+    order = np.argsort(-np.nan_to_num(analytics["relative_return"][-1], nan=-np.inf))
+    print(f"\n{'Ticker':<16}" + "".join(f"{name:>18}" for name in analytics))
+    for col in order:
+        print(f"{yf_tickers[col]:<16}" + "".join(f"{values[-1, col]:>18.4f}" for values in analytics.values()))
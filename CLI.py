@@ -1,3 +1,5 @@
+import Trace
+
 def br(style="-"):
     println(f"\n{style * 100}")
     
@@ -7,8 +9,10 @@ def println(text):
 def info(text):
     println(text)
 
+# Debug lines are printed when `level` is on and recorded as trace events when tracing is enabled
 level = False
 def debug(text):
+    Trace.event("debug", text=text)
     if level == True:
         println(text)
 
@@ -0,0 +1,98 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import numpy as np
+
+from CLI import println, debug
+import Trace
+
+# Checkpoints for long simulations and sweeps.
+#
+#   .store/checkpoints/<name>.json.gz  -> {"version", "job", "step", "saved", "state"}
+#
+# A runner saves its state (portfolio, partial results) together with the
+# number of completed steps every `every` steps or `seconds` seconds, whichever
+# comes first. On restart it loads the checkpoint and continues after the last
+# completed step. The job key is a hash of the runner's inputs, so a checkpoint
+# left by a run with other data or settings is never resumed. The file is
+# replaced atomically and removed once the job completes.
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_DIR = os.path.join(".store", "checkpoints")
+
+class Checkpoint:
+
+    def __init__(self, file_path, job, every=1, seconds=None):
+        self.file_path = file_path
+        self.job = job_key(job)
+        self.every = every
+        self.seconds = seconds
+        self.saved_step = 0
+        self.saved_at = time.monotonic()
+
+    # (step, state) of a matching checkpoint, or (0, None) to start from scratch
+    def load(self):
+        if not os.path.exists(self.file_path):
+            return 0, None
+        try:
+            with gzip.open(self.file_path, "rt", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            println(f"Ignoring unreadable checkpoint {self.file_path}: {e}")
+            return 0, None
+        if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("job") != self.job:
+            debug(f"Ignoring checkpoint {self.file_path} of another job or version")
+            return 0, None
+        self.saved_step = checkpoint["step"]
+        println(f"Resuming from checkpoint {self.file_path} after step {checkpoint['step']}")
+        return checkpoint["step"], checkpoint["state"]
+
+    def due(self, step):
+        if step - self.saved_step >= self.every:
+            return True
+        return self.seconds is not None and step > self.saved_step and time.monotonic() - self.saved_at >= self.seconds
+
+    def save(self, step, state):
+        with Trace.span("checkpoint.save", step=step):
+            os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+            checkpoint = {"version": CHECKPOINT_VERSION, "job": self.job, "step": step, "saved": time.time(), "state": state}
+            with gzip.open(f"{self.file_path}.tmp", "wt", encoding="utf-8") as f:
+                json.dump(checkpoint, f, separators=(",", ":"), default=_plain)
+            os.replace(f"{self.file_path}.tmp", self.file_path)
+        self.saved_step, self.saved_at = step, time.monotonic()
+
+    # Save when due, state_of() is only called then
+    def maybe_save(self, step, state_of):
+        if self.due(step):
+            self.save(step, state_of())
+
+    def clear(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def __str__(self):
+        return f"Checkpoint({self.file_path}, Job: {self.job[:12]}, Every: {self.every})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def job_key(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=_plain).encode("utf-8")).hexdigest()
+
+# Short digest of an array's contents to put large inputs into a job key
+def array_digest(values):
+    values = np.ascontiguousarray(values)
+    return hashlib.sha256(str(values.dtype).encode("utf-8") + str(values.shape).encode("utf-8") + values.tobytes()).hexdigest()
+
+def checkpoint_file(name):
+    return os.path.join(CHECKPOINT_DIR, f"{name}.json.gz")
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
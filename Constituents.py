@@ -0,0 +1,178 @@
+import os
+import numpy as np
+
+from CLI import debug
+
+# Point-in-time index membership.
+#
+# Every ticker is interned to an integer id once. Each index keeps its history as
+# membership intervals (ticker id, start day, end day) where the end is exclusive
+# and NaT while the ticker is still a member. For lookups the intervals are
+# compiled into one boolean row per change point, so the universe of any date is a
+# binary search over change points followed by a row fetch, and the masks of many
+# rebalance dates come out as a single fancy-indexing operation.
+#
+# Dates before the first recorded snapshot use the earliest known membership.
+
+OPEN = np.datetime64("NaT", "D")
+
+class Membership:
+
+    def __init__(self, ticker_ids=(), starts=(), ends=()):
+        self.ticker_ids = np.asarray(ticker_ids, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype="datetime64[D]")
+        self.ends = np.asarray(ends, dtype="datetime64[D]")
+        self._compiled = None
+
+    def members_on(self, date):
+        date = np.datetime64(date, "D")
+        current = (self.starts <= date) & (np.isnat(self.ends) | (self.ends > date))
+        return set(self.ticker_ids[current].tolist())
+
+    # (change points, rows x ticker ids membership matrix)
+    def compiled(self, n_ids):
+        if self._compiled is not None and self._compiled[1].shape[1] == n_ids:
+            return self._compiled
+        ends = self.ends[~np.isnat(self.ends)]
+        points = np.unique(np.concatenate([self.starts, ends]))
+        counts = np.zeros((len(points) + 1, n_ids), dtype=np.int32)
+        np.add.at(counts, (np.searchsorted(points, self.starts), self.ticker_ids), 1)
+        closed = ~np.isnat(self.ends)
+        np.add.at(counts, (np.searchsorted(points, self.ends[closed]), self.ticker_ids[closed]), -1)
+        matrix = np.cumsum(counts, axis=0)[:len(points)] > 0
+        self._compiled = (points, matrix)
+        return self._compiled
+
+    # Intervals of a (change points x ticker ids) membership matrix
+    @staticmethod
+    def of_rows(points, matrix):
+        padded = np.zeros((len(points) + 2, matrix.shape[1]), dtype=np.int8)
+        padded[1:-1] = matrix
+        # Column-major nonzero keeps each ticker's joins and exits paired in order
+        changes = np.diff(padded, axis=0).T
+        ticker_ids, join_rows = np.nonzero(changes == 1)
+        _, exit_rows = np.nonzero(changes == -1)
+        bounds = np.append(points, OPEN)
+        membership = Membership(ticker_ids, points[join_rows], bounds[exit_rows])
+        membership._compiled = (points, matrix)
+        return membership
+
+
+class ConstituentStore:
+
+    def __init__(self, file_path=".store/constituents.npz"):
+        self.file_path = file_path
+        self.names = []
+        self.ids = {}
+        self.indices = {}
+        self._load()
+
+    def has_history(self, index_name):
+        return index_name in self.indices and len(self.indices[index_name].starts) > 0
+
+    def ticker_id(self, ticker):
+        if ticker not in self.ids:
+            self.ids[ticker] = len(self.names)
+            self.names.append(ticker)
+        return self.ids[ticker]
+
+    # Record the full member list of an index as of a date. The list holds from
+    # that date until the next recorded change, so snapshots can be backfilled in
+    # any order: the change points are rebuilt with this one inserted by date.
+    def record_snapshot(self, index_name, date, tickers):
+        date = np.datetime64(date, "D")
+        membership = self.indices.get(index_name, Membership())
+        new_ids = sorted(set(self.ticker_id(ticker) for ticker in tickers))
+        if len(membership.starts):
+            points, matrix = membership.compiled(len(self.names))
+        else:
+            points, matrix = np.empty(0, dtype="datetime64[D]"), np.zeros((0, len(self.names)), dtype=bool)
+
+        row = np.zeros(len(self.names), dtype=bool)
+        row[new_ids] = True
+        at = np.searchsorted(points, date)
+        previous = matrix[at - 1] if at > 0 else np.zeros(len(self.names), dtype=bool)
+        if at < len(points) and points[at] == date:
+            matrix = matrix.copy()
+            matrix[at] = row
+        else:
+            points, matrix = np.insert(points, at, date), np.insert(matrix, at, row, axis=0)
+
+        self.indices[index_name] = Membership.of_rows(points, matrix)
+        debug(f"{index_name} on {date}: {int((row & ~previous).sum())} joined, {int((previous & ~row).sum())} left")
+
+    # Record explicit membership changes, e.g. from an index reconstitution notice
+    def record_change(self, index_name, date, added=(), removed=()):
+        date = np.datetime64(date, "D")
+        membership = self.indices.get(index_name, Membership())
+        members = set(self.names[i] for i in membership.members_on(date)) if len(membership.starts) else set()
+        self.record_snapshot(index_name, date, (members - set(removed)) | set(added))
+
+    # Universe of every date as a (dates x tickers) boolean mask over the given tickers
+    def masks(self, index_name, dates, tickers):
+        membership = self.indices.get(index_name)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if membership is None or len(membership.starts) == 0:
+            return np.zeros((len(dates), len(tickers)), dtype=bool)
+        points, matrix = membership.compiled(len(self.names))
+        rows = np.maximum(np.searchsorted(points, dates, side="right") - 1, 0)
+        columns = np.array([self.ids.get(ticker, -1) for ticker in tickers], dtype=np.int64)
+        masks = matrix[rows][:, np.maximum(columns, 0)]
+        return masks & (columns >= 0)
+
+    def mask(self, index_name, date, tickers):
+        return self.masks(index_name, [date], tickers)[0]
+
+    # Every ticker that was a member at some point in [start_date, end_date]
+    def ever_members(self, index_name, start_date, end_date):
+        membership = self.indices.get(index_name)
+        if membership is None or len(membership.starts) == 0:
+            return []
+        start, end = np.datetime64(start_date, "D"), np.datetime64(end_date, "D")
+        first_start = membership.starts.min()
+        starts = np.where(membership.starts == first_start, np.datetime64("1900-01-01"), membership.starts) # earliest snapshot is backfilled
+        overlaps = (starts <= end) & (np.isnat(membership.ends) | (membership.ends > start))
+        return [self.names[i] for i in sorted(set(membership.ticker_ids[overlaps].tolist()))]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        arrays = {"names": np.array(self.names, dtype=str), "index_names": np.array(list(self.indices), dtype=str)}
+        for i, membership in enumerate(self.indices.values()):
+            arrays[f"ids_{i}"] = membership.ticker_ids
+            arrays[f"starts_{i}"] = membership.starts
+            arrays[f"ends_{i}"] = membership.ends
+        np.savez_compressed(self.file_path, **arrays)
+
+    def _load(self):
+        if not os.path.exists(self.file_path):
+            return
+        saved = np.load(self.file_path)
+        self.names = [str(name) for name in saved["names"]]
+        self.ids = {name: i for (i, name) in enumerate(self.names)}
+        for i, index_name in enumerate(saved["index_names"]):
+            self.indices[str(index_name)] = Membership(saved[f"ids_{i}"], saved[f"starts_{i}"], saved[f"ends_{i}"])
+
+    def __str__(self):
+        return f"ConstituentStore(Tickers: {len(self.names)}, Indices: {list(self.indices)})"
+
+    def __repr__(self):
+        return str(self)
+
+# Record an NSE index file as the membership on a date:
+#   python Constituents.py "NIFTY 50" ind_nifty50list.csv --date 2024-03-28
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime
+    from App import read_nse_index
+
+    parser = argparse.ArgumentParser(description="Record an index constituent snapshot")
+    parser.add_argument("index_name")
+    parser.add_argument("index_csv")
+    parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"))
+    parser.add_argument("--store", default=".store/constituents.npz")
+    args = parser.parse_args()
+
+    store = ConstituentStore(args.store)
+    store.record_snapshot(args.index_name, args.date, read_nse_index(args.index_csv))
+    store.save()
+    print(store)
@@ -18,16 +18,25 @@ def nearest_friday_of(datetime):
 def next_day_of(datetime):
     return datetime + timedelta(days=1)
 
-def past_month_dates(date = datetime.now(), num_of_months = 12):
+# With a TradingCalendar each date resolves to the last session on or before it,
+# otherwise weekends are moved back to Friday
+def past_month_dates(date = datetime.now(), num_of_months = 12, calendar = None):
     dates_list = []
     current_date = date
     
     for _ in range(num_of_months):
-        calc_date = nearest_friday_of(current_date)
-        dates_list.append(calc_date)
+        dates_list.append(current_date)
         current_date -= relativedelta(months=1)
-        
-    return sorted(dates_list)
+    
+    if calendar is None:
+        return sorted(nearest_friday_of(d) for d in dates_list)
+    
+    sessions = to_datetimes(calendar.as_of(dates_list))
+    return sorted(s or nearest_friday_of(d) for (s, d) in zip(sessions, dates_list))
 
 def date_from(date_string):
-    return datetime.strptime(date_string, "%Y-%m-%d")
\ No newline at end of file
+    return datetime.strptime(date_string, "%Y-%m-%d")
+
+# datetime64 values to datetimes at midnight, None for NaT
+def to_datetimes(values):
+    return [None if str(v) == "NaT" else datetime.strptime(str(v)[:10], "%Y-%m-%d") for v in values]
\ No newline at end of file
@@ -0,0 +1,267 @@
+import numpy as np
+import Trace
+
+from Scoring import window_bounds, last_valid_rows, next_valid_rows, as_of_rows
+
+# Multi-factor signal pipeline.
+#
+# Each factor is declared once in FACTORS as a function of a FactorContext plus
+# its parameters. The context computes the intermediates factors have in common
+# once per panel and caches them: valid-bar indices, cumulative sums of daily log
+# returns and their squares (so any window sum or std is two lookups), and the
+# window rows of each (lookback, skip) pair. factor_scores then evaluates every
+# requested factor and blend for all rebalance dates in one pass, keeping float
+# scores.
+
+class FactorContext:
+
+    # `benchmark` is an optional benchmark close series aligned to dates, either
+    # one column for every ticker or a (dates x tickers) matrix, e.g. each
+    # ticker's sector index. Benchmark relative factors need it.
+    def __init__(self, dates, closes, rebalance_dates, benchmark=None):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.rebalance_dates = np.asarray(rebalance_dates, dtype="datetime64[D]")
+        self.benchmark = None
+        if benchmark is not None:
+            benchmark = np.asarray(benchmark, dtype=np.float64)
+            self.benchmark = np.broadcast_to(benchmark[:, None] if benchmark.ndim == 1 else benchmark, self.closes.shape)
+        self.cache = {}
+
+    def shared(self, key, compute):
+        if key not in self.cache:
+            Trace.count("factor_intermediates")
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def last_valid(self):
+        return self.shared("last_valid", lambda: last_valid_rows(self.closes))
+
+    def next_valid(self):
+        n_rows, n_cols = self.closes.shape
+        return self.shared("next_valid", lambda: np.vstack([next_valid_rows(self.closes), np.full((1, n_cols), n_rows)]))
+
+    # Cumulative (sum, sum of squares, count) of daily log returns between
+    # consecutive valid bars, with a leading zero row
+    def log_return_sums(self):
+        def compute():
+            n_rows, n_cols = self.closes.shape
+            with np.errstate(divide="ignore", invalid="ignore"):
+                log_prices = np.log(np.where(self.closes > 0, self.closes, np.nan))
+            previous = np.vstack([np.full((1, n_cols), -1), self.last_valid()[:-1]])
+            valid = ~np.isnan(log_prices) & (previous >= 0)
+            returns = np.where(valid, log_prices - log_prices[np.maximum(previous, 0), np.arange(n_cols)], 0.0)
+            returns = np.nan_to_num(returns, nan=0.0)
+            zero = np.zeros((1, n_cols))
+            return (np.vstack([zero, np.cumsum(returns, axis=0)]),
+                    np.vstack([zero, np.cumsum(returns ** 2, axis=0)]),
+                    np.vstack([zero, np.cumsum(valid, axis=0)]))
+        return self.shared("log_return_sums", compute)
+
+    # First and last valid bar of each ticker inside the (lookback, skip) window
+    # of every rebalance date, as (rebalance dates x tickers) row indices
+    def window_rows(self, lookback_months, skip_months):
+        def compute():
+            start, end = window_bounds(self.rebalance_dates, lookback_months, skip_months)
+            start_rows = np.searchsorted(self.dates, start, side="left")
+            end_rows = as_of_rows(self.dates, end)
+            first_bar = self.next_valid()[start_rows]
+            last_bar = np.where(end_rows[:, None] >= 0, self.last_valid()[np.maximum(end_rows, 0)], -1)
+            usable = (first_bar < last_bar) & (last_bar >= 0)
+            return first_bar, last_bar, usable
+        return self.shared(("window_rows", lookback_months, skip_months), compute)
+
+    def window_return(self, lookback_months, skip_months):
+        def compute():
+            first_bar, last_bar, usable = self.window_rows(lookback_months, skip_months)
+            n_rows, n_cols = self.closes.shape
+            if n_rows == 0:
+                return np.full(first_bar.shape, np.nan)
+            cols = np.arange(n_cols)
+            begin_price = self.closes[np.minimum(first_bar, n_rows - 1), cols]
+            end_price = self.closes[np.maximum(last_bar, 0), cols]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(usable & (begin_price > 0), end_price / begin_price - 1, np.nan)
+        return self.shared(("window_return", lookback_months, skip_months), compute)
+
+    # Annualized std of daily log returns inside the window
+    def window_volatility(self, lookback_months, skip_months, periods_per_year=252):
+        def compute():
+            first_bar, last_bar, usable = self.window_rows(lookback_months, skip_months)
+            sums, squares, counts = self.log_return_sums()
+            cols = np.arange(self.closes.shape[1])
+            # Returns in (first_bar, last_bar] are cumulative rows first_bar + 1 .. last_bar + 1
+            upper, lower = np.maximum(last_bar, 0) + 1, np.clip(first_bar, 0, self.closes.shape[0]) + 1
+            lower = np.minimum(lower, upper)
+            n = counts[upper, cols] - counts[lower, cols]
+            total = sums[upper, cols] - sums[lower, cols]
+            total_sq = squares[upper, cols] - squares[lower, cols]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                variance = (total_sq - total ** 2 / n) / (n - 1)
+                return np.where(usable & (n > 1), np.sqrt(np.maximum(variance, 0) * periods_per_year), np.nan)
+        return self.shared(("window_volatility", lookback_months, skip_months, periods_per_year), compute)
+
+    # Highest close over the trailing weeks up to each rebalance date. Windows
+    # are contiguous row ranges, so one fmax.reduceat call covers every date.
+    def trailing_high(self, weeks):
+        def compute():
+            n_rows, n_cols = self.closes.shape
+            if n_rows == 0:
+                return np.full((len(self.rebalance_dates), n_cols), np.nan)
+            start_rows = np.searchsorted(self.dates, self.rebalance_dates - np.timedelta64(7 * weeks, "D"), side="right")
+            end_rows = as_of_rows(self.dates, self.rebalance_dates) + 1
+            empty = end_rows <= start_rows
+            padded = np.vstack([self.closes, np.full((1, n_cols), np.nan)])
+            bounds = np.column_stack([np.minimum(start_rows, n_rows), np.maximum(end_rows, start_rows + 1)]).ravel()
+            highs = np.fmax.reduceat(padded, np.minimum(bounds, n_rows), axis=0)[::2]
+            return np.where(empty[:, None], np.nan, highs)
+        return self.shared(("trailing_high", weeks), compute)
+
+    # Cumulative (count, stock, benchmark, stock x benchmark, stock^2,
+    # benchmark^2) sums of daily simple returns between consecutive valid bars
+    # of each ticker, the benchmark measured over the same span, with a leading
+    # zero row. Any window's beta or tracking error is then a few lookups.
+    def benchmark_sums(self):
+        def compute():
+            if self.benchmark is None:
+                raise ValueError("Benchmark relative factors need a benchmark series")
+            n_rows, n_cols = self.closes.shape
+            cols = np.arange(n_cols)
+            previous = np.vstack([np.full((1, n_cols), -1), self.last_valid()[:-1]])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                stock = self.closes / self.closes[np.maximum(previous, 0), cols] - 1
+                benchmark = self.benchmark / self.benchmark[np.maximum(previous, 0), cols] - 1
+            valid = (previous >= 0) & np.isfinite(stock) & np.isfinite(benchmark)
+            stock, benchmark = np.where(valid, stock, 0.0), np.where(valid, benchmark, 0.0)
+            zero = np.zeros((1, n_cols))
+            return tuple(np.vstack([zero, np.cumsum(values, axis=0)])
+                         for values in (valid, stock, benchmark, stock * benchmark, stock ** 2, benchmark ** 2))
+        return self.shared("benchmark_sums", compute)
+
+    # Beta, annualized alpha, tracking error and information ratio of each
+    # ticker against the benchmark over the window of every rebalance date
+    def benchmark_stats(self, lookback_months, skip_months, periods_per_year=252):
+        def compute():
+            first_bar, last_bar, usable = self.window_rows(lookback_months, skip_months)
+            cols = np.arange(self.closes.shape[1])
+            upper, lower = np.maximum(last_bar, 0) + 1, np.clip(first_bar, 0, self.closes.shape[0]) + 1
+            lower = np.minimum(lower, upper)
+            n, stock, benchmark, cross, stock_sq, benchmark_sq = (sums[upper, cols] - sums[lower, cols] for sums in self.benchmark_sums())
+            with np.errstate(divide="ignore", invalid="ignore"):
+                usable = usable & (n > 2)
+                covariance = (cross - stock * benchmark / n) / (n - 1)
+                benchmark_variance = (benchmark_sq - benchmark ** 2 / n) / (n - 1)
+                active_variance = (stock_sq - 2 * cross + benchmark_sq - (stock - benchmark) ** 2 / n) / (n - 1)
+                beta = np.where(usable & (benchmark_variance > 0), covariance / benchmark_variance, np.nan)
+                tracking_error = np.where(usable, np.sqrt(np.maximum(active_variance, 0) * periods_per_year), np.nan)
+                return {
+                    "beta": beta,
+                    "alpha": (stock - beta * benchmark) / n * periods_per_year,
+                    "tracking_error": tracking_error,
+                    "information_ratio": np.where(tracking_error > 0, (stock - benchmark) / n * periods_per_year / tracking_error, np.nan),
+                }
+        return self.shared(("benchmark_stats", lookback_months, skip_months, periods_per_year), compute)
+
+    # Benchmark return over each ticker's own window bars, so gaps in a
+    # ticker's history compare like with like
+    def benchmark_window_return(self, lookback_months, skip_months):
+        def compute():
+            if self.benchmark is None:
+                raise ValueError("Benchmark relative factors need a benchmark series")
+            first_bar, last_bar, usable = self.window_rows(lookback_months, skip_months)
+            n_rows, n_cols = self.closes.shape
+            if n_rows == 0:
+                return np.full(first_bar.shape, np.nan)
+            cols = np.arange(n_cols)
+            begin = self.benchmark[np.minimum(first_bar, n_rows - 1), cols]
+            end = self.benchmark[np.maximum(last_bar, 0), cols]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(usable & (begin > 0), end / begin - 1, np.nan)
+        return self.shared(("benchmark_window_return", lookback_months, skip_months), compute)
+
+    def prices(self):
+        def compute():
+            rows = as_of_rows(self.dates, self.rebalance_dates)
+            if self.closes.shape[0] == 0:
+                return np.full((len(rows), self.closes.shape[1]), np.nan)
+            last_valid = np.where(rows[:, None] >= 0, self.last_valid()[np.maximum(rows, 0)], -1)
+            return np.where(last_valid >= 0, self.closes[np.maximum(last_valid, 0), np.arange(self.closes.shape[1])], np.nan)
+        return self.shared("prices", compute)
+
+
+def momentum(context, lookback_months=12, skip_months=1):
+    return context.window_return(lookback_months, skip_months)
+
+def volatility_adjusted_momentum(context, lookback_months=12, skip_months=1):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return context.window_return(lookback_months, skip_months) / context.window_volatility(lookback_months, skip_months)
+
+# Last close as a fraction of the trailing high, 1.0 means at the high
+def high_proximity(context, weeks=52):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return context.prices() / context.trailing_high(weeks)
+
+# Window return in excess of the benchmark's, as a growth ratio minus one
+def relative_momentum(context, lookback_months=12, skip_months=1):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (1 + context.window_return(lookback_months, skip_months)) / (1 + context.benchmark_window_return(lookback_months, skip_months)) - 1
+
+def information_ratio(context, lookback_months=12, skip_months=0):
+    return context.benchmark_stats(lookback_months, skip_months)["information_ratio"]
+
+# name -> (function, parameters)
+FACTORS = {
+    "momentum_12_1": (momentum, {"lookback_months": 12, "skip_months": 1}),
+    "momentum_6_1": (momentum, {"lookback_months": 6, "skip_months": 1}),
+    "momentum_3": (momentum, {"lookback_months": 3, "skip_months": 0}),
+    "vol_adjusted_12_1": (volatility_adjusted_momentum, {"lookback_months": 12, "skip_months": 1}),
+    "high_52w": (high_proximity, {"weeks": 52}),
+    "relative_momentum_12_1": (relative_momentum, {"lookback_months": 12, "skip_months": 1}),
+    "relative_momentum_6_1": (relative_momentum, {"lookback_months": 6, "skip_months": 1}),
+    "information_ratio_12": (information_ratio, {"lookback_months": 12, "skip_months": 0}),
+}
+
+# Factors that can only be scored against a benchmark
+BENCHMARK_FACTORS = {"relative_momentum_12_1", "relative_momentum_6_1", "information_ratio_12"}
+
+# name -> {factor: weight}, scored as the weighted mean of percentile ranks
+BLENDS = {
+    "blend_momentum": {"momentum_12_1": 0.5, "momentum_6_1": 0.25, "momentum_3": 0.25},
+    "blend_trend": {"vol_adjusted_12_1": 0.5, "high_52w": 0.5},
+}
+
+# Percentile rank of each score within its row in (0, 1], NaN stays NaN
+def percentile_ranks(scores):
+    finite = np.isfinite(scores)
+    order = np.argsort(np.where(finite, scores, np.inf), axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(scores.shape[1])[None, :].repeat(scores.shape[0], axis=0), axis=1)
+    counts = finite.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(finite, (ranks + 1) / counts, np.nan)
+
+# {name: (rebalance dates x tickers) scores} for every requested factor and blend.
+# By default every declared factor and blend is computed, the benchmark
+# relative ones only when a benchmark is given.
+def factor_scores(dates, closes, rebalance_dates, names=None, benchmark=None):
+    if names is None:
+        names = [name for name in list(FACTORS) + list(BLENDS) if benchmark is not None or name not in BENCHMARK_FACTORS]
+    names = list(names)
+    context = FactorContext(dates, closes, rebalance_dates, benchmark)
+    scores = {}
+
+    def score(name):
+        if name not in scores:
+            if name in FACTORS:
+                function, parameters = FACTORS[name]
+                scores[name] = function(context, **parameters)
+            elif name in BLENDS:
+                weights = BLENDS[name]
+                ranked = [percentile_ranks(score(factor)) * weight for (factor, weight) in weights.items()]
+                scores[name] = np.sum(ranked, axis=0) / sum(weights.values())
+            else:
+                raise KeyError(f"Unknown factor {name}, expected one of {list(FACTORS) + list(BLENDS)}")
+        return scores[name]
+
+    with Trace.span("factor_scores", factors=len(names), dates=len(context.rebalance_dates), tickers=context.closes.shape[1]):
+        return {name: score(name) for name in names}
@@ -0,0 +1,108 @@
+import time
+import threading
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from CLI import debug
+import Trace
+
+# Result of a fetch: the merged frame plus per-ticker outcomes.
+#   failed  -> ticker: error message, the chunk kept failing after all retries
+#   empty   -> tickers the provider answered for but returned no bars
+class FetchResult:
+
+    def __init__(self, data, failed, empty, retries):
+        self.data = data
+        self.failed = failed
+        self.empty = empty
+        self.retries = retries
+
+    # Tickers the provider answered for, with or without bars
+    def fetched_tickers(self, tickers):
+        return [ticker for ticker in tickers if ticker not in self.failed]
+
+    def __str__(self):
+        return f"FetchResult(Bars: {len(self.data)}, Failed: {len(self.failed)}, Empty: {len(self.empty)}, Retries: {self.retries})"
+
+    def __repr__(self):
+        return str(self)
+
+
+# Spaces out request starts so that at most `per_second` requests begin each second
+class RateLimiter:
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Splits tickers into chunks and downloads them concurrently from a provider,
+# retrying failed chunks with exponential backoff.
+class Fetcher:
+
+    def __init__(self, provider, chunk_size=50, max_workers=4, retries=3, backoff=1.0, requests_per_second=2):
+        self.provider = provider
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+    def fetch(self, tickers, start, end):
+        tickers = list(dict.fromkeys(tickers))
+        chunks = [tickers[i:i + self.chunk_size] for i in range(0, len(tickers), self.chunk_size)]
+        if not chunks:
+            return FetchResult(pd.DataFrame(), {}, [], 0)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+            outcomes = list(pool.map(lambda chunk: self._fetch_chunk(chunk, start, end), chunks))
+
+        Trace.count("fetch_chunks", len(chunks))
+        frames, failed, empty, retries = [], {}, [], 0
+        for chunk, (data, error, attempts) in zip(chunks, outcomes):
+            retries += attempts - 1
+            if error is not None:
+                for ticker in chunk:
+                    failed[ticker] = error
+                continue
+            returned = set(data.columns.get_level_values("Ticker")) if not data.empty else set()
+            for ticker in chunk:
+                if ticker not in returned or data["Close"][ticker].isna().all():
+                    empty.append(ticker)
+            if not data.empty:
+                frames.append(data)
+
+        Trace.count("download_retries", retries)
+        Trace.count("fetch_failed_tickers", len(failed))
+        Trace.count("fetch_empty_tickers", len(empty))
+        data = pd.concat(frames, axis=1).sort_index(axis=1) if frames else pd.DataFrame()
+        if failed:
+            print(f"  Warning: Failed to fetch {len(failed)} of {len(tickers)} tickers: {sorted(failed)}")
+        if empty:
+            debug(f"  No data returned for {len(empty)} tickers: {sorted(empty)}")
+        return FetchResult(data, failed, empty, retries)
+
+    def _fetch_chunk(self, chunk, start, end):
+        error = None
+        for attempt in range(1, self.retries + 2):
+            self.rate_limiter.wait()
+            try:
+                with Trace.span("fetch.chunk", provider=self.provider.name, tickers=len(chunk), attempt=attempt):
+                    return self.provider.download(chunk, start, end), None, attempt
+            except Exception as e:
+                error = str(e)
+                debug(f"  Attempt {attempt} for {len(chunk)} tickers failed: {e}")
+                if attempt <= self.retries:
+                    time.sleep(self.backoff * (2 ** (attempt - 1)))
+        return pd.DataFrame(), error, self.retries + 1
@@ -0,0 +1,194 @@
+import os
+import numpy as np
+
+from datetime import datetime, timedelta
+from CLI import println, br, debug
+from Scoring import top_n as top_n_of, next_valid_rows, last_valid_rows
+
+# Incremental "live" mode for the 12-minus-1 strategy.
+#
+# Instead of re-reading a 12 month window for every run, the state keeps one row
+# per calendar month with the first and last valid close of every ticker in that
+# month. That is all the momentum signal needs: the first close of the window
+# start month and the last close of the month before the skipped ones. New bars
+# only touch the row of their own month, so a daily or monthly update is
+# O(tickers). The state also carries the current holdings and cumulative PnL.
+
+STATE_VERSION = 1
+
+class LiveState:
+
+    def __init__(self, tickers, lookback_months=12, skip_months=1, top_n=10):
+        self.tickers = list(tickers)
+        self.lookback_months = lookback_months
+        self.skip_months = skip_months
+        self.top_n = top_n
+        self.months = np.empty(0, dtype="datetime64[M]")
+        self.first = np.empty((0, len(self.tickers)))
+        self.last = np.empty((0, len(self.tickers)))
+        self.last_bar = np.datetime64("NaT", "D")
+        self.last_rebalance = np.datetime64("NaT", "D")
+        self.holdings = np.empty(0, dtype=np.int64)
+        self.entry_prices = np.empty(0)
+        self.equity = 1.0
+
+    # Months kept: the lookback window, the skipped months and the current one
+    def months_needed(self):
+        return self.lookback_months + self.skip_months + 1
+
+    def add_tickers(self, tickers):
+        new = [ticker for ticker in tickers if ticker not in self.tickers]
+        if new:
+            self.tickers += new
+            pad = np.full((len(self.months), len(new)), np.nan)
+            self.first = np.hstack([self.first, pad])
+            self.last = np.hstack([self.last, pad])
+
+    # Fold bars (dates x tickers, NaN for missing) into the monthly rows.
+    # Bars on or before the last processed day are ignored. Returns the number of new bars.
+    def update(self, dates, tickers, closes):
+        self.add_tickers(tickers)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        closes = np.asarray(closes, dtype=np.float64)
+        if not np.isnat(self.last_bar):
+            keep = dates > self.last_bar
+            dates, closes = dates[keep], closes[keep]
+        if len(dates) == 0:
+            return 0
+
+        columns = {ticker: i for (i, ticker) in enumerate(self.tickers)}
+        panel = np.full((len(dates), len(self.tickers)), np.nan)
+        panel[:, [columns[ticker] for ticker in tickers]] = closes
+
+        bar_months = dates.astype("datetime64[M]")
+        for month in np.unique(bar_months): # one or two months per update
+            bars = panel[bar_months == month]
+            row = self._month_row(month)
+            cols = np.arange(bars.shape[1])
+            first_row = np.minimum(next_valid_rows(bars)[0], len(bars) - 1)
+            last_row = np.maximum(last_valid_rows(bars)[-1], 0)
+            self.first[row] = np.where(np.isnan(self.first[row]), bars[first_row, cols], self.first[row])
+            self.last[row] = np.where(np.isnan(bars[last_row, cols]), self.last[row], bars[last_row, cols])
+
+        self.last_bar = dates.max()
+        self._trim()
+        return len(dates)
+
+    # Momentum score per ticker as of a rebalance date, NaN when the window is not covered
+    def scores(self, rebalance_date):
+        end_month = np.datetime64(rebalance_date, "M") - self.skip_months
+        start_month = end_month - self.lookback_months
+        rows = np.flatnonzero((self.months >= start_month) & (self.months <= end_month))
+        if len(rows) == 0 or self.months[rows[0]] != start_month:
+            return np.full(len(self.tickers), np.nan)
+
+        first, last = self.first[rows], self.last[rows]
+        cols = np.arange(len(self.tickers))
+        begin = first[np.minimum(next_valid_rows(first)[0], len(rows) - 1), cols]
+        end = last[np.maximum(last_valid_rows(last)[-1], 0), cols]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(begin > 0, end / begin - 1, np.nan)
+
+    # Latest known close per ticker
+    def prices(self):
+        if len(self.months) == 0:
+            return np.full(len(self.tickers), np.nan)
+        latest = last_valid_rows(self.last)[-1]
+        return np.where(latest >= 0, self.last[np.maximum(latest, 0), np.arange(len(self.tickers))], np.nan)
+
+    # Close out the current holdings at the latest prices and pick the new top N
+    def rebalance(self, rebalance_date):
+        prices = self.prices()
+        if len(self.holdings) > 0:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                period = prices[self.holdings] / self.entry_prices - 1
+            period = period[np.isfinite(period)]
+            if len(period) > 0:
+                self.equity *= 1 + period.mean()
+
+        picks = top_n_of(self.scores(rebalance_date)[None, :], self.top_n)[0]
+        self.holdings = picks[picks >= 0]
+        self.entry_prices = prices[self.holdings]
+        self.last_rebalance = np.datetime64(rebalance_date, "D")
+        return [self.tickers[i] for i in self.holdings]
+
+    def _month_row(self, month):
+        row = np.searchsorted(self.months, month)
+        if row < len(self.months) and self.months[row] == month:
+            return row
+        pad = np.full((1, len(self.tickers)), np.nan)
+        self.months = np.insert(self.months, row, month)
+        self.first = np.insert(self.first, row, pad, axis=0)
+        self.last = np.insert(self.last, row, pad, axis=0)
+        return row
+
+    def _trim(self):
+        extra = len(self.months) - self.months_needed()
+        if extra > 0:
+            self.months, self.first, self.last = self.months[extra:], self.first[extra:], self.last[extra:]
+
+    def save(self, file_path):
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        np.savez(file_path, version=STATE_VERSION, tickers=np.array(self.tickers),
+                 params=np.array([self.lookback_months, self.skip_months, self.top_n]),
+                 months=self.months, first=self.first, last=self.last,
+                 last_bar=self.last_bar, last_rebalance=self.last_rebalance,
+                 holdings=self.holdings, entry_prices=self.entry_prices, equity=self.equity)
+
+    def __str__(self):
+        return f"LiveState(Tickers: {len(self.tickers)}, Last bar: {self.last_bar}, Last rebalance: {self.last_rebalance}, Equity: {self.equity:.4f})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def load_state(file_path):
+    if not os.path.exists(file_path):
+        return None
+    saved = np.load(file_path)
+    if int(saved["version"]) != STATE_VERSION:
+        println(f"Ignoring live state {file_path} written by version {int(saved['version'])}")
+        return None
+    lookback_months, skip_months, top_n = (int(v) for v in saved["params"])
+    state = LiveState([str(ticker) for ticker in saved["tickers"]], lookback_months, skip_months, top_n)
+    state.months, state.first, state.last = saved["months"], saved["first"], saved["last"]
+    state.last_bar, state.last_rebalance = saved["last_bar"][()], saved["last_rebalance"][()]
+    state.holdings, state.entry_prices, state.equity = saved["holdings"], saved["entry_prices"], float(saved["equity"])
+    return state
+
+# One scheduled run: read only the bars after the last processed day, fold them in
+# and, once per month, emit the new target portfolio.
+def run_live(tickers, state_file=".store/live_state.npz", as_of=None, top_n=10):
+    from YF import price_panel, window_start
+
+    as_of = as_of or datetime.now()
+    state = load_state(state_file) or LiveState([f"{ticker}.NS" for ticker in tickers], top_n=top_n)
+    if np.isnat(state.last_bar):
+        start_date = window_start(as_of) # first run, seed the whole lookback once
+    else:
+        start_date = state.last_bar.astype(datetime) + timedelta(days=1)
+
+    dates, yf_tickers, closes = price_panel(tickers, start_date, as_of)
+    added = state.update(dates, yf_tickers, closes)
+    debug(f"Live state updated with {added} new bars")
+
+    target = None
+    if np.isnat(state.last_rebalance) or np.datetime64(as_of, "M") > state.last_rebalance.astype("datetime64[M]"):
+        target = state.rebalance(as_of)
+        br("=")
+        println(f"Target portfolio for {as_of.strftime('%Y-%m-%d')}: {target}")
+        println(f"Cumulative PnL: {(state.equity - 1) * 100:.2f}%")
+    state.save(state_file)
+    return target
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+
+    parser = argparse.ArgumentParser(description="Advance the live momentum portfolio of an index's constituents to today")
+    parser.add_argument("index_csv")
+    parser.add_argument("--state", default=".store/live_state.npz")
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    run_live(read_nse_index(args.index_csv), state_file=args.state, top_n=args.top_n)
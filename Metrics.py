@@ -0,0 +1,132 @@
+import numpy as np
+
+# Vectorized performance metrics.
+#
+# Every function takes a 2-D array of periodic returns, one column per strategy,
+# config or bootstrap sample (a 1-D array is treated as a single column), and
+# returns one value per column. NaN returns count as a flat period.
+
+def _as_columns(returns):
+    returns = np.asarray(returns, dtype=np.float64)
+    if returns.ndim == 1:
+        returns = returns[:, None]
+    return np.nan_to_num(returns, nan=0.0)
+
+def equity_curves(returns):
+    return np.cumprod(1 + _as_columns(returns), axis=0)
+
+def total_return(returns):
+    return np.prod(1 + _as_columns(returns), axis=0) - 1
+
+def cagr(returns, periods_per_year=252):
+    returns = _as_columns(returns)
+    years = returns.shape[0] / periods_per_year
+    growth = np.prod(1 + returns, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((years > 0) & (growth > 0), growth ** (1 / max(years, 1e-12)) - 1, np.nan)
+
+# Drawdown path per column, measured from the running peak including the starting capital
+def drawdowns(returns):
+    equity = equity_curves(returns)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=0)
+    return equity / peak - 1
+
+def max_drawdown(returns):
+    returns = _as_columns(returns)
+    if returns.shape[0] == 0:
+        return np.full(returns.shape[1], np.nan)
+    return drawdowns(returns).min(axis=0)
+
+def volatility(returns, periods_per_year=252):
+    returns = _as_columns(returns)
+    if returns.shape[0] < 2:
+        return np.full(returns.shape[1], np.nan)
+    return returns.std(axis=0, ddof=1) * np.sqrt(periods_per_year)
+
+def sharpe_ratio(returns, periods_per_year=252, annual_risk_free_rate=0.0):
+    returns = _as_columns(returns)
+    if returns.shape[0] < 2:
+        return np.full(returns.shape[1], np.nan)
+    excess = returns - ((1 + annual_risk_free_rate) ** (1 / periods_per_year) - 1)
+    deviation = excess.std(axis=0, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(deviation > 0, excess.mean(axis=0) / deviation * np.sqrt(periods_per_year), np.nan)
+
+def sortino_ratio(returns, periods_per_year=252, annual_risk_free_rate=0.0):
+    returns = _as_columns(returns)
+    if returns.shape[0] < 2:
+        return np.full(returns.shape[1], np.nan)
+    excess = returns - ((1 + annual_risk_free_rate) ** (1 / periods_per_year) - 1)
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2, axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(downside > 0, excess.mean(axis=0) / downside * np.sqrt(periods_per_year), np.nan)
+
+# All headline metrics for every column, as {name: array of one value per column}
+def summary(returns, periods_per_year=252, annual_risk_free_rate=0.0):
+    return {
+        "total_return": total_return(returns),
+        "cagr": cagr(returns, periods_per_year),
+        "max_drawdown": max_drawdown(returns),
+        "volatility": volatility(returns, periods_per_year),
+        "sharpe": sharpe_ratio(returns, periods_per_year, annual_risk_free_rate),
+        "sortino": sortino_ratio(returns, periods_per_year, annual_risk_free_rate),
+    }
+
+
+# Rolling variants: row i covers periods (i - window, i], rows before the first
+# full window are NaN.
+
+def _rolling_sum(values, window):
+    sums = np.cumsum(np.vstack([np.zeros((1, values.shape[1])), values]), axis=0)
+    rolled = np.full(values.shape, np.nan)
+    if window <= values.shape[0]:
+        rolled[window - 1:] = sums[window:] - sums[:-window]
+    return rolled
+
+def rolling_return(returns, window):
+    log_growth = np.log1p(_as_columns(returns))
+    return np.expm1(_rolling_sum(log_growth, window))
+
+def rolling_volatility(returns, window, periods_per_year=252):
+    returns = _as_columns(returns)
+    if window < 2:
+        return np.full(returns.shape, np.nan)
+    mean = _rolling_sum(returns, window) / window
+    mean_square = _rolling_sum(returns ** 2, window) / window
+    variance = np.maximum(mean_square - mean ** 2, 0) * window / (window - 1)
+    return np.sqrt(variance * periods_per_year)
+
+def rolling_sharpe(returns, window, periods_per_year=252):
+    mean = _rolling_sum(_as_columns(returns), window) / window
+    vol = rolling_volatility(returns, window, periods_per_year)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(vol > 0, mean * periods_per_year / vol, np.nan)
+
+
+# Benchmark relative stats. `benchmark` is one return series with the same rows.
+
+def relative_stats(returns, benchmark, periods_per_year=252):
+    returns = _as_columns(returns)
+    benchmark = _as_columns(benchmark)[:, :1]
+    n = returns.shape[0]
+    if n < 2:
+        nothing = np.full(returns.shape[1], np.nan)
+        return {"beta": nothing, "alpha": nothing, "correlation": nothing, "tracking_error": nothing, "information_ratio": nothing}
+
+    active = returns - benchmark
+    returns_mean, benchmark_mean = returns.mean(axis=0), benchmark.mean()
+    covariance = ((returns - returns_mean) * (benchmark - benchmark_mean)).sum(axis=0) / (n - 1)
+    benchmark_variance = benchmark.var(ddof=1)
+    tracking_error = active.std(axis=0, ddof=1) * np.sqrt(periods_per_year)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = covariance / benchmark_variance if benchmark_variance > 0 else np.full(returns.shape[1], np.nan)
+        correlation = covariance / (returns.std(axis=0, ddof=1) * np.sqrt(benchmark_variance))
+        information_ratio = np.where(tracking_error > 0, active.mean(axis=0) * periods_per_year / tracking_error, np.nan)
+    return {
+        "beta": beta,
+        "alpha": (returns_mean - beta * benchmark_mean) * periods_per_year,
+        "correlation": correlation,
+        "tracking_error": tracking_error,
+        "information_ratio": information_ratio,
+    }
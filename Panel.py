@@ -0,0 +1,263 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+from CLI import debug
+import Trace
+from PriceStore import FIELDS, gaps, _day
+from Quality import build_quality, save_quality, QualityIndex
+
+# Memory mapped price panel, the input format for ranking and simulation.
+#
+#   .store/panel/panel.json    -> {"version", "rows", "fields", "source"}
+#   .store/panel/dates.npy     -> datetime64[D], one per row
+#   .store/panel/tickers.json  -> column order
+#   .store/panel/Close.f32     -> raw float32 rows x tickers matrix, C order (one per field)
+#   .store/panel/quality.npz   -> coverage bitmaps and data quality flags of the closes, see Quality.py
+#   .store/panel/coverage.json -> the store coverage the panel was built from
+#
+# Opening a panel maps the files with numpy.memmap, so it is near instant, every
+# process reading the same panel shares the OS page cache, and only the pages of
+# the rows and fields actually touched are ever read from disk.
+#
+# The panel is built from the parquet price store, which stays the ingest format
+# because fetches merge ticker ranges into it. "source" is a hash of the store's
+# coverage, a panel whose hash no longer matches is brought up to date on next
+# use: only the ranges fetched since it was built are read from the store and
+# merged into a copy of the existing matrices.
+
+VERSION = 2
+
+class Panel:
+
+    def __init__(self, folder=".store/panel"):
+        self.folder = folder
+        self.meta = self._load_meta()
+        self.dates = np.load(os.path.join(folder, "dates.npy")) if self.meta else np.empty(0, dtype="datetime64[D]")
+        self.tickers = self.meta["tickers"] if self.meta else []
+        self.columns = {ticker: i for (i, ticker) in enumerate(self.tickers)}
+        self.fields = {}
+        self._quality = None
+
+    # QualityIndex of the closes, None for panels written without closes
+    def quality(self):
+        if self._quality is None and self.exists() and os.path.exists(os.path.join(self.folder, "quality.npz")):
+            with np.load(os.path.join(self.folder, "quality.npz")) as saved:
+                self._quality = QualityIndex(self.dates, self.tickers, dict(saved))
+        return self._quality
+
+    def exists(self):
+        return self.meta is not None
+
+    # Store coverage the panel was built from, None for panels that did not record it
+    def built_from(self):
+        path = os.path.join(self.folder, "coverage.json")
+        if not self.exists() or not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def is_current(self, store):
+        return self.exists() and self.meta.get("source") == source_hash(store)
+
+    # Read-only memmap of a whole field, rows x tickers
+    def field(self, name="Close"):
+        if name not in self.fields:
+            if not self.exists() or name not in self.meta["fields"]:
+                raise KeyError(f"Panel in {self.folder} has no {name} field")
+            shape = (self.meta["rows"], len(self.tickers))
+            self.fields[name] = np.memmap(self._field_file(name), dtype=np.float32, mode="r", shape=shape) if shape[0] and shape[1] else np.empty(shape, dtype=np.float32)
+        return self.fields[name]
+
+    # (dates, tickers, float32 matrix) for [start_date, end_date]. Only the rows
+    # in range are touched, tickers not in the panel come back as NaN columns.
+    def window(self, tickers, start_date=None, end_date=None, name="Close"):
+        tickers = list(tickers)
+        first = 0 if start_date is None else np.searchsorted(self.dates, np.datetime64(start_date, "D"), side="left")
+        last = len(self.dates) if end_date is None else np.searchsorted(self.dates, np.datetime64(end_date, "D"), side="right")
+        columns = np.array([self.columns.get(ticker, -1) for ticker in tickers], dtype=np.int64)
+        with Trace.span("panel.window", field=name, rows=int(last - first), tickers=len(tickers)):
+            if not self.exists() or last <= first:
+                return self.dates[first:last], tickers, np.full((max(last - first, 0), len(tickers)), np.nan, dtype=np.float32)
+            values = np.asarray(self.field(name)[first:last])[:, np.maximum(columns, 0)]
+            values[:, columns < 0] = np.nan
+        Trace.count("panel_bytes_touched", values.nbytes)
+        return self.dates[first:last], tickers, values
+
+    def _field_file(self, name):
+        return os.path.join(self.folder, f"{name}.f32")
+
+    def _load_meta(self):
+        path = os.path.join(self.folder, "panel.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != VERSION:
+            debug(f"Ignoring panel in {self.folder} with version {meta.get('version')}")
+            return None
+        with open(os.path.join(self.folder, "tickers.json"), "r", encoding="utf-8") as f:
+            meta["tickers"] = json.load(f)
+        return meta
+
+    def __str__(self):
+        return f"Panel(Days: {len(self.dates)}, Tickers: {len(self.tickers)}, Fields: {self.meta['fields'] if self.meta else []})"
+
+    def __repr__(self):
+        return str(self)
+
+
+# Write the matrices of each field into a fresh panel folder. Every writer
+# stages in its own folder which is swapped in by rename only once complete, so
+# readers never see a half written panel and concurrent builds never share files.
+# The previous panel is removed after the swap, processes that still map it keep
+# their pages.
+def write_panel(folder, dates, tickers, fields, source=None, coverage=None):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    parent, name = os.path.split(os.path.abspath(folder))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f"{name}.", suffix=".tmp", dir=parent)
+    np.save(os.path.join(staging, "dates.npy"), dates)
+    with open(os.path.join(staging, "tickers.json"), "w", encoding="utf-8") as f:
+        json.dump(list(tickers), f)
+    for name, values in fields.items():
+        np.ascontiguousarray(values, dtype=np.float32).tofile(os.path.join(staging, f"{name}.f32"))
+    if "Close" in fields:
+        save_quality(staging, build_quality(fields["Close"]))
+    with open(os.path.join(staging, "panel.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION, "rows": len(dates), "fields": list(fields), "source": source}, f)
+    if coverage is not None:
+        with open(os.path.join(staging, "coverage.json"), "w", encoding="utf-8") as f:
+            json.dump(coverage, f, sort_keys=True)
+    _swap_in(staging, folder)
+    return Panel(folder)
+
+# Record a new source for a panel whose matrices did not change, each file is
+# replaced atomically
+def _refresh_source(panel, store):
+    meta = {key: value for (key, value) in panel.meta.items() if key != "tickers"}
+    _replace_json(os.path.join(panel.folder, "coverage.json"), store.coverage)
+    _replace_json(os.path.join(panel.folder, "panel.json"), {**meta, "source": source_hash(store)})
+    return Panel(panel.folder)
+
+def _replace_json(path, content):
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "w", encoding="utf-8") as f:
+        json.dump(content, f, sort_keys=True)
+    os.replace(staging, path)
+
+def _swap_in(staging, folder):
+    # Staging names are unique, so is the name the previous panel moves aside to
+    retired = f"{staging}.old"
+    try:
+        os.replace(folder, retired)
+    except OSError:
+        retired = None
+    try:
+        os.replace(staging, folder)
+    except OSError:
+        # Another writer swapped its panel in first, that one is kept
+        debug(f"Discarding {staging}, {folder} was replaced concurrently")
+        shutil.rmtree(staging, ignore_errors=True)
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
+
+# Materialize every ticker the store covers into a panel
+def build_panel(store, folder=None, fields=FIELDS):
+    folder = folder or os.path.join(store.root, "panel")
+    tickers = sorted(store.coverage)
+    if not tickers:
+        return write_panel(folder, [], [], {field: np.empty((0, 0)) for field in fields}, source_hash(store), store.coverage)
+    start, end = (day.isoformat() for day in store.span())
+    with Trace.span("panel.build", tickers=len(tickers), start_date=start, end_date=end):
+        dates, tickers, matrices = store.read_fields(tickers, start, end, fields)
+        panel = write_panel(folder, dates, tickers, matrices, source_hash(store), store.coverage)
+    debug(f"Built {panel} in {folder}")
+    return panel
+
+# Bring a panel up to date with the store by reading only the day ranges fetched
+# since it was built. New dates and tickers are merged into a copy of the
+# existing matrices, so a live run that adds a few days reads one year partition
+# instead of all of them. Falls back to a full build when the panel does not
+# know what it was built from or coverage was dropped.
+def update_panel(panel, store, fields=FIELDS):
+    built_from = panel.built_from()
+    if built_from is None or set(panel.meta["fields"]) != set(fields) or not set(built_from) <= set(store.coverage):
+        return build_panel(store, panel.folder, fields)
+    added = {}
+    for ticker in store.coverage:
+        old = [(_day(first), _day(last)) for (first, last) in built_from.get(ticker, [])]
+        for (first, last) in store.intervals(ticker):
+            for (start, end) in gaps(old, first, last):
+                added[ticker] = (min(start, added[ticker][0]), max(end, added[ticker][1])) if ticker in added else (start, end)
+    if not added:
+        return _refresh_source(panel, store)
+
+    start, end = min(span[0] for span in added.values()), max(span[1] for span in added.values())
+    with Trace.span("panel.update", tickers=len(added), start_date=start.isoformat(), end_date=end.isoformat()):
+        new_dates, new_tickers, matrices = store.read_fields(sorted(added), start, end, fields)
+        if len(new_dates) == 0:
+            # Ranges without bars (weekends, holidays) only change what the panel was built from
+            return _refresh_source(panel, store)
+        dates = np.union1d(panel.dates, new_dates)
+        tickers = panel.tickers + sorted(set(new_tickers) - set(panel.columns))
+        columns = {ticker: i for (i, ticker) in enumerate(tickers)}
+        old_rows = np.searchsorted(dates, panel.dates)
+        new_rows = np.searchsorted(dates, new_dates)
+        new_columns = np.array([columns[ticker] for ticker in new_tickers], dtype=np.int64)
+        merged = {}
+        for name in fields:
+            values = np.full((len(dates), len(tickers)), np.nan, dtype=np.float32)
+            values[old_rows, :len(panel.tickers)] = panel.field(name)
+            # Fetched ranges are re-read whole, the store holds every bar in them
+            span = (dates >= np.datetime64(start, "D")) & (dates <= np.datetime64(end, "D"))
+            values[np.ix_(span, new_columns)] = np.nan
+            values[np.ix_(new_rows, new_columns)] = matrices[name]
+            merged[name] = values
+        updated = write_panel(panel.folder, dates, tickers, merged, source_hash(store), store.coverage)
+    debug(f"Updated {updated} with {len(added)} tickers from {start} to {end}")
+    return updated
+
+# The store's panel, updated first when the store has changed since it was built.
+# For 500 tickers over 20 years of daily bars a full build from every partition
+# takes about 1s, adding a week of bars with update_panel about 0.2s, most of it
+# copying the matrices and rebuilding the quality index.
+#
+# The opened panel is kept per folder until the coverage hash changes, so its
+# memmaps and QualityIndex are set up once per process rather than on every call.
+_panels = {}
+def current_panel(store):
+    folder = os.path.join(store.root, "panel")
+    source = source_hash(store)
+    panel = _panels.get(folder)
+    if panel is None or not panel.exists() or panel.meta.get("source") != source:
+        panel = Panel(folder)
+        if not panel.exists():
+            panel = build_panel(store)
+        elif not panel.is_current(store):
+            panel = update_panel(panel, store)
+        _panels[folder] = panel
+    return panel
+
+# Write the panel back out as year partitioned long parquet files
+def export_parquet(panel, folder):
+    import pandas as pd
+    os.makedirs(folder, exist_ok=True)
+    names = [name for name in FIELDS if name in panel.meta["fields"]]
+    years = panel.dates.astype("datetime64[Y]").astype(int) + 1970
+    for year in np.unique(years):
+        rows = np.flatnonzero(years == year)
+        frame = pd.DataFrame({
+            "Date": np.repeat(panel.dates[rows], len(panel.tickers)).astype("datetime64[ns]"),
+            "Ticker": np.tile(np.array(panel.tickers, dtype=object), len(rows)),
+            **{name: np.asarray(panel.field(name)[rows[0]:rows[-1] + 1]).ravel().astype(np.float64) for name in names},
+        })
+        frame = frame.dropna(subset=names, how="all")
+        frame.sort_values(["Ticker", "Date"]).to_parquet(os.path.join(folder, f"{year}.parquet"), index=False)
+    debug(f"Exported {len(np.unique(years))} yearly partitions to {folder}")
+
+def source_hash(store):
+    return hashlib.sha1(json.dumps(store.coverage, sort_keys=True).encode("utf-8")).hexdigest()
@@ -0,0 +1,104 @@
+import numpy as np
+
+from collections import OrderedDict
+from datetime import datetime
+from CLI import debug
+import Trace
+from YF import price_store, download_missing
+from Panel import current_panel
+
+# Shared close-price lookup used for valuing holdings and pricing exits.
+#
+# Prices are served from the local price store. Recently used ticker series are
+# kept in a bounded LRU as (dates, closes) arrays so a batch of (ticker, date)
+# pairs resolves with one searchsorted per ticker. Only pairs the store does not
+# cover are downloaded, all of them in one batched call.
+class PriceOracle:
+
+    def __init__(self, store=None, max_series=256):
+        self.store = store
+        self.max_series = max_series
+        self.series = OrderedDict()
+
+    # Close price as of each date (last bar at or before it), NaN if unknown
+    def close_prices(self, tickers, dates):
+        dates = np.asarray([_day64(date) for date in dates], dtype="datetime64[D]")
+        tickers = list(tickers)
+        self._fetch_misses(tickers, dates)
+
+        prices = np.full(len(tickers), np.nan)
+        by_ticker = {}
+        for i, ticker in enumerate(tickers):
+            by_ticker.setdefault(ticker, []).append(i)
+
+        uncached = [ticker for ticker in by_ticker if ticker not in self.series]
+        Trace.count("oracle_lru_hits", len(by_ticker) - len(uncached))
+        Trace.count("oracle_lru_misses", len(uncached))
+        self._load_series(uncached)
+        for ticker, positions in by_ticker.items():
+            series_dates, closes = self._series(ticker)
+            if len(series_dates) == 0:
+                continue
+            rows = np.searchsorted(series_dates, dates[positions], side="right") - 1
+            prices[positions] = np.where(rows >= 0, closes[np.maximum(rows, 0)], np.nan)
+        return prices
+
+    def close_price(self, ticker, date):
+        return self.close_prices([ticker], [date])[0]
+
+    def _fetch_misses(self, tickers, dates):
+        store = self._store()
+        misses = {}
+        for ticker, date in zip(tickers, dates):
+            day = date.astype(datetime)
+            if store.missing_ranges([ticker], day, day):
+                misses.setdefault(ticker, []).append(day)
+        if not misses:
+            return
+        Trace.count("oracle_fetch_tickers", len(misses))
+
+        start_date = min(min(days) for days in misses.values())
+        end_date = max(max(days) for days in misses.values())
+        debug(f"Price oracle missing {len(misses)} tickers, fetching {start_date} to {end_date}")
+        try:
+            download_missing(store, list(misses.keys()), start_date, end_date)
+        except Exception as e:
+            print(f"Error while trying to fetch prices from YF: {e}")
+        for ticker in misses:
+            self.series.pop(ticker, None)
+
+    def _series(self, ticker):
+        if ticker not in self.series:
+            self._load_series([ticker])
+        self.series.move_to_end(ticker)
+        return self.series[ticker]
+
+    # Load the stored close series of several tickers with a single panel read
+    def _load_series(self, tickers):
+        if not tickers:
+            return
+        dates, _, closes = current_panel(self._store()).window(tickers)
+
+        for i, ticker in enumerate(tickers):
+            valid = ~np.isnan(closes[:, i])
+            self.series[ticker] = (dates[valid], closes[valid, i])
+            self.series.move_to_end(ticker)
+        while len(self.series) > max(self.max_series, len(tickers)):
+            self.series.popitem(last=False)
+
+    def _store(self):
+        if self.store is None:
+            self.store = price_store()
+        return self.store
+
+_price_oracle = None
+def price_oracle():
+    global _price_oracle
+    if _price_oracle is None:
+        _price_oracle = PriceOracle()
+    return _price_oracle
+
+def _day64(date):
+    if isinstance(date, datetime):
+        date = date.date()
+    return np.datetime64(date, "D")
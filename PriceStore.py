@@ -0,0 +1,305 @@
+import os
+import json
+import numpy as np
+
+from datetime import datetime, timedelta
+from CLI import debug
+import Trace
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+RECENT_DAYS = 7
+EMPTY_TTL = timedelta(hours=12)
+
+# A single price store keyed by (Ticker, Date) and partitioned by year:
+#
+#   .store/prices/2024.parquet   -> long table [Date, Ticker, Open, High, Low, Close, Volume]
+#   .store/coverage.json         -> {ticker: [[first_fetched_day, last_fetched_day], ...]}
+#   .store/empty.json            -> {ticker: [[first_day, last_day, checked_at], ...]}
+#
+# Coverage is tracked separately from the bars so that holidays and days with
+# no trading are not mistaken for missing data and re-downloaded. It is a
+# sorted list of disjoint fetched intervals per ticker, so a gap left between
+# two fetches is still reported as missing.
+#
+# A range the provider answered without bars (delisted or suspended tickers)
+# is covered too. When it reaches into the last RECENT_DAYS the bars may just
+# not be published yet, so it goes into a negative cache instead and is only
+# asked for again once EMPTY_TTL has passed.
+#
+# pandas is only imported by the methods that build or merge DataFrames. The
+# ranking path (read_closes, trading_days) goes through pyarrow into NumPy.
+class PriceStore:
+
+    def __init__(self, root=".store"):
+        self.root = root
+        self.prices_dir = os.path.join(root, "prices")
+        self.coverage_file = os.path.join(root, "coverage.json")
+        self.coverage = self._load_coverage()
+        self.empty_file = os.path.join(root, "empty.json")
+        self.empty = self._load_empty()
+
+    def is_empty(self):
+        return len(self.coverage) == 0
+
+    # Date ranges (inclusive) per ticker which are not yet in the store
+    def missing_ranges(self, tickers, start_date, end_date):
+        start, end = _day(start_date), min(_day(end_date), _today())
+        missing = {}
+        for ticker in tickers:
+            ranges = gaps(self.intervals(ticker), start, end)
+            if ranges and ticker in self.empty:
+                answered = self._empty_intervals(ticker)
+                ranges = [gap for (gap_start, gap_end) in ranges for gap in gaps(answered, gap_start, gap_end)]
+            if ranges:
+                missing[ticker] = ranges
+        return missing
+
+    # Sorted, disjoint (first, last) days fetched for a ticker
+    def intervals(self, ticker):
+        return [(_day(first), _day(last)) for (first, last) in self.coverage.get(ticker, [])]
+
+    # (first, last) fetched day over all tickers, None when nothing was fetched
+    def span(self):
+        days = [day for ticker in self.coverage for interval in self.intervals(ticker) for day in interval]
+        return (min(days), max(days)) if days else None
+
+    # Read [start_date, end_date] for the given tickers in the yfinance layout
+    # (columns MultiIndex of (Price, Ticker), DatetimeIndex named Date)
+    def read(self, tickers, start_date, end_date):
+        import pandas as pd
+        start, end = pd.Timestamp(_day(start_date)), pd.Timestamp(_day(end_date))
+        frames = []
+        with Trace.span("store.read", start_date=str(start.date()), end_date=str(end.date()), tickers=len(tickers)) as span:
+            for year in range(start.year, end.year + 1):
+                path = self._partition(year)
+                if not os.path.exists(path):
+                    continue
+                Trace.count("store_bytes_read", os.path.getsize(path))
+                frame = pd.read_parquet(path, filters=[("Ticker", "in", list(tickers))])
+                frames.append(frame[(frame["Date"] >= start) & (frame["Date"] <= end)])
+            span.set(partitions=len(frames), rows=sum(len(frame) for frame in frames))
+
+        if not frames:
+            return pd.DataFrame()
+
+        data = pd.concat(frames, ignore_index=True)
+        if data.empty:
+            return pd.DataFrame()
+        return to_wide(data)
+
+    # (dates, tickers, closes) matrix for [start_date, end_date] without going through pandas
+    def read_closes(self, tickers, start_date, end_date):
+        dates, tickers, fields = self.read_fields(tickers, start_date, end_date, ["Close"])
+        return dates, tickers, fields["Close"]
+
+    # (dates, tickers, {field: matrix}) for [start_date, end_date]
+    def read_fields(self, tickers, start_date, end_date, fields=FIELDS):
+        import pyarrow.parquet as pq
+        tickers = list(tickers)
+        start, end = np.datetime64(_day(start_date), "D"), np.datetime64(_day(end_date), "D")
+        columns = {ticker: i for (i, ticker) in enumerate(tickers)}
+        day_parts, column_parts, value_parts = [], [], {field: [] for field in fields}
+        with Trace.span("store.read_fields", fields=len(fields), start_date=str(start), end_date=str(end), tickers=len(tickers)):
+            for year in range(start.astype(object).year, end.astype(object).year + 1):
+                path = self._partition(year)
+                if not os.path.exists(path):
+                    continue
+                Trace.count("store_bytes_read", os.path.getsize(path))
+                # Unlike read_table with filters, ParquetFile.read does not import pandas,
+                # so the ticker filter is applied on the decoded columns instead
+                parquet = pq.ParquetFile(path)
+                present = [field for field in fields if field in parquet.schema_arrow.names]
+                table = parquet.read(columns=["Date", "Ticker"] + present, use_pandas_metadata=False)
+                days = _days_of(table.column("Date"))
+                # Tickers are dictionary encoded, only the distinct names go through Python
+                encoded = table.column("Ticker").combine_chunks().dictionary_encode()
+                to_column = np.array([columns.get(name, -1) for name in encoded.dictionary.to_pylist()] + [-1], dtype=np.int64)
+                cols = to_column[_numpy_of(encoded.indices, np.int32)]
+                keep = (days >= start) & (days <= end) & (cols >= 0)
+                day_parts.append(days[keep])
+                column_parts.append(cols[keep])
+                for field in fields:
+                    values = _floats_of(table.column(field))[keep] if field in present else np.full(int(keep.sum()), np.nan)
+                    value_parts[field].append(values)
+
+        if not day_parts or sum(len(part) for part in day_parts) == 0:
+            return np.empty(0, dtype="datetime64[D]"), tickers, {field: np.empty((0, len(tickers))) for field in fields}
+
+        dates, rows = np.unique(np.concatenate(day_parts), return_inverse=True)
+        cols = np.concatenate(column_parts)
+        matrices = {}
+        for field in fields:
+            matrices[field] = np.full((len(dates), len(tickers)), np.nan)
+            matrices[field][rows, cols] = np.concatenate(value_parts[field])
+        return dates, tickers, matrices
+
+    # Every day with at least one stored bar, read from the Date column only
+    def trading_days(self):
+        import pyarrow.parquet as pq
+        days = []
+        if os.path.isdir(self.prices_dir):
+            for file_name in sorted(os.listdir(self.prices_dir)):
+                if file_name.endswith(".parquet"):
+                    table = pq.ParquetFile(os.path.join(self.prices_dir, file_name)).read(columns=["Date"], use_pandas_metadata=False)
+                    days.append(_days_of(table.column("Date")))
+        if not days:
+            return np.empty(0, dtype="datetime64[D]")
+        return np.unique(np.concatenate(days).astype("datetime64[D]"))
+
+    # Write a yfinance shaped frame into the store and record the fetched range
+    def write(self, data, tickers, start_date, end_date):
+        if data is not None and not data.empty:
+            with Trace.span("store.write", tickers=len(tickers)):
+                long_data = to_long(data)
+                for year, rows in long_data.groupby(long_data["Date"].dt.year):
+                    self._merge_partition(year, rows)
+        self.mark_fetched(tickers, start_date, end_date)
+
+    def mark_fetched(self, tickers, start_date, end_date):
+        start, end = _day(start_date), min(_day(end_date), _today())
+        if start > end:
+            return
+        for ticker in tickers:
+            merged = []
+            # Adjacent intervals are merged too, a day after last leaves no gap
+            for (first, last) in sorted(self.intervals(ticker) + [(start, end)]):
+                if merged and first <= merged[-1][1] + timedelta(days=1):
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            self.coverage[ticker] = [[first.isoformat(), last.isoformat()] for (first, last) in merged]
+        self._save_coverage()
+
+    # Record tickers the provider answered for without bars in [start_date, end_date]
+    def mark_empty(self, tickers, start_date, end_date):
+        start, end = _day(start_date), min(_day(end_date), _today())
+        if start > end or not tickers:
+            return
+        if end < _today() - timedelta(days=RECENT_DAYS):
+            self.mark_fetched(tickers, start, end)
+            return
+        checked = datetime.now().isoformat(timespec="seconds")
+        for ticker in tickers:
+            self.empty[ticker] = [entry for entry in self.empty.get(ticker, []) if _fresh(entry)] + [[start.isoformat(), end.isoformat(), checked]]
+        self.empty = {ticker: entries for (ticker, entries) in self.empty.items() if any(_fresh(entry) for entry in entries)}
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.empty_file, "w", encoding="utf-8") as f:
+            json.dump(self.empty, f, indent=1, sort_keys=True)
+
+    # Sorted (first, last) days of a ticker's unexpired empty answers
+    def _empty_intervals(self, ticker):
+        return sorted((_day(first), _day(last)) for (first, last, checked) in self.empty.get(ticker, []) if _fresh([first, last, checked]))
+
+    def _merge_partition(self, year, rows):
+        import pandas as pd
+        path = self._partition(year)
+        os.makedirs(self.prices_dir, exist_ok=True)
+        if os.path.exists(path):
+            rows = pd.concat([pd.read_parquet(path), rows], ignore_index=True)
+        rows = rows.drop_duplicates(subset=["Ticker", "Date"], keep="last")
+        rows = rows.sort_values(["Ticker", "Date"]).reset_index(drop=True)
+        rows.to_parquet(path, index=False)
+        debug(f"Stored {len(rows)} bars in {path}")
+
+    def _partition(self, year):
+        return os.path.join(self.prices_dir, f"{year}.parquet")
+
+    def _load_coverage(self):
+        if os.path.exists(self.coverage_file):
+            with open(self.coverage_file, "r", encoding="utf-8") as f:
+                coverage = json.load(f)
+            # Older stores kept a single [first, last] span per ticker
+            return {ticker: [spans] if spans and isinstance(spans[0], str) else spans for (ticker, spans) in coverage.items()}
+        return {}
+
+    def _load_empty(self):
+        if os.path.exists(self.empty_file):
+            with open(self.empty_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _save_coverage(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.coverage_file, "w", encoding="utf-8") as f:
+            json.dump(self.coverage, f, indent=1, sort_keys=True)
+
+
+# Parts of [start, end] (inclusive days) not covered by sorted, disjoint intervals
+def gaps(intervals, start, end):
+    ranges, cursor = [], start
+    for (first, last) in intervals:
+        if last < cursor:
+            continue
+        if first > end:
+            break
+        if first > cursor:
+            ranges.append((cursor, first - timedelta(days=1)))
+        cursor = max(cursor, last + timedelta(days=1))
+    if cursor <= end:
+        ranges.append((cursor, end))
+    return ranges
+
+def to_long(data):
+    import pandas as pd
+    long_data = data.stack(level="Ticker", future_stack=True).reset_index()
+    long_data = long_data.dropna(subset=[f for f in FIELDS if f in long_data.columns], how="all")
+    long_data["Date"] = pd.to_datetime(long_data["Date"])
+    return long_data[["Date", "Ticker"] + [f for f in FIELDS if f in long_data.columns]]
+
+def to_wide(long_data):
+    wide = long_data.pivot(index="Date", columns="Ticker", values=[f for f in FIELDS if f in long_data.columns])
+    wide.columns.names = ["Price", "Ticker"]
+    return wide.sort_index()
+
+# Move the old per-rebalance-date snapshots (.cache/<date>.parquet) into the store.
+# Each snapshot was downloaded from window_start(date) up to the snapshot date itself.
+def import_legacy_cache(store, window_start, cache_dir=".cache"):
+    if not os.path.isdir(cache_dir):
+        return 0
+    imported = 0
+    for file_name in sorted(os.listdir(cache_dir)):
+        if not file_name.endswith(".parquet"):
+            continue
+        target_date = datetime.strptime(file_name[:-len(".parquet")], "%Y-%m-%d")
+        data = _read_parquet(os.path.join(cache_dir, file_name))
+        tickers = list(data.columns.get_level_values("Ticker").unique())
+        store.write(data, tickers, window_start(target_date), target_date)
+        imported += 1
+    return imported
+
+# Arrow array to NumPy straight from its buffers. pyarrow's own to_numpy and
+# compute functions import pandas, which would undo the fast startup path.
+def _numpy_of(column, dtype):
+    array = column.combine_chunks() if hasattr(column, "combine_chunks") else column
+    values = np.frombuffer(array.buffers()[1], dtype=dtype, count=array.offset + len(array))[array.offset:]
+    if array.null_count > 0:
+        valid = np.unpackbits(np.frombuffer(array.buffers()[0], dtype=np.uint8), bitorder="little")
+        valid = valid[array.offset:array.offset + len(array)].astype(bool)
+        values = np.where(valid, values, np.nan)
+    return values
+
+# Numeric column as float64, whatever width it was stored with
+_NUMPY_TYPES = {"double": np.float64, "float": np.float32, "int64": np.int64, "int32": np.int32, "uint64": np.uint64}
+def _floats_of(column):
+    values = _numpy_of(column, _NUMPY_TYPES[str(column.type)])
+    return values.astype(np.float64, copy=False)
+
+def _days_of(column):
+    return _numpy_of(column, np.int64).view(f"datetime64[{column.type.unit}]").astype("datetime64[D]")
+
+def _read_parquet(path):
+    import pandas as pd
+    return pd.read_parquet(path)
+
+def _day(date):
+    if isinstance(date, str):
+        return datetime.strptime(date, "%Y-%m-%d").date()
+    if isinstance(date, datetime):
+        return date.date()
+    return date
+
+def _today():
+    return datetime.now().date()
+
+def _fresh(entry):
+    return datetime.now() - datetime.fromisoformat(entry[2]) < EMPTY_TTL
@@ -0,0 +1,90 @@
+import os
+import pandas as pd
+
+from datetime import timedelta
+from PriceStore import FIELDS
+
+# Price providers return a yfinance shaped frame: DatetimeIndex named Date and
+# columns MultiIndex of (Price, Ticker) with Open/High/Low/Close/Volume.
+# `end` is inclusive for every provider.
+class PriceProvider:
+
+    name = "provider"
+
+    def download(self, tickers, start, end):
+        raise NotImplementedError()
+
+
+class YahooProvider(PriceProvider):
+
+    name = "yahoo"
+
+    # interval is a yfinance bar size, e.g. "1d", or "5m" and "1m" for intraday bars
+    def __init__(self, interval="1d"):
+        self.interval = interval
+
+    # yf.download swallows every error, so each ticker goes through history()
+    # (the same request download makes) with errors raised. Yahoo saying a
+    # ticker has no bars in the range leaves it out, anything else (network,
+    # rate limiting) raises so the chunk is retried.
+    def download(self, tickers, start, end):
+        import warnings
+        import yfinance as yf # only loaded when something is actually fetched
+        from yfinance.exceptions import YFTickerMissingError
+        frames = {}
+        for ticker in tickers:
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", DeprecationWarning) # raise_errors, kept for older yfinance
+                    data = yf.Ticker(ticker).history(start=start, end=end + timedelta(days=1), interval=self.interval,
+                                                     auto_adjust=True, actions=False, raise_errors=True)
+            except YFTickerMissingError:
+                continue
+            if not data.empty:
+                # Exchange local wall clock times, like yf.download
+                data.index = data.index.tz_localize(None) if data.index.tz is not None else data.index
+                frames[ticker] = data[[field for field in FIELDS if field in data.columns]]
+
+        if not frames:
+            return pd.DataFrame()
+        data = pd.concat(frames, axis=1, names=["Ticker", "Price"]).swaplevel(axis=1).sort_index(axis=1)
+        data.index.name = "Date"
+        return data
+
+
+# Offline provider reading one file per ticker from a folder, e.g. data/RELIANCE.NS.csv
+# or data/RELIANCE.NS.parquet, with a Date column (or index) and OHLCV columns.
+class LocalFileProvider(PriceProvider):
+
+    name = "local"
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def download(self, tickers, start, end):
+        frames = {}
+        for ticker in tickers:
+            data = self._read(ticker)
+            if data is None:
+                continue
+            frames[ticker] = data.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+        if not frames:
+            return pd.DataFrame()
+        data = pd.concat(frames, axis=1, names=["Ticker", "Price"]).swaplevel(axis=1).sort_index(axis=1)
+        data.index.name = "Date"
+        return data
+
+    def _read(self, ticker):
+        parquet_file = os.path.join(self.folder, f"{ticker}.parquet")
+        csv_file = os.path.join(self.folder, f"{ticker}.csv")
+        if os.path.exists(parquet_file):
+            data = pd.read_parquet(parquet_file)
+        elif os.path.exists(csv_file):
+            data = pd.read_csv(csv_file)
+        else:
+            return None
+        if "Date" in data.columns:
+            data = data.set_index("Date")
+        data.index = pd.to_datetime(data.index)
+        return data.sort_index()
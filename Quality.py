@@ -0,0 +1,149 @@
+import os
+import numpy as np
+
+from Scoring import window_bounds
+
+# Data quality and coverage index of a price panel, built once when the panel is
+# written and stored next to it as quality.npz:
+#
+#   valid       -> packed bitmap per ticker, bit r set when row r has a close
+#   first/last  -> first and last valid row per ticker, -1 when there is none
+#   jumps       -> (row, ticker, ratio) of day over day moves beyond JUMP_RATIO,
+#                  usually a split or dividend adjustment that went wrong
+#   stale       -> (row, ticker, length) of runs of STALE_DAYS or more unchanged closes
+#
+# On load the bitmaps and flags become cumulative counts per row, so whether a
+# ticker is eligible for a window is a couple of subtractions for every
+# (window, ticker) pair at once instead of re-checking the raw series.
+
+JUMP_RATIO = 1.8    # close moved up more than 80% or down more than 45% in one bar
+STALE_DAYS = 5
+
+def build_quality(closes, jump_ratio=JUMP_RATIO, stale_days=STALE_DAYS):
+    closes = np.asarray(closes, dtype=np.float64)
+    n_rows, n_cols = closes.shape
+    valid = ~np.isnan(closes)
+    rows = np.arange(n_rows)[:, None]
+    if n_rows == 0:
+        first = last = np.full(n_cols, -1)
+    else:
+        first = np.where(valid.any(axis=0), np.argmax(valid, axis=0), -1)
+        last = np.where(valid.any(axis=0), n_rows - 1 - np.argmax(valid[::-1], axis=0), -1)
+
+    # Compare every close with the previous valid one
+    previous_row = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    previous_row = np.vstack([np.full((1, n_cols), -1), previous_row[:-1]])
+    previous = np.where(previous_row >= 0, closes[np.maximum(previous_row, 0), np.arange(n_cols)], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = closes / previous
+    jump_rows, jump_cols = np.nonzero(valid & ((ratio > jump_ratio) | (ratio < 1 / jump_ratio)))
+
+    # Stale runs: consecutive valid bars with an unchanged close
+    unchanged = valid & (ratio == 1)
+    stale_rows, stale_cols, stale_lengths = _runs(unchanged, stale_days - 1)
+
+    return {
+        "rows": np.int64(n_rows),
+        "valid": np.packbits(valid, axis=0),
+        "first": first.astype(np.int64),
+        "last": last.astype(np.int64),
+        "jump_rows": jump_rows.astype(np.int64),
+        "jump_cols": jump_cols.astype(np.int64),
+        "jump_ratios": ratio[jump_rows, jump_cols],
+        "stale_rows": stale_rows,
+        "stale_cols": stale_cols,
+        "stale_lengths": stale_lengths + 1,
+        "jump_ratio": np.float64(jump_ratio),
+        "stale_days": np.int64(stale_days),
+    }
+
+# (first row, column, length) of every run of True at least min_length long,
+# where the first row is the bar before the run (the first unchanged close)
+def _runs(flags, min_length):
+    n_rows, n_cols = flags.shape
+    padded = np.vstack([np.zeros((1, n_cols), dtype=np.int8), flags.astype(np.int8), np.zeros((1, n_cols), dtype=np.int8)])
+    edges = np.diff(padded, axis=0)
+    start_rows, start_cols = np.nonzero(edges.T == 1)[::-1]
+    end_rows, end_cols = np.nonzero(edges.T == -1)[::-1]
+    # nonzero on the transpose orders by column then row, so starts and ends pair up
+    lengths = end_rows - start_rows
+    keep = lengths >= max(min_length, 1)
+    return (start_rows[keep] - 1).astype(np.int64), start_cols[keep].astype(np.int64), lengths[keep].astype(np.int64)
+
+def save_quality(folder, quality):
+    np.savez_compressed(os.path.join(folder, "quality.npz"), **quality)
+
+
+class QualityIndex:
+
+    def __init__(self, dates, tickers, quality):
+        self.dates = dates
+        self.columns = {ticker: i for (i, ticker) in enumerate(tickers)}
+        n_rows, n_cols = int(quality["rows"]), len(tickers)
+        self.first = quality["first"]
+        self.last = quality["last"]
+        self.jumps = (quality["jump_rows"], quality["jump_cols"], quality["jump_ratios"])
+        self.stale = (quality["stale_rows"], quality["stale_cols"], quality["stale_lengths"])
+
+        valid = np.unpackbits(quality["valid"], axis=0, count=n_rows).astype(np.int32)
+        self.valid_counts = np.vstack([np.zeros((1, n_cols), dtype=np.int32), np.cumsum(valid, axis=0, dtype=np.int32)])
+        self.jump_counts = _cumulative_flags(n_rows, n_cols, self.jumps[0], self.jumps[1])
+        stale_flags = np.zeros((n_rows + 1, n_cols), dtype=np.int32)
+        np.add.at(stale_flags, (self.stale[0], self.stale[1]), 1)
+        np.add.at(stale_flags, (np.minimum(self.stale[0] + self.stale[2], n_rows), self.stale[1]), -1)
+        self.stale_counts = np.vstack([np.zeros((1, n_cols), dtype=np.int32), np.cumsum(np.cumsum(stale_flags, axis=0)[:-1] > 0, axis=0, dtype=np.int32)])
+
+    # Share of sessions in [start, end] with a bar, per (window, ticker)
+    def coverage(self, tickers, start_dates, end_dates):
+        first, last, cols = self._window(tickers, start_dates, end_dates)
+        counts = self.valid_counts[last, cols] - self.valid_counts[first, cols]
+        sessions = last - first
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(sessions > 0, counts / sessions, 0.0)
+
+    # (windows x tickers) mask of tickers usable over [start, end]: enough bars,
+    # no suspicious jump and no stale run inside the window. Tickers missing from
+    # the panel are never eligible.
+    def eligible(self, tickers, start_dates, end_dates, min_coverage=0.8, allow_jumps=False, allow_stale=False):
+        first, last, cols = self._window(tickers, start_dates, end_dates)
+        counts = self.valid_counts[last, cols] - self.valid_counts[first, cols]
+        sessions = last - first
+        mask = (sessions > 0) & (counts >= min_coverage * sessions) & (counts >= 2)
+        if not allow_jumps:
+            mask &= (self.jump_counts[last, cols] - self.jump_counts[first, cols]) == 0
+        if not allow_stale:
+            mask &= (self.stale_counts[last, cols] - self.stale_counts[first, cols]) == 0
+        return mask & self._known(tickers)[None, :]
+
+    # Eligibility over the momentum lookback window of each rebalance date
+    def eligible_for(self, tickers, rebalance_dates, lookback_months=12, skip_months=1, **rules):
+        start, end = window_bounds(rebalance_dates, lookback_months, skip_months)
+        return self.eligible(tickers, start, end, **rules)
+
+    # Flagged jumps of a ticker as (date, ratio) pairs
+    def jumps_of(self, ticker):
+        col = self.columns.get(ticker, -1)
+        rows, cols, ratios = self.jumps
+        return [(self.dates[row], ratio) for (row, ratio) in zip(rows[cols == col], ratios[cols == col])]
+
+    def _known(self, tickers):
+        return np.array([ticker in self.columns for ticker in tickers], dtype=bool)
+
+    # Cumulative row bounds [first, last) of each window and the ticker columns
+    def _window(self, tickers, start_dates, end_dates):
+        first = np.searchsorted(self.dates, np.asarray(start_dates, dtype="datetime64[D]"), side="left")
+        last = np.searchsorted(self.dates, np.asarray(end_dates, dtype="datetime64[D]"), side="right")
+        cols = np.array([self.columns.get(ticker, 0) for ticker in tickers], dtype=np.int64)
+        return first[:, None], last[:, None], cols[None, :]
+
+    def __str__(self):
+        return f"QualityIndex(Tickers: {len(self.columns)}, Jumps: {len(self.jumps[0])}, Stale runs: {len(self.stale[0])})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def _cumulative_flags(n_rows, n_cols, rows, cols):
+    flags = np.zeros((n_rows, n_cols), dtype=np.int32)
+    np.add.at(flags, (rows, cols), 1)
+    return np.vstack([np.zeros((1, n_cols), dtype=np.int32), np.cumsum(flags, axis=0, dtype=np.int32)])
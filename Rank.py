@@ -0,0 +1,47 @@
+import time
+_started = time.perf_counter()
+
+import sys
+import argparse
+import numpy as np
+
+from datetime import datetime
+from App import read_nse_index
+from DateUtil import date_from
+from Scoring import momentum_scores, top_n
+import YF
+
+# Fast entry point for scheduled jobs: rank an index by 12-minus-1 momentum for
+# one date, served from the local price store.
+#
+#   python Rank.py ind_nifty50list.csv --date 2025-06-27 --offline
+#
+# Only NumPy and pyarrow are loaded on this path. pandas, the fetch layer and
+# yfinance are imported only if the store is missing data and we are online.
+
+def rank(tickers, target_date, top=10):
+    start_date, _ = YF.window_of(target_date)
+    dates, yf_tickers, closes = YF.price_panel(tickers, start_date, target_date)
+    scores = momentum_scores(dates, closes, [target_date])[0]
+    scores[~YF.eligible_tickers(YF.price_store(), yf_tickers, [target_date])[0]] = np.nan
+    picks = top_n(scores[None, :], top)[0]
+    return [(yf_tickers[i], scores[i]) for i in picks if i >= 0]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank index constituents by 12-minus-1 momentum")
+    parser.add_argument("index_csv")
+    parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--offline", action="store_true", help="never download, use only the local price store")
+    args = parser.parse_args()
+
+    if args.offline:
+        YF.set_offline()
+    imported = time.perf_counter()
+
+    ranking = rank(read_nse_index(args.index_csv), date_from(args.date), args.top)
+    for (position, (ticker, score)) in enumerate(ranking, start=1):
+        print(f"{position:>3}. {ticker:<16} {score * 100:8.2f}%")
+
+    done = time.perf_counter()
+    print(f"\nImports {(imported - _started) * 1000:.0f}ms, first ranking {(done - _started) * 1000:.0f}ms, pandas loaded: {'pandas' in sys.modules}")
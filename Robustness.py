@@ -0,0 +1,183 @@
+import numpy as np
+import Metrics
+import Sweep
+import Trace
+
+from concurrent.futures import ProcessPoolExecutor
+from CLI import println
+from Scoring import momentum_scores, month_end_rows, top_n as top_n_of
+
+# Monte Carlo robustness of the monthly momentum strategy.
+#
+#   bootstrap -> circular block bootstrap of the historical monthly strategy returns
+#   universe  -> the strategy re-run on a random subset of the universe per path
+#   noise     -> the strategy re-run with Gaussian noise added to every ranking
+#
+# Paths are generated in chunks as batched arrays (chunk x periods x picks) and
+# the chunks run on a process pool. Every chunk draws from its own generator
+# spawned from one SeedSequence, so a study is reproducible for a seed whatever
+# the number of workers.
+
+METHODS = ("bootstrap", "universe", "noise")
+PERCENTILES = (5, 25, 50, 75, 95)
+
+_shared = None
+
+def _share(strategy_returns, scores, period_returns):
+    global _shared
+    _shared = (strategy_returns, scores, period_returns)
+
+def bootstrap_paths(returns, n_paths, block_length, rng):
+    n = len(returns)
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n, size=(n_paths, n_blocks))
+    rows = (starts[:, :, None] + np.arange(block_length)[None, None, :]) % n
+    return returns[rows.reshape(n_paths, -1)[:, :n]].T
+
+# Equal weight return of the picked columns, (paths x periods x picks) -> (periods x paths)
+def _held_returns(period_returns, picks, picked):
+    held = period_returns[np.arange(period_returns.shape[0])[None, :, None], picks]
+    picked = picked & np.isfinite(held)
+    counts = picked.sum(axis=2)
+    return np.where(counts > 0, np.where(picked, held, 0).sum(axis=2) / np.maximum(counts, 1), 0.0).T
+
+# A random subset keeps the order of the full ranking, so each period's tickers
+# are sorted once and a path's picks are the first top_n kept ones in that order
+def universe_paths(scores, period_returns, n_paths, fraction, top_n, rng):
+    order = np.argsort(np.where(np.isfinite(scores), -scores, np.inf), axis=1, kind="stable")
+    ranked = np.take_along_axis(np.isfinite(scores), order, axis=1)
+    keep = rng.random((n_paths, scores.shape[1])) < fraction
+    # Only the head of the ranking can be picked, use all of it if a path runs short
+    depth = min(scores.shape[1], int(np.ceil(4 * top_n / max(fraction, 1e-3))))
+    kept = keep[:, order[:, :depth]] & ranked[None, :, :depth]
+    if depth < scores.shape[1] and (kept.sum(axis=2) < np.minimum(top_n, ranked.sum(axis=1))[None]).any():
+        depth = scores.shape[1]
+        kept = keep[:, order] & ranked[None]
+    chosen = kept & (np.cumsum(kept, axis=2, dtype=np.int32) <= top_n)
+    ranked_returns = np.take_along_axis(period_returns, order[:, :depth], axis=1)
+    picked = chosen & np.isfinite(ranked_returns)[None]
+    counts = picked.sum(axis=2)
+    total = np.where(picked, ranked_returns[None], 0).sum(axis=2)
+    return np.where(counts > 0, total / np.maximum(counts, 1), 0.0).T
+
+# Noise is scaled by each date's cross-sectional score dispersion and every
+# ticker with a score is perturbed. Only set membership matters, so a float32
+# argpartition finds every path's picks, and the noise is drawn for NOISE_BLOCK
+# values at a time so memory stays bounded whatever the chunk size. The normals
+# dominate the cost: over 200 months and 500 tickers a chunk of 500 paths takes
+# about 1.5s, so 50k paths take about 150 core-seconds.
+#
+# With `reach` only the tickers scoring within reach * noise deviations of the
+# top_n-th are perturbed, the others keep their place below the picks. That is
+# an approximation (at reach 4 fewer than 1 in 4000 path-dates would change with
+# 500 tickers and noise 0.5) which cuts the cost to about 1.0s per chunk.
+NOISE_BLOCK = 1 << 24
+
+def noise_paths(scores, period_returns, n_paths, noise, top_n, rng, reach=None):
+    with np.errstate(invalid="ignore"):
+        spread = np.nan_to_num(np.nanstd(scores, axis=1, keepdims=True))
+    n = min(top_n, scores.shape[1])
+    order = np.argsort(np.where(np.isfinite(scores), -scores, np.inf), axis=1, kind="stable")
+    ranked = np.take_along_axis(np.where(np.isfinite(scores), scores, -np.inf), order, axis=1)
+    in_reach = np.isfinite(ranked)
+    if reach is not None:
+        in_reach &= ranked >= ranked[:, n - 1:n] - reach * noise * spread
+    depth = max(n, int(in_reach.sum(axis=1).max()))
+    candidates = order[:, :depth]
+    base = ranked[:, :depth].astype(np.float32)
+    scale = (noise * spread).astype(np.float32)[None]
+
+    best = np.empty((n_paths, base.shape[0], n), dtype=np.intp)
+    picked = np.empty((n_paths, base.shape[0], n), dtype=bool)
+    block = max(1, NOISE_BLOCK // max(base.size, 1))
+    for start in range(0, n_paths, block):
+        stop = min(start + block, n_paths)
+        noisy = rng.standard_normal((stop - start,) + base.shape, dtype=np.float32)
+        noisy *= scale
+        noisy += base[None]
+        best[start:stop] = np.argpartition(-noisy, n - 1, axis=2)[:, :, :n]
+        picked[start:stop] = np.isfinite(np.take_along_axis(noisy, best[start:stop], axis=2))
+    return _held_returns(period_returns, candidates[np.arange(len(candidates))[None, :, None], best], picked)
+
+def _run_chunk(task):
+    method, n_paths, seed, options = task
+    strategy_returns, scores, period_returns = _shared
+    rng = np.random.default_rng(seed)
+    if method == "bootstrap":
+        paths = bootstrap_paths(strategy_returns, n_paths, options["block_months"], rng)
+    elif method == "universe":
+        paths = universe_paths(scores, period_returns, n_paths, options["fraction"], options["top_n"], rng)
+    else:
+        paths = noise_paths(scores, period_returns, n_paths, options["noise"], options["top_n"], rng, options["noise_reach"])
+    return {
+        "final_return": Metrics.total_return(paths),
+        "max_drawdown": Metrics.max_drawdown(paths),
+        "sharpe": Metrics.sharpe_ratio(paths, 12),
+    }
+
+def distribution(values):
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return {"mean": np.nan, **{f"p{p}": np.nan for p in PERCENTILES}}
+    return {"mean": float(finite.mean()), **{f"p{p}": float(v) for (p, v) in zip(PERCENTILES, np.percentile(finite, PERCENTILES))}}
+
+# Distributions of final return, max drawdown and Sharpe for each method, plus the
+# historical path's values, as {method: {metric: {statistic: value}}}
+def robustness_study(dates, closes, n_paths=50000, methods=METHODS, top_n=10, lookback_months=12, skip_months=1,
+                     block_months=6, fraction=0.7, noise=0.5, noise_reach=None, seed=7, workers=None, chunk_paths=500):
+    rows = month_end_rows(dates)
+    scores = momentum_scores(dates, closes, dates[rows], lookback_months, skip_months)[:-1]
+    period_returns = Sweep.period_returns(closes, rows)
+    strategy_returns = Sweep.equal_weight_returns(period_returns, top_n_of(scores, top_n))
+    # Periods before the first full lookback window hold nothing, leave them out
+    first = int(np.argmax(np.isfinite(scores).any(axis=1))) if np.isfinite(scores).any() else len(scores)
+    scores, period_returns, strategy_returns = scores[first:], period_returns[first:], strategy_returns[first:]
+    println(f"Robustness study: {n_paths} paths per method over {len(strategy_returns)} months and {closes.shape[1]} tickers")
+
+    options = {"top_n": top_n, "block_months": block_months, "fraction": fraction, "noise": noise, "noise_reach": noise_reach}
+    sizes = [min(chunk_paths, n_paths - start) for start in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(methods) * len(sizes))
+    tasks = [(method, size, seeds[i * len(sizes) + j], options) for (i, method) in enumerate(methods) for (j, size) in enumerate(sizes)]
+
+    with Trace.span("robustness", paths=n_paths, methods=len(methods)):
+        if workers == 0:
+            _share(strategy_returns, scores, period_returns)
+            results = [_run_chunk(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_share, initargs=(strategy_returns, scores, period_returns)) as pool:
+                results = list(pool.map(_run_chunk, tasks))
+
+    historical = Metrics.summary(strategy_returns, 12)
+    report = {"historical": {"final_return": float(historical["total_return"][0]), "max_drawdown": float(historical["max_drawdown"][0]), "sharpe": float(historical["sharpe"][0])}}
+    for (i, method) in enumerate(methods):
+        chunks = results[i * len(sizes):(i + 1) * len(sizes)]
+        report[method] = {metric: distribution(np.concatenate([chunk[metric] for chunk in chunks])) for metric in chunks[0]}
+    return report
+
+def print_report(report):
+    print(f"\nHistorical: {', '.join(f'{name} {value:.3f}' for (name, value) in report['historical'].items())}")
+    print(f"\n{'Method':<10} {'Metric':<13}" + "".join(f"{name:>9}" for name in ["mean"] + [f"p{p}" for p in PERCENTILES]))
+    for method, metrics in report.items():
+        if method == "historical":
+            continue
+        for metric, stats in metrics.items():
+            print(f"{method:<10} {metric:<13}" + "".join(f"{value:>9.3f}" for value in stats.values()))
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+    from YF import price_panel
+    from DateUtil import date_from
+
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness of the momentum strategy")
+    parser.add_argument("index_csv")
+    parser.add_argument("--start", default="2015-01-01")
+    parser.add_argument("--end", default="2025-06-27")
+    parser.add_argument("--paths", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--noise-reach", type=float, help="Perturb only tickers within this many noise deviations of the top N (approximate, faster)")
+    args = parser.parse_args()
+
+    dates, _, closes = price_panel(read_nse_index(args.index_csv), date_from(args.start), date_from(args.end))
+    print_report(robustness_study(dates, closes, n_paths=args.paths, noise_reach=args.noise_reach, seed=args.seed, workers=args.workers))
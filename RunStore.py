@@ -0,0 +1,257 @@
+import os
+import glob
+import json
+import time
+import shutil
+import tempfile
+import hashlib
+import numpy as np
+
+from CLI import println, debug
+import Trace
+
+# Content addressed store of complete backtest runs.
+#
+#   .store/runs/index.jsonl            -> one line per stored run: key, time, inputs, metrics, bytes
+#   .store/runs/<key>/equity.parquet   -> date, equity, returns
+#   .store/runs/<key>/trades.parquet   -> date, ticker, weight_before, weight_after
+#
+# A run's key is a hash of everything that determines its result: the universe,
+# the price data version (the panel's source hash), the strategy parameters and
+# the code version (a hash of this repo's sources). Asking for the same run again
+# returns the stored one without simulating. The index is append-only, it is only
+# rewritten when evict() drops runs by age or total size.
+
+INDEX_FILE = "index.jsonl"
+
+class StoredRun:
+
+    def __init__(self, key, entry, folder):
+        self.key = key
+        self.inputs = entry["inputs"]
+        self.metrics = entry["metrics"]
+        self.created = entry["created"]
+        self.folder = folder
+
+    def equity(self):
+        return _read_columns(os.path.join(self.folder, "equity.parquet"))
+
+    def trades(self):
+        return _read_columns(os.path.join(self.folder, "trades.parquet"))
+
+    def __str__(self):
+        return f"StoredRun({self.key[:12]}, Inputs: {self.inputs}, Metrics: {self.metrics})"
+
+    def __repr__(self):
+        return str(self)
+
+
+class RunStore:
+
+    def __init__(self, root=".store/runs"):
+        self.root = root
+        self.index_file = os.path.join(root, INDEX_FILE)
+        self.entries = self._load_index()
+
+    def key(self, inputs):
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if key not in self.entries:
+            self._read_new_entries()
+        entry = self.entries.get(key)
+        if entry is None or not os.path.isdir(self._folder(key)):
+            return None
+        return StoredRun(key, entry, self._folder(key))
+
+    # columns are {"equity": {name: array}, "trades": {name: array}}
+    def put(self, key, inputs, metrics, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        folder = self._folder(key)
+        staging = tempfile.mkdtemp(prefix=f"{key}.", suffix=".tmp", dir=self.root)
+        for name, table in columns.items():
+            pq.write_table(pa.table({column: np.asarray(values) for (column, values) in table.items()}), os.path.join(staging, f"{name}.parquet"))
+        try:
+            os.replace(staging, folder)
+        except OSError:
+            # The key fixes the content, so a folder another writer moved in first is kept
+            debug(f"Discarding {staging}, {folder} was stored concurrently")
+            shutil.rmtree(staging, ignore_errors=True)
+
+        entry = {"key": key, "created": time.time(), "inputs": inputs, "metrics": metrics, "bytes": _size_of(folder)}
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+        self._read_new_entries()
+        return StoredRun(key, entry, folder)
+
+    # Stored run for these inputs, computing and storing it first if needed.
+    # compute() returns (metrics, columns) as taken by put.
+    def memoized(self, inputs, compute):
+        key = self.key(inputs)
+        stored = self.get(key)
+        if stored is not None:
+            Trace.count("run_store_hits")
+            debug(f"Run {key[:12]} served from the run store")
+            return stored
+        Trace.count("run_store_misses")
+        with Trace.span("run_store.compute", key=key[:12]):
+            metrics, columns = compute()
+        return self.put(key, inputs, metrics, columns)
+
+    # Stored runs whose inputs match every filter, newest first. A filter value
+    # may be a callable taking the input value, e.g. top_n=lambda n: n >= 10
+    def runs(self, **filters):
+        self._read_new_entries()
+        matches = []
+        for key, entry in self.entries.items():
+            inputs = entry["inputs"]
+            if all((value(inputs.get(name)) if callable(value) else inputs.get(name) == value) for (name, value) in filters.items()):
+                matches.append(StoredRun(key, entry, self._folder(key)))
+        return sorted(matches, key=lambda run: -run.created)
+
+    # Metrics of several runs side by side, {metric: [value per run]}
+    def compare(self, runs, metrics=None):
+        names = metrics or sorted({name for run in runs for name in run.metrics})
+        return {name: [run.metrics.get(name) for run in runs] for name in names}
+
+    # Drop runs older than max_age_days, then the oldest ones until the store fits in max_bytes
+    def evict(self, max_bytes=None, max_age_days=None):
+        ordered = sorted(self.entries.values(), key=lambda entry: entry["created"])
+        evicted = []
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            evicted += [entry for entry in ordered if entry["created"] < cutoff]
+        if max_bytes is not None:
+            remaining = [entry for entry in ordered if entry not in evicted]
+            total = sum(entry["bytes"] for entry in remaining)
+            for entry in remaining:
+                if total <= max_bytes:
+                    break
+                evicted.append(entry)
+                total -= entry["bytes"]
+        if not evicted:
+            return 0
+
+        for entry in evicted:
+            shutil.rmtree(self._folder(entry["key"]), ignore_errors=True)
+            del self.entries[entry["key"]]
+        with open(f"{self.index_file}.tmp", "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, default=str) + "\n")
+        os.replace(f"{self.index_file}.tmp", self.index_file)
+        self.index_offset = os.path.getsize(self.index_file)
+        println(f"Evicted {len(evicted)} runs from {self.root}")
+        return len(evicted)
+
+    def _folder(self, key):
+        return os.path.join(self.root, key)
+
+    def _load_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.entries, self.index_offset = {}, 0
+        self._read_new_entries()
+        return self.entries
+
+    # Pick up runs other processes appended since the last read. Later lines win,
+    # so a re-stored key replaces the earlier entry.
+    def _read_new_entries(self):
+        if not os.path.exists(self.index_file):
+            return
+        if os.path.getsize(self.index_file) < self.index_offset:
+            self.entries, self.index_offset = {}, 0 # rewritten by evict
+        with open(self.index_file, "r", encoding="utf-8") as f:
+            f.seek(self.index_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                entry = json.loads(line)
+                self.entries[entry["key"]] = entry
+                self.index_offset += len(line.encode("utf-8"))
+
+    def __str__(self):
+        return f"RunStore(Runs: {len(self.entries)}, Bytes: {sum(entry['bytes'] for entry in self.entries.values())})"
+
+    def __repr__(self):
+        return str(self)
+
+
+_code_version = None
+def code_version():
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+            with open(path, "rb") as f:
+                digest.update(os.path.basename(path).encode("utf-8") + f.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+_run_store = None
+def run_store():
+    global _run_store
+    if _run_store is None:
+        _run_store = RunStore()
+    return _run_store
+
+# Monthly factor strategy over a universe, simulated with the weights engine and
+# memoized in the run store. Returns the StoredRun. With an open `panel` prices
+# come straight from it and nothing is fetched.
+def backtest(tickers, start_date, end_date, factor="momentum_12_1", scheme="equal", top_n=10, cap=0.2,
+             commission_bps=3.0, slippage_bps=5.0, index_name=None, store=None, panel=None):
+    from YF import price_store, price_panel, window_start, constituents
+    from Panel import current_panel
+    from Factors import factor_scores
+    from Scoring import month_end_rows
+    from WeightsBacktest import target_weights, run_weights
+
+    if index_name is not None and constituents().has_history(index_name):
+        tickers = constituents().ever_members(index_name, start_date, end_date)
+    tickers = sorted(tickers)
+    if panel is None:
+        dates, yf_tickers, closes = price_panel(tickers, window_start(start_date), end_date)
+        panel = current_panel(price_store())
+    else:
+        dates, yf_tickers, closes = panel.window([f"{ticker}.NS" for ticker in tickers], window_start(start_date), end_date)
+    inputs = {
+        "universe": tickers,
+        "index_name": index_name,
+        "start_date": str(np.datetime64(start_date, "D")),
+        "end_date": str(np.datetime64(end_date, "D")),
+        "data_version": panel.meta["source"],
+        "code_version": code_version(),
+        "factor": factor,
+        "scheme": scheme,
+        "top_n": top_n,
+        "cap": cap,
+        "commission_bps": commission_bps,
+        "slippage_bps": slippage_bps,
+    }
+
+    def compute():
+        rebalance_dates = dates[month_end_rows(dates)]
+        rebalance_dates = rebalance_dates[rebalance_dates >= np.datetime64(start_date, "D")]
+        scores = factor_scores(dates, closes, rebalance_dates, [factor])[factor]
+        if index_name is not None and constituents().has_history(index_name):
+            scores = np.where(constituents().masks(index_name, rebalance_dates, tickers), scores, np.nan)
+        quality = panel.quality()
+        if quality is not None:
+            scores = np.where(quality.eligible_for(yf_tickers, rebalance_dates), scores, np.nan)
+        result = run_weights(dates, closes, rebalance_dates, target_weights(scores, scheme, top_n, cap), commission_bps, slippage_bps)
+        trades = result.trades()
+        trades["ticker"] = np.array(yf_tickers, dtype=object)[trades["ticker"]].astype(str)
+        metrics = {name: float(value) for (name, value) in result.summary().items()}
+        return metrics, {
+            "equity": {"date": result.dates, "equity": result.equity, "returns": result.returns},
+            "trades": trades,
+        }
+
+    return (store or run_store()).memoized(inputs, compute)
+
+def _read_columns(path):
+    import pyarrow.parquet as pq
+    table = pq.read_table(path)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+def _size_of(folder):
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
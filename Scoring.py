@@ -0,0 +1,112 @@
+import numpy as np
+
+# Vectorized cross-sectional momentum scoring.
+#
+# Works on a close-price matrix of shape (dates x tickers) with NaN for missing
+# bars. All rebalance dates are scored in one pass: window edges are located with
+# searchsorted and missing bars are resolved through precomputed "next valid" and
+# "last valid" row indices, so there is no per-ticker or per-date Python loop.
+
+# (start, end) day of the lookback window for each rebalance date.
+# For 12-1 momentum on 2025-06-27 this is (2024-05-01, 2025-05-31).
+def window_bounds(rebalance_dates, lookback_months=12, skip_months=1):
+    days = np.asarray(rebalance_dates, dtype="datetime64[D]")
+    months = days.astype("datetime64[M]")
+    if skip_months > 0:
+        end = (months - (skip_months - 1)).astype("datetime64[D]") - np.timedelta64(1, "D")
+    else:
+        end = days
+    start = (end.astype("datetime64[M]") - lookback_months).astype("datetime64[D]")
+    return start, end
+
+# Row index of the last valid (non-NaN) bar at or before each row, -1 if none
+def last_valid_rows(closes):
+    n_rows = closes.shape[0]
+    rows = np.where(np.isnan(closes), -1, np.arange(n_rows)[:, None])
+    return np.maximum.accumulate(rows, axis=0)
+
+# Row index of the first valid (non-NaN) bar at or after each row, n_rows if none
+def next_valid_rows(closes):
+    n_rows = closes.shape[0]
+    rows = np.where(np.isnan(closes), n_rows, np.arange(n_rows)[:, None])
+    return np.minimum.accumulate(rows[::-1], axis=0)[::-1]
+
+# Row index of the last date <= each target date (-1 if before the first date)
+def as_of_rows(dates, targets):
+    return np.searchsorted(dates, targets, side="right") - 1
+
+# 12-minus-1 style momentum for every (rebalance date, ticker) pair in one pass.
+# Result is (rebalance dates x tickers), NaN where a ticker has fewer than 2 bars in the window.
+def momentum_scores(dates, closes, rebalance_dates, lookback_months=12, skip_months=1):
+    start, end = window_bounds(rebalance_dates, lookback_months, skip_months)
+    return window_returns(dates, closes, start, end)
+
+# Return from the first bar on/after each start date to the last bar on/before the
+# matching end date, per ticker
+def window_returns(dates, closes, start_dates, end_dates):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    closes = np.asarray(closes, dtype=np.float64)
+    n_rows, n_cols = closes.shape
+    start_rows = np.searchsorted(dates, np.asarray(start_dates, dtype="datetime64[D]"), side="left")
+    end_rows = as_of_rows(dates, np.asarray(end_dates, dtype="datetime64[D]"))
+
+    if n_rows == 0:
+        return np.full((len(start_rows), n_cols), np.nan)
+
+    next_valid = np.vstack([next_valid_rows(closes), np.full((1, n_cols), n_rows)])
+    last_valid = last_valid_rows(closes)
+    first_bar = next_valid[start_rows]                                  # (windows x tickers)
+    last_bar = np.where(end_rows[:, None] >= 0, last_valid[np.maximum(end_rows, 0)], -1)
+
+    usable = (first_bar < last_bar) & (last_bar >= 0)
+    cols = np.arange(n_cols)
+    begin_price = closes[np.minimum(first_bar, n_rows - 1), cols]
+    end_price = closes[np.maximum(last_bar, 0), cols]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(usable & (begin_price > 0), end_price / begin_price - 1, np.nan)
+
+# Close price as of each rebalance date (last valid bar at or before it)
+def prices_as_of(dates, closes, rebalance_dates):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    closes = np.asarray(closes, dtype=np.float64)
+    rows = as_of_rows(dates, np.asarray(rebalance_dates, dtype="datetime64[D]"))
+    if closes.shape[0] == 0:
+        return np.full((len(rows), closes.shape[1]), np.nan)
+    last_valid = last_valid_rows(closes)[np.maximum(rows, 0)]
+    last_valid = np.where(rows[:, None] >= 0, last_valid, -1)
+    prices = closes[np.maximum(last_valid, 0), np.arange(closes.shape[1])]
+    return np.where(last_valid >= 0, prices, np.nan)
+
+# Column indices of the n best scores per row, best first. NaN scores are never
+# selected; rows with fewer than n valid scores are padded with -1.
+def top_n(scores, n):
+    n_rows, n_cols = scores.shape
+    n = min(n, n_cols)
+    if n == 0:
+        return np.empty((n_rows, 0), dtype=np.int64)
+    ranked = np.where(np.isnan(scores), -np.inf, scores)
+    picked = np.argpartition(-ranked, n - 1, axis=1)[:, :n]
+    order = np.argsort(-np.take_along_axis(ranked, picked, axis=1), axis=1, kind="stable")
+    picked = np.take_along_axis(picked, order, axis=1)
+    valid = np.isfinite(np.take_along_axis(ranked, picked, axis=1))
+    return np.where(valid, picked, -1)
+
+# (dates, tickers, closes) from a yfinance shaped frame with (Price, Ticker) columns
+def close_panel(data, tickers=None):
+    if data is None or data.empty or "Close" not in data.columns.get_level_values(0):
+        tickers = list(tickers or [])
+        return np.empty(0, dtype="datetime64[D]"), tickers, np.empty((0, len(tickers)))
+    close = data["Close"]
+    if tickers is not None:
+        close = close.reindex(columns=list(tickers))
+    dates = close.index.values.astype("datetime64[D]")
+    return dates, list(close.columns), close.to_numpy(dtype=np.float64)
+
+# Rows holding the last trading date of each month, keeping every `every_months`-th one
+def month_end_rows(dates, every_months=1):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    if len(dates) == 0:
+        return np.empty(0, dtype=np.int64)
+    months = dates.astype("datetime64[M]")
+    rows = np.flatnonzero(np.append(months[1:] != months[:-1], True))
+    return rows[::-1][::every_months][::-1]
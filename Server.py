@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import argparse
+import threading
+import socketserver
+
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from CLI import println
+import Trace
+
+# Long-running backtest server.
+#
+#   python Server.py --port 8765             (or --socket /tmp/backtest.sock)
+#   curl -N -d '{"index_name": "NIFTY 50", "start": "2024-06-01", "end": "2025-06-27"}' localhost:8765/backtest
+#
+# Every worker process opens the memory mapped price panel, the trading calendar
+# and the constituent store once in its initializer and keeps them for its whole
+# life, so a request only pays for its simulation. Workers map the same panel
+# files and share their pages.
+#
+#   POST /backtest   run one backtest, streams newline delimited JSON events:
+#                    accepted, running (with elapsed seconds) and done or error
+#   GET  /runs       stored runs, query parameters filter on their inputs
+#   GET  /health     panel and pool status
+#   POST /reload     reopen the panel in fresh workers after new data arrived
+#
+# Results go through the run store, so repeating a request is served from it.
+
+REQUEST_FIELDS = {"tickers", "index_name", "start", "end", "factor", "scheme", "top_n", "cap", "commission_bps", "slippage_bps"}
+
+_state = None
+
+# Workers only map the panel the parent brought up to date in reload(), so they
+# never rebuild it concurrently
+def _open_state(panel_folder, offline):
+    global _state
+    import YF
+    from Panel import Panel
+    if offline:
+        YF.set_offline()
+    # Import the simulation path up front so the first request does not pay for it
+    import RunStore, Factors, WeightsBacktest, pyarrow.parquet, pandas
+    _state = {"panel": Panel(panel_folder), "calendar": YF.trading_calendar(), "constituents": YF.constituents()}
+
+def _run(request):
+    from RunStore import backtest
+    from DateUtil import date_from
+    run = backtest(request.get("tickers") or [], date_from(request["start"]), date_from(request["end"]),
+                   factor=request.get("factor", "momentum_12_1"), scheme=request.get("scheme", "equal"),
+                   top_n=int(request.get("top_n", 10)), cap=float(request.get("cap", 0.2)),
+                   commission_bps=float(request.get("commission_bps", 3.0)), slippage_bps=float(request.get("slippage_bps", 5.0)),
+                   index_name=request.get("index_name"), panel=_state["panel"])
+    equity = run.equity()
+    return {
+        "key": run.key,
+        "metrics": run.metrics,
+        "equity": {"date": [str(day)[:10] for day in equity["date"]], "equity": equity["equity"].tolist()},
+    }
+
+def _panel_info():
+    panel = _state["panel"]
+    return {"days": len(panel.dates), "tickers": len(panel.tickers), "first": str(panel.dates[0]) if len(panel.dates) else None,
+            "last": str(panel.dates[-1]) if len(panel.dates) else None, "source": panel.meta["source"]}
+
+
+class BacktestService:
+
+    def __init__(self, workers=None, offline=False):
+        self.workers = workers or os.cpu_count()
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.pool = None
+        self.reload()
+
+    def reload(self):
+        import YF
+        from Panel import current_panel
+        from PriceStore import PriceStore
+        # A fresh store sees data other processes wrote since the last reload
+        panel = current_panel(PriceStore(YF.price_store().root))
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_open_state, initargs=(panel.folder, self.offline))
+        self.panel = pool.submit(_panel_info).result()
+        with self.lock:
+            previous, self.pool = self.pool, pool
+        if previous is not None:
+            previous.shutdown(wait=False)
+        println(f"Serving {self.panel['tickers']} tickers over {self.panel['days']} days with {self.workers} workers")
+
+    # Events of one request as they happen
+    def stream(self, request, heartbeat=1.0):
+        with self.lock:
+            self.requests += 1
+            number = self.requests
+            future = self.pool.submit(_run, request)
+        started = time.perf_counter()
+        yield {"event": "accepted", "request": number}
+        while True:
+            try:
+                result = future.result(timeout=heartbeat)
+                break
+            except TimeoutError:
+                yield {"event": "running" if future.running() else "queued", "request": number, "elapsed": round(time.perf_counter() - started, 3)}
+            except Exception as e:
+                yield {"event": "error", "request": number, "error": f"{type(e).__name__}: {e}"}
+                return
+        Trace.count("server_requests")
+        yield {"event": "done", "request": number, "elapsed": round(time.perf_counter() - started, 3), **result}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json({"panel": self.service.panel, "workers": self.service.workers, "requests": self.service.requests})
+        elif url.path == "/runs":
+            from RunStore import run_store
+            filters = {name: _parse_value(values[-1]) for (name, values) in parse_qs(url.query).items()}
+            self._send_json([{"key": run.key, "created": run.created, "inputs": run.inputs, "metrics": run.metrics} for run in run_store().runs(**filters)])
+        else:
+            self._send_json({"error": f"Unknown path {url.path}"}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/reload":
+            self.service.reload()
+            self._send_json({"panel": self.service.panel})
+            return
+        if url.path != "/backtest":
+            self._send_json({"error": f"Unknown path {url.path}"}, 404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            unknown = set(request) - REQUEST_FIELDS
+            if unknown or "start" not in request or "end" not in request:
+                raise ValueError(f"Expected start, end and optionally {sorted(REQUEST_FIELDS - {'start', 'end'})}, got unknown {sorted(unknown)}")
+        except ValueError as e:
+            self._send_json({"error": str(e)}, 400)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in self.service.stream(request):
+            self._send_chunk((json.dumps(event, default=str) + "\n").encode("utf-8"))
+        self._send_chunk(b"")
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Unix socket peers have no address
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        println(f"{self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def serve(port=8765, socket_path=None, workers=None, offline=False):
+    Handler.service = BacktestService(workers, offline)
+    server = UnixHTTPServer(socket_path, Handler) if socket_path else ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    println(f"Listening on {socket_path or f'http://127.0.0.1:{port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Handler.service.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve backtests over local HTTP from a hot price panel")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on a Unix socket instead of a TCP port")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--offline", action="store_true", help="never download, use only the local price store")
+    args = parser.parse_args()
+    serve(args.port, args.socket, args.workers, args.offline)
@@ -0,0 +1,267 @@
+import csv
+import numpy as np
+import Metrics
+
+from CLI import println
+from Factors import FACTORS, BLENDS, factor_scores, percentile_ranks
+from Scoring import month_end_rows
+from WeightsBacktest import SCHEMES, target_weights, run_weights_batch
+import Trace
+
+# Declarative strategies evaluated together in one pass over the data.
+#
+#   strategies = [StrategySpec("12-1 top 10"), StrategySpec("6-1 top 20", "momentum_6_1", top_n=20),
+#                 StrategySpec("trend", {"vol_adjusted_12_1": 0.5, "high_52w": 0.5}, scheme="capped")]
+#   result = batch_backtest(strategies, tickers, start_date, end_date)
+#
+# A strategy declares its signals (a factor name or {factor: weight}, blended on
+# percentile ranks like Factors.BLENDS) and its selection rules. BatchRunner
+# loads prices once, computes every signal any strategy needs once through a
+# shared FactorContext, and steps all strategies through the same rebalance
+# timeline in a single batched weights backtest. The result holds their equity
+# curves side by side.
+
+class StrategySpec:
+
+    def __init__(self, name, signals="momentum_12_1", top_n=10, scheme="equal", cap=0.2, rebalance_months=1,
+                 min_score=None, commission_bps=3.0, slippage_bps=5.0):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown weighting scheme {scheme}, expected one of {SCHEMES}")
+        self.name = name
+        self.signals = {signals: 1.0} if isinstance(signals, str) else dict(signals)
+        unknown = [signal for signal in self.signals if signal not in FACTORS and signal not in BLENDS]
+        if unknown:
+            raise ValueError(f"Unknown signals {unknown}, expected any of {list(FACTORS) + list(BLENDS)}")
+        self.top_n = top_n
+        self.scheme = scheme
+        self.cap = cap
+        self.rebalance_months = rebalance_months
+        self.min_score = min_score
+        self.commission_bps = commission_bps
+        self.slippage_bps = slippage_bps
+
+    # Identifies the combined score so strategies with the same signals share it
+    def signal_key(self):
+        return tuple(sorted(self.signals.items()))
+
+    # Selection rule: (rebalance dates x tickers) scores -> target weights.
+    # Subclasses override this for rules other than top n by score.
+    def weights(self, scores):
+        if self.min_score is not None:
+            scores = np.where(scores >= self.min_score, scores, np.nan)
+        return target_weights(scores, self.scheme, self.top_n, self.cap)
+
+    def __str__(self):
+        return f"StrategySpec({self.name}, Signals: {self.signals}, Top: {self.top_n}, Scheme: {self.scheme}, Rebalance: {self.rebalance_months}m)"
+
+    def __repr__(self):
+        return str(self)
+
+
+class BatchResult:
+
+    # `benchmark` is an optional benchmark close series aligned to the result dates
+    def __init__(self, names, results, benchmark=None):
+        self.names = names
+        self.results = results
+        self.dates = results[0].dates if results else np.empty(0, dtype="datetime64[D]")
+        self.benchmark = benchmark
+
+    # (days x strategies) equity curves, columns in the order of names
+    def equity(self):
+        return np.column_stack([result.equity for result in self.results]) if self.results else np.empty((0, 0))
+
+    def benchmark_returns(self):
+        if self.benchmark is None or len(self.benchmark) == 0:
+            return None
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.nan_to_num(self.benchmark[1:] / self.benchmark[:-1] - 1, nan=0.0)
+        return np.concatenate([[0.0], returns])
+
+    # Metrics per strategy, plus beta, alpha, tracking error and information
+    # ratio against the benchmark when there is one
+    def summary(self):
+        summaries = {name: result.summary() for (name, result) in zip(self.names, self.results)}
+        benchmark = self.benchmark_returns()
+        if benchmark is None:
+            return summaries
+        returns = np.column_stack([result.returns for result in self.results])
+        relative = Metrics.relative_stats(returns, benchmark)
+        for (i, name) in enumerate(self.names):
+            summaries[name].update({metric: float(values[i]) for (metric, values) in relative.items()})
+        return summaries
+
+    def write_csv(self, file_path):
+        benchmark = self.benchmark_returns()
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Date"] + self.names + (["Benchmark"] if benchmark is not None else []))
+            equity = self.equity() if benchmark is None else np.column_stack([self.equity(), np.cumprod(1 + benchmark)])
+            for day, row in zip(self.dates, equity):
+                writer.writerow([str(day)] + [f"{value:.6f}" for value in row])
+
+    def print_summary(self):
+        metrics = ["total_return", "cagr", "max_drawdown", "sharpe", "turnover", "costs"]
+        benchmark = self.benchmark_returns()
+        if benchmark is not None:
+            metrics += ["beta", "alpha", "information_ratio"]
+        width = max([len(name) for name in self.names] + [9])
+        print(f"\n{'Strategy':<{width}}" + "".join(f"{metric:>18}" for metric in metrics))
+        for name, summary in self.summary().items():
+            print(f"{name:<{width}}" + "".join(f"{float(summary[metric]):>18.4f}" for metric in metrics))
+        if benchmark is not None:
+            summary = {name: values[0] for (name, values) in Metrics.summary(benchmark).items()}
+            print(f"{'Benchmark':<{width}}" + "".join(f"{float(summary[metric]):>18.4f}" if metric in summary else f"{'':>18}" for metric in metrics))
+
+    def __str__(self):
+        return f"BatchResult(Strategies: {len(self.names)}, Days: {len(self.dates)})"
+
+    def __repr__(self):
+        return str(self)
+
+
+class BatchRunner:
+
+    def __init__(self, strategies=()):
+        self.strategies = []
+        for strategy in strategies:
+            self.add(strategy)
+
+    def add(self, strategy):
+        if any(existing.name == strategy.name for existing in self.strategies):
+            raise ValueError(f"Strategy {strategy.name} is already registered")
+        self.strategies.append(strategy)
+        return self
+
+    # Run every strategy over one price panel. `eligible` is an optional
+    # (rebalance dates x tickers) mask of tickers that may be held, e.g. index
+    # membership or data quality, applied once to every signal. `benchmark` is
+    # a close series aligned to dates (or a dates x tickers matrix of per ticker
+    # benchmarks), needed by the benchmark relative signals. The results are
+    # compared with `comparison`, a single close series aligned to dates, which
+    # defaults to a benchmark series.
+    def run(self, dates, closes, rebalance_dates, eligible=None, benchmark=None, comparison=None):
+        if comparison is None and benchmark is not None and np.ndim(benchmark) == 1:
+            comparison = benchmark
+        if comparison is not None and np.ndim(comparison) != 1:
+            raise ValueError(f"comparison must be a single close series aligned to dates, got shape {np.shape(comparison)}")
+        if not self.strategies:
+            return BatchResult([], [])
+        with Trace.span("batch_run", strategies=len(self.strategies), tickers=closes.shape[1], rebalances=len(rebalance_dates)):
+            names = sorted({signal for strategy in self.strategies for signal in strategy.signals})
+            signals = factor_scores(dates, closes, rebalance_dates, names, benchmark)
+            if eligible is not None:
+                signals = {name: np.where(eligible, scores, np.nan) for (name, scores) in signals.items()}
+
+            combined = {}
+            for strategy in self.strategies:
+                key = strategy.signal_key()
+                if key not in combined:
+                    combined[key] = _combine(signals, strategy.signals)
+            Trace.count("batch_signals", len(names))
+            Trace.count("batch_scores", len(combined))
+
+            targets = np.stack([strategy.weights(combined[strategy.signal_key()]) for strategy in self.strategies])
+            periods = np.arange(len(rebalance_dates))
+            rebalance = np.stack([periods % strategy.rebalance_months == 0 for strategy in self.strategies])
+            results = run_weights_batch(dates, closes, rebalance_dates, targets, rebalance,
+                                        np.array([strategy.commission_bps for strategy in self.strategies]),
+                                        np.array([strategy.slippage_bps for strategy in self.strategies]))
+        if comparison is not None and results and len(results[0].dates):
+            series = np.asarray(comparison, dtype=np.float64)
+            comparison = series[np.searchsorted(np.asarray(dates, dtype="datetime64[D]"), results[0].dates)]
+        else:
+            comparison = None
+        return BatchResult([strategy.name for strategy in self.strategies], results, comparison)
+
+    def __str__(self):
+        return f"BatchRunner(Strategies: {len(self.strategies)})"
+
+    def __repr__(self):
+        return str(self)
+
+
+# A single signal is used as is, several are blended on percentile ranks
+def _combine(signals, weights):
+    if len(weights) == 1:
+        return signals[next(iter(weights))]
+    ranked = [percentile_ranks(signals[name]) * weight for (name, weight) in weights.items()]
+    return np.sum(ranked, axis=0) / sum(weights.values())
+
+# Load the universe once and run every strategy on it, monthly rebalancing from
+# start_date. With an index name and recorded history the universe is everyone
+# who was a member in the window and only members are eligible on each date.
+# `benchmark` names an index in Benchmarks.BENCHMARKS to compare against and
+# score the benchmark relative signals with.
+def batch_backtest(strategies, tickers, start_date, end_date, index_name=None, panel=None, benchmark=None):
+    from YF import price_panel, window_start, constituents, price_store, download_missing
+    from Panel import current_panel
+    from Benchmarks import benchmark_close, benchmark_symbol
+
+    if index_name is not None and constituents().has_history(index_name):
+        tickers = constituents().ever_members(index_name, start_date, end_date)
+    tickers = sorted(tickers)
+    if panel is None:
+        # Fetch the benchmark with the universe so the panel is built once
+        if benchmark is not None:
+            failed = download_missing(price_store(), [benchmark_symbol(benchmark)], window_start(start_date), end_date)
+            if failed:
+                println(f"Benchmark {benchmark} could not be fetched: {next(iter(failed.values()))}")
+        dates, yf_tickers, closes = price_panel(tickers, window_start(start_date), end_date)
+        panel = current_panel(price_store())
+    else:
+        dates, yf_tickers, closes = panel.window([f"{ticker}.NS" for ticker in tickers], window_start(start_date), end_date)
+
+    rebalance_dates = dates[month_end_rows(dates)]
+    rebalance_dates = rebalance_dates[rebalance_dates >= np.datetime64(start_date, "D")]
+    eligible = np.ones((len(rebalance_dates), len(tickers)), dtype=bool)
+    if index_name is not None and constituents().has_history(index_name):
+        eligible &= constituents().masks(index_name, rebalance_dates, tickers)
+    quality = panel.quality()
+    if quality is not None:
+        eligible &= quality.eligible_for(yf_tickers, rebalance_dates)
+    benchmark_closes = benchmark_close(benchmark, dates, panel=panel) if benchmark is not None else None
+    println(f"Running {len(strategies)} strategies over {len(tickers)} tickers and {len(rebalance_dates)} rebalances")
+    return BatchRunner(strategies).run(dates, closes, rebalance_dates, eligible, benchmark_closes)
+
+# Ten variants of the monthly momentum strategy
+DEFAULT_STRATEGIES = [
+    StrategySpec("12-1 top 10"),
+    StrategySpec("12-1 top 5", top_n=5),
+    StrategySpec("12-1 top 20", top_n=20),
+    StrategySpec("12-1 score weighted", scheme="score"),
+    StrategySpec("12-1 quarterly", rebalance_months=3),
+    StrategySpec("12-1 positive only", min_score=0.0),
+    StrategySpec("6-1 top 10", "momentum_6_1"),
+    StrategySpec("vol adjusted 12-1", "vol_adjusted_12_1"),
+    StrategySpec("52w high", "high_52w"),
+    StrategySpec("blend capped", "blend_momentum", scheme="capped", top_n=15, cap=0.1),
+]
+
+# Relative strength variants, run when there is a benchmark
+RELATIVE_STRATEGIES = [
+    StrategySpec("relative 12-1 outperformers", "relative_momentum_12_1", min_score=0.0),
+    StrategySpec("relative 6-1 outperformers", "relative_momentum_6_1", min_score=0.0),
+    StrategySpec("information ratio top 10", "information_ratio_12"),
+    StrategySpec("momentum + information ratio", {"momentum_12_1": 0.5, "information_ratio_12": 0.5}),
+]
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+    from DateUtil import date_from
+
+    parser = argparse.ArgumentParser(description="Run several strategies side by side over one data pass")
+    parser.add_argument("index_csv")
+    parser.add_argument("--start", default="2016-01-01")
+    parser.add_argument("--end", default="2025-06-27")
+    parser.add_argument("--benchmark", default="NIFTY 50", help="benchmark index to compare with, 'none' for no benchmark")
+    parser.add_argument("--output", help="write the side by side equity curves to this csv file")
+    args = parser.parse_args()
+
+    benchmark = None if args.benchmark.lower() == "none" else args.benchmark
+    strategies = DEFAULT_STRATEGIES + (RELATIVE_STRATEGIES if benchmark is not None else [])
+    result = batch_backtest(strategies, read_nse_index(args.index_csv), date_from(args.start), date_from(args.end), benchmark=benchmark)
+    result.print_summary()
+    if args.output:
+        result.write_csv(args.output)
@@ -1,48 +1,122 @@
-from Portfolio import Portfolio
+import numpy as np
+
+from ArrayPortfolio import ArrayPortfolio
+from PriceOracle import price_oracle
 from CLI import br, println
+from Checkpoint import Checkpoint
+import Trace
 
 class Strategy_M_12_minus_1:
     
     def __init__(self, backtests):
         self.backtests = backtests
+        # Portfolio columns, one per ticker ranked on any date
+        self.names = sorted({ticker.name for backtest in backtests for ticker in backtest.test_results})
+        self.ids = {name: i for (i, name) in enumerate(self.names)}
         
     # Sort a list of Ticker objects w.r.t. the gains 
     def rank(self, tickers):
+        Trace.count("ranked_tickers", len(tickers))
         filteredTickers = [ticker for ticker in tickers if ticker.gain is not None]
         ranked_tickers = sorted(filteredTickers, key=lambda ticker: ticker.gain, reverse=True)
         return ranked_tickers
     
-    def run(self):
+    # Everything the run depends on: the dates and every ranked ticker with its price and gain
+    def job(self):
+        return {
+            "runner": "strategy_m_12_minus_1",
+            "portfolio": "array",
+            "backtests": [[str(backtest.target_date), [[ticker.name, ticker.buy_price, ticker.gain] for ticker in backtest.test_results]] for backtest in self.backtests],
+        }
+    
+    # Opening portfolio, one share of each ticker
+    def portfolio(self, tickers, date):
+        p = ArrayPortfolio(len(self.names), cash=0.0)
+        self.rebalance(p, tickers, date)
+        return p
+    
+    # Hold one share of each ticker: new ones are bought at their buy price and
+    # the ones dropped are sold at the close of the rebalance date
+    def rebalance(self, p, tickers, rebalance_date):
+        with Trace.span("portfolio.rebalance", target_date=str(rebalance_date), tickers=len(tickers)):
+            target_qty = np.zeros(len(self.names))
+            prices = np.full(len(self.names), np.nan)
+            for ticker in tickers:
+                target_qty[self.ids[ticker.name]] = 1
+                prices[self.ids[ticker.name]] = ticker.buy_price
+            
+            sold = np.flatnonzero((p.qty != 0) & (target_qty == 0))
+            sold_names = [self.names[i] for i in sold]
+            if len(sold) > 0:
+                sell_prices = price_oracle().close_prices(sold_names, [rebalance_date] * len(sold))
+                for (name, sell_price) in zip(sold_names, sell_prices):
+                    if np.isnan(sell_price):
+                        println(f"Last close price of {name} is not available for date {rebalance_date}")
+                prices[sold] = np.nan_to_num(sell_prices, nan=0.0)
+                Trace.count("trades", len(sold))
+            p.trade_to(target_qty, prices, rebalance_date)
+            
+            println(f"New holdings: {[t.name for t in tickers]}")
+            println(f"Sold holdings: {sold_names}")
+    
+    def holdings(self, p):
+        return [self.names[i] for i in p.held()]
+    
+    # Sum of the percent returns of every closed position
+    def pnl(self, p):
+        fills = p.tradebook.records()
+        sells = fills[fills["qty"] < 0]
+        buy_prices = sells["price"] + sells["realized_pnl"] / sells["qty"]
+        return float(np.sum((sells["price"] / buy_prices - 1) * 100))
+    
+    # With a checkpoint file the portfolio is saved after every
+    # `checkpoint_every` rebalances and a restarted run continues after the
+    # last saved one
+    def run(self, checkpoint=None, checkpoint_every=1):
+        with Trace.span("strategy.run", backtests=len(self.backtests)):
+            return self._run(checkpoint, checkpoint_every)
+    
+    def _run(self, checkpoint=None, checkpoint_every=1):
         
         print("\nInitiating Strategy...\n")        
         
-        test_results = [result.test_results for result in self.backtests]
-        head = test_results[0]
+        head = self.backtests[0]
         tail = self.backtests[1:]
         
-        br()
-        println("Creating Portfolio....")
-        println("- Ranking stocks") 
-        p = Portfolio(self.rank(head)[:10])
-        println("Portfolio Created !")
+        done, state = 0, None
+        if checkpoint is not None:
+            checkpoint = Checkpoint(checkpoint, self.job(), checkpoint_every)
+            done, state = checkpoint.load()
         
-        println(f"PF init: {p.holdings}")
+        br()
+        if state is not None:
+            p = ArrayPortfolio.from_state(state)
+            println(f"PF restored after {done} rebalances: {self.holdings(p)}")
+        else:
+            println("Creating Portfolio....")
+            println("- Ranking stocks") 
+            p = self.portfolio(self.rank(head.test_results)[:10], head.target_date)
+            println("Portfolio Created !")
+            
+            println(f"PF init: {self.holdings(p)}")
 
         br()
         println("Running Backtest...")
         for i, backtest in enumerate(tail):
+            if i < done:
+                continue
             
             target_date = backtest.target_date
             rebalanceUpdate = backtest.test_results
             ranked = self.rank(rebalanceUpdate)[:10]     
             
             println(f"PF {i}:")
-            p.rebalance(ranked, target_date)       
+            self.rebalance(p, ranked, target_date)       
+            if checkpoint is not None:
+                checkpoint.maybe_save(i + 1, p.state)
         
+        if checkpoint is not None:
+            checkpoint.clear()
         br()
-        pnl = 0
-        for trade in p.tradebook:
-            pnl += ((trade.sell_price / trade.buy_price) - 1) * 100
-
-        println(f"PnL: {pnl}")
+        println(f"PnL: {self.pnl(p)}")
         return True
\ No newline at end of file
@@ -0,0 +1,393 @@
+import os
+import numpy as np
+
+from CLI import println, debug
+from PriceStore import _numpy_of, _floats_of
+from Scoring import last_valid_rows, top_n as top_n_of
+import Trace
+
+# Streaming backtests over intraday bars that do not fit in memory.
+#
+#   .store/bars/5m/2024-06.parquet   -> long table [Time, Ticker, Open, High, Low, Close, Volume]
+#                                       sorted by Time, one file per month
+#
+# Bars are read one parquet batch at a time and pivoted into (bars x tickers)
+# blocks. The strategy keeps only rolling state: the last close of every ticker,
+# a ring of session closes deep enough for the momentum window and the current
+# book. Memory is bounded by the batch size and the window, not by the history.
+#
+#   python Streaming.py ind_nifty50list.csv --interval 5m --fetch
+
+BAR_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+ROW_GROUP_ROWS = 250_000
+
+# How many days back Yahoo serves bars of each intraday interval
+HISTORY_DAYS = {"1m": 30, "2m": 60, "5m": 60, "15m": 60, "30m": 60, "60m": 730, "90m": 60, "1h": 730}
+
+class BarStore:
+
+    def __init__(self, interval="5m", root=".store/bars"):
+        self.interval = interval
+        self.folder = os.path.join(root, interval)
+
+    def months(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(file_name[:-len(".parquet")] for file_name in os.listdir(self.folder) if file_name.endswith(".parquet"))
+
+    # Write blocks of (times, tickers, {field: bars x tickers}) arriving in time
+    # order, one open writer per month so nothing is held beyond a block.
+    # Months that are written replace what was stored for them.
+    def write_blocks(self, blocks):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(self.folder, exist_ok=True)
+        writer, month, rows = None, None, 0
+        try:
+            for times, tickers, fields in blocks:
+                times = np.asarray(times, dtype="datetime64[s]")
+                block_months = times.astype("datetime64[M]")
+                for block_month in np.unique(block_months):
+                    if block_month != month:
+                        if writer is not None:
+                            writer.close()
+                            os.replace(f"{self._partition(month)}.tmp", self._partition(month))
+                        month = block_month
+                        writer = None
+                    selected = block_months == block_month
+                    present = ~np.isnan(fields["Close"][selected])
+                    bar_rows, cols = np.nonzero(present)
+                    table = pa.table({
+                        "Time": pa.array(times[selected][bar_rows], type=pa.timestamp("s")),
+                        "Ticker": pa.array(np.asarray(tickers, dtype=object)[cols].astype(str)).dictionary_encode(),
+                        **{field: pa.array(values[selected][bar_rows, cols].astype(np.float64)) for (field, values) in fields.items()},
+                    })
+                    if writer is None:
+                        writer = pq.ParquetWriter(f"{self._partition(month)}.tmp", table.schema)
+                    writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+                    rows += len(table)
+        finally:
+            if writer is not None:
+                writer.close()
+                os.replace(f"{self._partition(month)}.tmp", self._partition(month))
+        debug(f"Stored {rows} bars in {self.folder}")
+        return rows
+
+    # Merge a long frame [Time, Ticker, fields...] into its months, e.g. a
+    # provider download. Only the months it touches are read back.
+    def merge(self, long_data):
+        import pandas as pd
+        os.makedirs(self.folder, exist_ok=True)
+        for month, rows in long_data.groupby(long_data["Time"].dt.to_period("M")):
+            path = self._partition(str(month))
+            if os.path.exists(path):
+                rows = pd.concat([pd.read_parquet(path), rows], ignore_index=True)
+            rows = rows.drop_duplicates(subset=["Time", "Ticker"], keep="last").sort_values(["Time", "Ticker"])
+            rows["Time"] = rows["Time"].astype("datetime64[s]")
+            rows.to_parquet(path, index=False, row_group_size=ROW_GROUP_ROWS)
+
+    # Generator of (times, closes) blocks for [start, end] with one column per
+    # ticker. A batch ending inside a bar's rows holds that bar back for the next
+    # block, so every bar is yielded exactly once and complete.
+    def blocks(self, tickers, start_date, end_date, batch_rows=ROW_GROUP_ROWS, field="Close"):
+        import pyarrow.parquet as pq
+        columns = {ticker: i for (i, ticker) in enumerate(tickers)}
+        start = np.datetime64(start_date, "D").astype("datetime64[s]")
+        end = (np.datetime64(end_date, "D") + 1).astype("datetime64[s]")
+        first_month, last_month = start.astype("datetime64[M]"), (end - 1).astype("datetime64[M]")
+        pending = None
+        for month in self.months():
+            if not first_month <= np.datetime64(month, "M") <= last_month:
+                continue
+            parquet = pq.ParquetFile(self._partition(month), read_dictionary=["Ticker"])
+            Trace.count("bar_bytes_read", os.path.getsize(self._partition(month)))
+            for batch in parquet.iter_batches(batch_size=batch_rows, columns=["Time", "Ticker", field], use_pandas_metadata=False):
+                time_column = batch.column(0)
+                times = _numpy_of(time_column, np.int64).view(f"datetime64[{time_column.type.unit}]").astype("datetime64[s]")
+                ticker_column = batch.column(1)
+                to_column = np.array([columns.get(name, -1) for name in ticker_column.dictionary.to_pylist()] + [-1], dtype=np.int64)
+                cols = to_column[_numpy_of(ticker_column.indices, np.int32)]
+                values = _floats_of(batch.column(2))
+                keep = (times >= start) & (times < end) & (cols >= 0)
+                rows = (times[keep], cols[keep], values[keep])
+                if pending is not None:
+                    rows = tuple(np.concatenate([held, new]) for (held, new) in zip(pending, rows))
+                if len(rows[0]) == 0:
+                    pending = None
+                    continue
+                complete = rows[0] < rows[0][-1]
+                pending = tuple(part[~complete] for part in rows)
+                if complete.any():
+                    yield _pivot(*(part[complete] for part in rows), len(tickers))
+        if pending is not None and len(pending[0]):
+            yield _pivot(*pending, len(tickers))
+
+    def _partition(self, month):
+        return os.path.join(self.folder, f"{month}.parquet")
+
+    def __str__(self):
+        return f"BarStore(Interval: {self.interval}, Months: {len(self.months())})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def _pivot(times, cols, values, n_cols):
+    bar_times, rows = np.unique(times, return_inverse=True)
+    block = np.full((len(bar_times), n_cols), np.nan)
+    block[rows, cols] = values
+    return bar_times, block
+
+
+# Running headline metrics over a stream of returns, constant memory
+class RunningMetrics:
+
+    def __init__(self):
+        self.bars = 0
+        self.sessions = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.equity = 1.0
+        self.peak = 1.0
+        self.max_drawdown = 0.0
+
+    def update(self, returns, sessions=0):
+        if len(returns) == 0:
+            return
+        equity = self.equity * np.cumprod(1 + returns)
+        peaks = np.maximum(np.maximum.accumulate(equity), self.peak)
+        self.max_drawdown = min(self.max_drawdown, float(np.min(equity / peaks - 1)))
+        self.peak, self.equity = float(peaks[-1]), float(equity[-1])
+        self.bars += len(returns)
+        self.sessions += sessions
+        self.total += float(returns.sum())
+        self.total_squares += float(np.square(returns).sum())
+
+    def summary(self, sessions_per_year=252):
+        bars_per_year = sessions_per_year * self.bars / max(self.sessions, 1)
+        mean = self.total / max(self.bars, 1)
+        std = np.sqrt(max(self.total_squares / max(self.bars, 1) - mean ** 2, 0.0))
+        years = self.sessions / sessions_per_year
+        return {
+            "total_return": self.equity - 1,
+            "cagr": self.equity ** (1 / years) - 1 if years > 0 and self.equity > 0 else np.nan,
+            "max_drawdown": self.max_drawdown,
+            "volatility": float(std * np.sqrt(bars_per_year)),
+            "sharpe": float(mean / std * np.sqrt(bars_per_year)) if std > 0 else np.nan,
+            "bars": self.bars,
+            "sessions": self.sessions,
+        }
+
+    def __str__(self):
+        return f"RunningMetrics(Bars: {self.bars}, Sessions: {self.sessions}, Equity: {self.equity:.4f})"
+
+    def __repr__(self):
+        return str(self)
+
+
+# Momentum on intraday bars with bounded state. Scores are taken on session
+# closes, lookback and skip counted in sessions, and the book is reset to the
+# equal weight top n at the close of every `rebalance_sessions`-th session once
+# lookback + skip + 1 sessions are buffered. The defaults (20-1 sessions, weekly
+# rebalancing) fit the roughly 40 sessions of 5m bars Yahoo serves, 231 + 21 is
+# the daily 12-1 month momentum for longer histories. Between rebalances it drifts with
+# every bar, and turnover is charged at commission plus slippage.
+class StreamingMomentum:
+
+    def __init__(self, tickers, lookback_sessions=20, skip_sessions=1, top_n=10, rebalance_sessions=5,
+                 commission_bps=3.0, slippage_bps=5.0):
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.lookback = lookback_sessions
+        self.skip = skip_sessions
+        self.top_n = top_n
+        self.rebalance_sessions = rebalance_sessions
+        self.cost_rate = (commission_bps + slippage_bps) / 10000
+        self.last_close = np.full(n, np.nan)
+        self.last_time = None
+        self.session_closes = np.full((lookback_sessions + skip_sessions + 1, n), np.nan)
+        self.sessions = 0
+        self.weights = np.zeros(n)
+        self.base = np.ones(n)
+        self.cash = 1.0
+        self.growth = 1.0
+        self.turnover = 0.0
+        self.costs = 0.0
+        self.pending_cost = 0.0
+        self.relative = np.zeros(n)
+        self.rebalances = 0
+
+    # Per bar returns of one (times, closes) block, which must follow the
+    # previous block in time
+    def update(self, times, closes):
+        # Forward fill from the last close seen in earlier blocks
+        filled = np.vstack([self.last_close[None], closes])
+        last_valid = last_valid_rows(filled)
+        prices = np.where(last_valid >= 0, filled[np.maximum(last_valid, 0), np.arange(filled.shape[1])], np.nan)[1:]
+
+        # A new session starts at every bar whose day differs from the bar before
+        days = times.astype("datetime64[D]")
+        previous_days = np.concatenate([[self.last_time.astype("datetime64[D]") if self.last_time is not None else days[0]], days[:-1]])
+        starts = np.flatnonzero(days != previous_days)
+        bounds = np.concatenate([[0], starts, [len(times)]])
+
+        returns = np.empty(len(times))
+        for (begin, end) in zip(bounds[:-1], bounds[1:]):
+            if begin == end:
+                continue
+            if begin in starts:
+                self._close_session(prices[begin - 1] if begin > 0 else self.last_close)
+            returns[begin:end] = self._hold(prices[begin:end])
+            if self.pending_cost:
+                returns[begin] = (1 + returns[begin]) * (1 - self.pending_cost) - 1
+                self.pending_cost = 0.0
+
+        self.last_close = prices[-1]
+        self.last_time = times[-1]
+        return returns, len(starts)
+
+    def _hold(self, prices):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative = np.nan_to_num(prices / self.base, nan=0.0)
+        growth = self.cash + relative @ self.weights
+        previous = np.concatenate([[self.growth], growth[:-1]])
+        self.growth = float(growth[-1])
+        self.relative = relative[-1]
+        return np.divide(growth, previous, out=np.ones_like(growth), where=previous > 0) - 1
+
+    def _close_session(self, closes):
+        self.session_closes = np.roll(self.session_closes, -1, axis=0)
+        self.session_closes[-1] = closes
+        self.sessions += 1
+        if self.sessions % self.rebalance_sessions != 0 or self.sessions < len(self.session_closes):
+            return
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = self.session_closes[-1 - self.skip] / self.session_closes[0] - 1
+        picks = top_n_of(scores[None], self.top_n)[0]
+        picks = picks[(picks >= 0) & np.isfinite(closes[np.maximum(picks, 0)]) & (closes[np.maximum(picks, 0)] > 0)]
+        target = np.zeros(len(closes))
+        target[picks] = 1.0 / len(picks) if len(picks) else 0.0
+
+        drifted = np.divide(self.weights * self.relative, self.growth,
+                            out=np.zeros(len(closes)), where=self.growth > 0)
+        turnover = float(np.abs(target - drifted).sum())
+        self.turnover += turnover
+        self.pending_cost = turnover * self.cost_rate
+        self.costs += self.pending_cost
+        self.rebalances += 1
+        self.weights, self.base, self.cash, self.growth = target, np.where(target > 0, closes, 1.0), 1.0 - target.sum(), 1.0
+
+    # Sessions needed before the first rebalance
+    def window_sessions(self):
+        return len(self.session_closes)
+
+    def __str__(self):
+        return f"StreamingMomentum(Tickers: {len(self.tickers)}, Sessions: {self.sessions}, Rebalances: {self.rebalances})"
+
+    def __repr__(self):
+        return str(self)
+
+
+# Run the streaming strategy over every block of a bar store. Returns the
+# running metrics, the strategy and, with `equity_file`, streams the per bar
+# equity curve to parquet as it goes instead of keeping it.
+def run_streaming(bar_store, tickers, start_date, end_date, batch_rows=ROW_GROUP_ROWS, equity_file=None, **strategy_options):
+    strategy = StreamingMomentum(tickers, **strategy_options)
+    metrics = RunningMetrics()
+    writer = None
+    with Trace.span("streaming_backtest", interval=bar_store.interval, tickers=len(tickers)) as span:
+        blocks = 0
+        for times, closes in bar_store.blocks(tickers, start_date, end_date, batch_rows):
+            returns, sessions = strategy.update(times, closes)
+            metrics.update(returns, sessions)
+            blocks += 1
+            if equity_file is not None:
+                writer = _write_equity(writer, equity_file, times, returns, metrics.equity)
+        span.set(blocks=blocks, bars=metrics.bars)
+    if strategy.rebalances == 0 and strategy.sessions < strategy.window_sessions():
+        println(f"Warning: {strategy.sessions} sessions of {bar_store.interval} bars are fewer than the {strategy.window_sessions()} "
+                f"the momentum window needs, nothing was traded. Use a shorter --lookback-sessions or --skip-sessions.")
+    if writer is not None:
+        writer.close()
+    # The last session is still open when the stream ends
+    metrics.sessions += 1 if metrics.bars else 0
+    return metrics, strategy
+
+def _write_equity(writer, equity_file, times, returns, final_equity):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    growth = np.cumprod(1 + returns)
+    equity = final_equity / growth[-1] * growth
+    table = pa.table({"time": pa.array(times, type=pa.timestamp("s")), "returns": returns, "equity": equity})
+    if writer is None:
+        writer = pq.ParquetWriter(equity_file, table.schema)
+    writer.write_table(table)
+    return writer
+
+# Download intraday bars a few days at a time through a Fetcher (chunking,
+# retries and rate limiting) and merge them into the bar store. The start is
+# moved up to the oldest day the provider still serves for the interval.
+def ingest(bar_store, fetcher, tickers, start_date, end_date, days_per_request=5):
+    import pandas as pd
+    from datetime import timedelta
+    from PriceStore import to_long
+    start_date = clamp_start(bar_store.interval, start_date)
+    day, stored = start_date, 0
+    while day <= end_date:
+        until = min(day + timedelta(days=days_per_request - 1), end_date)
+        data = fetcher.fetch(tickers, day, until).data
+        if not data.empty:
+            # Keep exchange local wall clock times
+            data.index = pd.to_datetime(data.index)
+            if data.index.tz is not None:
+                data.index = data.index.tz_localize(None)
+            data.index.name = "Date"
+            long_data = to_long(data).rename(columns={"Date": "Time"})
+            bar_store.merge(long_data)
+            stored += len(long_data)
+        day = until + timedelta(days=1)
+    println(f"Stored {stored} {bar_store.interval} bars for {len(tickers)} tickers")
+    return stored
+
+# Oldest start the provider serves bars of the interval for
+def clamp_start(interval, start_date):
+    from datetime import datetime, timedelta
+    if interval not in HISTORY_DAYS:
+        return start_date
+    oldest = (datetime.now() - timedelta(days=HISTORY_DAYS[interval] - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    if start_date < oldest:
+        println(f"{interval} bars only go back {HISTORY_DAYS[interval]} days, fetching from {oldest:%Y-%m-%d} instead of {start_date:%Y-%m-%d}")
+        return oldest
+    return start_date
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+    from datetime import datetime
+    from DateUtil import date_from
+    from Providers import YahooProvider
+    from Fetcher import Fetcher
+
+    parser = argparse.ArgumentParser(description="Streaming momentum backtest over intraday bars")
+    parser.add_argument("index_csv")
+    parser.add_argument("--interval", default="5m")
+    parser.add_argument("--start", help="defaults to the oldest day Yahoo serves for the interval")
+    parser.add_argument("--end", default=datetime.now().strftime("%Y-%m-%d"))
+    parser.add_argument("--fetch", action="store_true", help="download the bars first")
+    parser.add_argument("--equity", help="write the per bar equity curve to this parquet file")
+    parser.add_argument("--lookback-sessions", type=int, default=20)
+    parser.add_argument("--skip-sessions", type=int, default=1)
+    parser.add_argument("--rebalance-sessions", type=int, default=5)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    tickers = [f"{ticker}.NS" for ticker in read_nse_index(args.index_csv)]
+    bar_store = BarStore(args.interval)
+    start = date_from(args.start) if args.start else clamp_start(args.interval, datetime(2000, 1, 1))
+    if args.fetch:
+        ingest(bar_store, Fetcher(YahooProvider(interval=args.interval)), tickers, start, date_from(args.end))
+    metrics, strategy = run_streaming(bar_store, tickers, start, date_from(args.end), equity_file=args.equity,
+                                      lookback_sessions=args.lookback_sessions, skip_sessions=args.skip_sessions,
+                                      rebalance_sessions=args.rebalance_sessions, top_n=args.top_n)
+    println(f"{strategy}, turnover {strategy.turnover:.2f}, costs {strategy.costs:.4f}")
+    println(metrics.summary())
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import itertools
+import numpy as np
+import pandas as pd
+import Metrics
+
+from concurrent.futures import ProcessPoolExecutor
+from CLI import println
+from Checkpoint import Checkpoint, array_digest
+from Panel import Panel, write_panel
+from Scoring import momentum_scores, month_end_rows, last_valid_rows, top_n as top_n_of
+
+# Parameter sweep for the 12-minus-1 momentum strategy.
+#
+# The close panel is written once as a float32 Panel and every worker memory maps
+# it in its initializer, so all processes share the same read-only pages instead
+# of each one loading the price store.
+
+class SweepConfig:
+
+    def __init__(self, top_n=10, lookback_months=12, skip_months=1, rebalance_months=1):
+        self.top_n = top_n
+        self.lookback_months = lookback_months
+        self.skip_months = skip_months
+        self.rebalance_months = rebalance_months
+
+    def as_dict(self):
+        return {
+            "top_n": self.top_n,
+            "lookback_months": self.lookback_months,
+            "skip_months": self.skip_months,
+            "rebalance_months": self.rebalance_months,
+        }
+
+    def __str__(self):
+        return f"SweepConfig(Top: {self.top_n}, Lookback: {self.lookback_months}, Skip: {self.skip_months}, Rebalance: {self.rebalance_months})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def config_grid(top_ns=(10,), lookback_months=(12,), skip_months=(1,), rebalance_months=(1,)):
+    return [SweepConfig(*values) for values in itertools.product(top_ns, lookback_months, skip_months, rebalance_months)]
+
+# Equal weight top-N portfolio held from one rebalance to the next.
+# Returns (rebalance row indices, per-period portfolio returns).
+def simulate(dates, closes, config):
+    rows = month_end_rows(dates, config.rebalance_months)
+    if len(rows) < 2:
+        return rows, np.empty(0)
+
+    scores = momentum_scores(dates, closes, dates[rows], config.lookback_months, config.skip_months)
+    picks = top_n_of(scores[:-1], config.top_n)
+    return rows, equal_weight_returns(period_returns(closes, rows), picks)
+
+# Per-ticker returns between consecutive rebalance rows, priced at the last valid bar
+def period_returns(closes, rows):
+    last_valid = last_valid_rows(closes)[rows]
+    prices = np.where(last_valid >= 0, closes[np.maximum(last_valid, 0), np.arange(closes.shape[1])], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return prices[1:] / prices[:-1] - 1
+
+# Return of an equal weight portfolio of the picked columns in each period
+def equal_weight_returns(returns, picks):
+    held = np.take_along_axis(returns, np.maximum(picks, 0), axis=1)
+    held = np.where((picks >= 0) & np.isfinite(held), held, np.nan)
+    counts = np.sum(np.isfinite(held), axis=1)
+    return np.where(counts > 0, np.nansum(held, axis=1) / np.maximum(counts, 1), 0.0)
+
+def summarize(returns, periods_per_year):
+    metrics = {name: values[0] for (name, values) in Metrics.summary(returns, periods_per_year).items()}
+    return {"periods": len(returns), **metrics}
+
+def run_config(dates, closes, config):
+    rows, returns = simulate(dates, closes, config)
+    return {**config.as_dict(), **summarize(returns, 12 / config.rebalance_months)}
+
+
+_panel = None
+
+def _open_panel(folder):
+    global _panel
+    panel = Panel(os.path.join(folder, "panel"))
+    _panel = (panel.dates, panel.field("Close"))
+
+def _run_shared(config):
+    dates, closes = _panel
+    return run_config(dates, closes, config)
+
+def share_panel(dates, closes, folder):
+    write_panel(os.path.join(folder, "panel"), dates, [str(i) for i in range(closes.shape[1])], {"Close": closes})
+
+# Run every config on a process pool and write one row of metrics per config.
+# `output` may end in .csv or .parquet. With a `checkpoint` file the finished
+# rows are saved every `checkpoint_every` configs and a restarted sweep over
+# the same data and configs only runs the ones left.
+def run_sweep(dates, closes, configs, output=None, workers=None, chunksize=16, checkpoint=None, checkpoint_every=64):
+    println(f"Sweeping {len(configs)} configurations over {closes.shape[1]} tickers and {len(dates)} days")
+    results = []
+    if checkpoint is not None:
+        checkpoint = Checkpoint(checkpoint, {"runner": "sweep", "data": array_digest(closes), "dates": array_digest(dates),
+                                             "configs": [config.as_dict() for config in configs]}, checkpoint_every)
+        _, state = checkpoint.load()
+        results = state["results"] if state is not None else []
+    with tempfile.TemporaryDirectory(prefix="sweep-") as folder:
+        share_panel(dates, closes, folder)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_panel, initargs=(folder,)) as pool:
+            step = max(len(configs), 1) if checkpoint is None else checkpoint_every
+            for start in range(len(results), len(configs), step):
+                results += pool.map(_run_shared, configs[start:start + step], chunksize=chunksize)
+                if checkpoint is not None:
+                    checkpoint.maybe_save(len(results), lambda: {"results": results})
+    if checkpoint is not None:
+        checkpoint.clear()
+
+    table = pd.DataFrame(results)
+    if output is not None:
+        if output.endswith(".parquet"):
+            table.to_parquet(output, index=False)
+        else:
+            table.to_csv(output, index=False)
+        println(f"Sweep results written to {output}")
+    return table
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+    from YF import price_panel
+    from DateUtil import date_from
+    from Checkpoint import checkpoint_file
+
+    parser = argparse.ArgumentParser(description="Parameter sweep of the momentum strategy over an index's constituents")
+    parser.add_argument("index_csv")
+    parser.add_argument("--start", default="2023-05-01")
+    parser.add_argument("--end", default="2025-06-27")
+    args = parser.parse_args()
+
+    tickers = read_nse_index(args.index_csv)
+    dates, _, closes = price_panel(tickers, date_from(args.start), date_from(args.end))
+    grid = config_grid(top_ns=(5, 10, 15, 20), lookback_months=(3, 6, 9, 12), skip_months=(0, 1), rebalance_months=(1, 2, 3))
+    print(run_sweep(dates, closes, grid, output="sweep_results.csv", checkpoint=checkpoint_file("sweep")).sort_values("sharpe", ascending=False).head(10))
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# Deterministic synthetic NSE-like price panels for benchmarks and offline runs.
+#
+# Sessions are weekdays minus ~15 random holidays a year. Each ticker follows a
+# geometric random walk with its own drift and volatility, lists and delists at
+# random dates and has a small fraction of missing bars. The same arguments always
+# produce the same panel.
+
+def synthetic_sessions(years, end_date="2025-06-30", holidays_per_year=15, seed=0):
+    rng = np.random.default_rng(seed)
+    end = np.datetime64(end_date, "D")
+    start = (end.astype("datetime64[M]") - 12 * years).astype("datetime64[D]")
+    days = np.arange(start, end + 1, dtype="datetime64[D]")
+    days = days[np.is_busday(days)]
+    holidays = rng.choice(len(days), size=min(len(days) - 1, holidays_per_year * years), replace=False)
+    return np.delete(days, holidays)
+
+def synthetic_tickers(n_tickers):
+    return [f"SYN{i:04d}" for i in range(n_tickers)]
+
+# (dates, tickers, closes) with NaN before listing, after delisting and on gaps
+def synthetic_closes(n_tickers, years, seed=0, gap_rate=0.005, listed_fraction=0.7, delisted_fraction=0.15):
+    rng = np.random.default_rng(seed)
+    dates = synthetic_sessions(years, seed=seed)
+    n_days = len(dates)
+
+    drift = rng.normal(0.10, 0.15, n_tickers) / 252
+    vol = rng.uniform(0.15, 0.55, n_tickers) / np.sqrt(252)
+    shocks = rng.standard_normal((n_days, n_tickers)).astype(np.float32) * vol.astype(np.float32)
+    log_prices = np.cumsum(shocks + (drift - vol ** 2 / 2).astype(np.float32), axis=0)
+    closes = (rng.uniform(50, 3000, n_tickers) * np.exp(log_prices)).astype(np.float64)
+
+    # Listings after the first day and delistings before the last one
+    rows = np.arange(n_days)[:, None]
+    listed = np.where(rng.random(n_tickers) < listed_fraction, 0, rng.integers(0, n_days, n_tickers))
+    delisted = np.where(rng.random(n_tickers) < delisted_fraction, rng.integers(0, n_days, n_tickers), n_days)
+    delisted = np.maximum(delisted, listed + 1)
+    closes[(rows < listed) | (rows >= delisted)] = np.nan
+    closes[rng.random((n_days, n_tickers)) < gap_rate] = np.nan
+    return dates, synthetic_tickers(n_tickers), closes
+
+# The same panel in the yfinance layout: (Price, Ticker) columns with OHLCV
+def synthetic_frame(n_tickers, years, seed=0, suffix=".NS"):
+    dates, tickers, closes = synthetic_closes(n_tickers, years, seed)
+    rng = np.random.default_rng(seed + 1)
+    spread = 1 + rng.uniform(0, 0.02, closes.shape)
+    fields = {
+        "Close": closes,
+        "High": closes * spread,
+        "Low": closes / spread,
+        "Open": closes * (1 + rng.uniform(-0.01, 0.01, closes.shape)),
+        "Volume": np.where(np.isnan(closes), np.nan, rng.integers(1_000, 5_000_000, closes.shape).astype(np.float64)),
+    }
+    columns = pd.MultiIndex.from_product([list(fields), [f"{ticker}{suffix}" for ticker in tickers]], names=["Price", "Ticker"])
+    index = pd.DatetimeIndex(dates.astype("datetime64[ns]"), name="Date")
+    return pd.DataFrame(np.hstack(list(fields.values())), index=index, columns=columns)
+
+# Index constituents file in the NSE download layout (Symbol is the third column)
+def write_index_csv(file_path, tickers):
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("Company Name,Industry,Symbol,Series,ISIN Code\n")
+        for i, ticker in enumerate(tickers):
+            f.write(f"Synthetic {i},Synthetic,{ticker},EQ,INE{i:07d}\n")
+
+# Intraday bars as a generator of one (times, tickers, {field: bars x tickers})
+# block per session, so histories larger than memory can be written to a bar store
+def synthetic_bar_blocks(n_tickers, years, bars_per_session=75, minutes_per_bar=5, seed=0, gap_rate=0.01):
+    rng = np.random.default_rng(seed)
+    sessions = synthetic_sessions(years, seed=seed)
+    offsets = np.timedelta64(9 * 60 + 15 + minutes_per_bar, "m") + np.arange(bars_per_session) * np.timedelta64(minutes_per_bar, "m")
+    drift = rng.normal(0.10, 0.15, n_tickers) / 252 / bars_per_session
+    vol = rng.uniform(0.15, 0.55, n_tickers) / np.sqrt(252 * bars_per_session)
+    log_prices = np.log(rng.uniform(50, 3000, n_tickers))
+    tickers = [f"{ticker}.NS" for ticker in synthetic_tickers(n_tickers)]
+    for session in sessions:
+        steps = rng.standard_normal((bars_per_session, n_tickers)) * vol + (drift - vol ** 2 / 2)
+        closes = np.exp(log_prices + np.cumsum(steps, axis=0))
+        log_prices = np.log(closes[-1])
+        closes[rng.random(closes.shape) < gap_rate] = np.nan
+        volumes = np.where(np.isnan(closes), np.nan, rng.integers(100, 50_000, closes.shape).astype(np.float64))
+        yield session.astype("datetime64[m]") + offsets, tickers, {"Close": closes, "Volume": volumes}
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import atexit
+import threading
+
+from collections import defaultdict
+
+# Structured stage tracing and counters.
+#
+#   with Trace.span("extract_returns", target_date="2025-06-27", tickers=50):
+#       ...
+#   Trace.count("cache_miss")
+#
+# Spans nest per thread and carry their context as args. Everything is a no-op
+# until enable() is called: span() then returns a shared do-nothing object and
+# count() returns after one global check. Export with write_json (spans, counters
+# and per-stage totals) or write_chrome_trace (chrome://tracing / Perfetto).
+
+enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_spans = []
+_events = []
+_counters = defaultdict(int)
+_origin = time.perf_counter_ns()
+
+
+class _NoSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **context):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+
+    def __init__(self, name, context):
+        self.name = name
+        self.context = context
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        _stack().pop()
+        if exc_type is not None:
+            self.context["error"] = f"{exc_type.__name__}: {exc}"
+        record = {
+            "name": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "thread": threading.get_ident(),
+            "start_us": (self.start - _origin) / 1000,
+            "duration_us": (end - self.start) / 1000,
+            "args": self.context,
+        }
+        with _lock:
+            _spans.append(record)
+        return False
+
+    # Attach context discovered while the span is running, e.g. rows read
+    def set(self, **context):
+        self.context.update(context)
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def span(name, **context):
+    if not enabled:
+        return _NO_SPAN
+    return _Span(name, context)
+
+def count(name, value=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] += value
+
+def event(name, **context):
+    if not enabled:
+        return
+    with _lock:
+        _events.append({"name": name, "thread": threading.get_ident(), "time_us": (time.perf_counter_ns() - _origin) / 1000, "args": context})
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _events.clear()
+        _counters.clear()
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+# Total time, calls and max duration per span name
+def stage_totals():
+    totals = {}
+    with _lock:
+        for record in _spans:
+            total = totals.setdefault(record["name"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            total["calls"] += 1
+            total["total_ms"] += record["duration_us"] / 1000
+            total["max_ms"] = max(total["max_ms"], record["duration_us"] / 1000)
+    return totals
+
+def write_json(file_path):
+    with _lock:
+        report = {"spans": list(_spans), "events": list(_events), "counters": dict(_counters)}
+    report["stages"] = stage_totals()
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, default=str)
+
+def write_chrome_trace(file_path):
+    pid = os.getpid()
+    with _lock:
+        trace = [{"name": r["name"], "ph": "X", "ts": r["start_us"], "dur": r["duration_us"], "pid": pid, "tid": r["thread"], "args": r["args"]} for r in _spans]
+        trace += [{"name": e["name"], "ph": "i", "s": "t", "ts": e["time_us"], "pid": pid, "tid": e["thread"], "args": e["args"]} for e in _events]
+        trace += [{"name": name, "ph": "C", "ts": 0, "pid": pid, "args": {name: value}} for (name, value) in _counters.items()]
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, default=str)
+
+def print_summary():
+    print("\nStage                          Calls    Total ms      Max ms")
+    for name, total in sorted(stage_totals().items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"{name:<30} {total['calls']:>5} {total['total_ms']:>11.1f} {total['max_ms']:>11.1f}")
+    for name, value in sorted(counters().items()):
+        print(f"{name:<30} {value:>17}")
+
+# TRACE=run.json (or run.trace.json for Chrome format) turns tracing on and
+# writes the file when the process exits
+def enable_from_env(variable="TRACE"):
+    file_path = os.environ.get(variable)
+    if not file_path:
+        return False
+    enable()
+    writer = write_chrome_trace if file_path.endswith(".trace.json") else write_json
+    atexit.register(writer, file_path)
+    return True
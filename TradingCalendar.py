@@ -0,0 +1,113 @@
+import os
+import numpy as np
+
+# NSE trading sessions as a sorted datetime64[D] array.
+#
+# Built once from the dates actually observed in the price data and, outside the
+# observed range, from weekdays minus the bundled holiday list (nse_holidays.csv).
+# Weekdays are only assumed to be sessions up to the last listed holiday, past
+# that the calendar ends with the observed data, so extend the holiday list to
+# extend the calendar. Every query takes an array of dates and is answered with
+# one searchsorted call. Dates outside the calendar resolve to NaT.
+
+HOLIDAYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nse_holidays.csv")
+
+class TradingCalendar:
+
+    # end is the last day the calendar knows about, the last session by default
+    def __init__(self, sessions, end=None):
+        self.sessions = np.unique(np.asarray(sessions, dtype="datetime64[D]"))
+        self.end = _days([end])[0] if end is not None else (self.sessions[-1] if len(self.sessions) else None)
+
+    # Last session on or before each date
+    def as_of(self, dates):
+        days = _days(dates)
+        rows = np.searchsorted(self.sessions, days, side="right") - 1
+        return self._sessions_at(np.where(self._known(days), rows, -1))
+
+    # Last session strictly before each date
+    def previous(self, dates):
+        days = _days(dates)
+        rows = np.searchsorted(self.sessions, days, side="left") - 1
+        return self._sessions_at(np.where(self._known(days), rows, -1))
+
+    # First session strictly after each date
+    def next(self, dates):
+        rows = np.searchsorted(self.sessions, _days(dates), side="right")
+        return self._sessions_at(rows)
+
+    # First session on or after each date
+    def on_or_after(self, dates):
+        rows = np.searchsorted(self.sessions, _days(dates), side="left")
+        return self._sessions_at(rows)
+
+    def is_session(self, dates):
+        days = _days(dates)
+        return self.on_or_after(days) == days
+
+    # Last session of each calendar month between two dates
+    def month_ends(self, start_date, end_date):
+        sessions = self.sessions[(self.sessions >= _days([start_date])[0]) & (self.sessions <= _days([end_date])[0])]
+        if len(sessions) == 0:
+            return sessions
+        months = sessions.astype("datetime64[M]")
+        return sessions[np.append(months[1:] != months[:-1], True)]
+
+    def _known(self, days):
+        return days <= self.end if self.end is not None else np.zeros(len(days), dtype=bool)
+
+    def _sessions_at(self, rows):
+        valid = (rows >= 0) & (rows < len(self.sessions))
+        if len(self.sessions) == 0:
+            return np.full(len(rows), np.datetime64("NaT"), dtype="datetime64[D]")
+        return np.where(valid, self.sessions[np.clip(rows, 0, len(self.sessions) - 1)], np.datetime64("NaT"))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __str__(self):
+        if len(self.sessions) == 0:
+            return "TradingCalendar(empty)"
+        return f"TradingCalendar({self.sessions[0]} to {self.end}, Sessions: {len(self.sessions)})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def read_holidays(file_path=HOLIDAYS_FILE):
+    if not os.path.exists(file_path):
+        return np.empty(0, dtype="datetime64[D]")
+    with open(file_path, "r", encoding="utf-8") as f:
+        next(f, None) # Skip the header row
+        return np.array([line.strip() for line in f if line.strip()], dtype="datetime64[D]")
+
+# Weekdays between two dates (inclusive) that are not holidays
+def business_sessions(start_date, end_date, holidays):
+    start, end = _days([start_date])[0], _days([end_date])[0]
+    if end < start:
+        return np.empty(0, dtype="datetime64[D]")
+    days = np.arange(start, end + 1, dtype="datetime64[D]")
+    return days[np.is_busday(days, holidays=holidays)]
+
+# Observed sessions, filled in with weekdays minus holidays for the parts of
+# [start_date, end_date] before the first and after the last observed session.
+# end_date is capped at the last listed holiday, later weekdays are not known
+# to be sessions.
+def build_calendar(observed=(), holidays=None, start_date=None, end_date=None):
+    observed = np.unique(np.asarray(observed, dtype="datetime64[D]"))
+    holidays = read_holidays() if holidays is None else np.asarray(holidays, dtype="datetime64[D]")
+    if end_date is not None and len(holidays):
+        end_date = min(_days([end_date])[0], holidays.max())
+    sessions = [observed]
+    if start_date is not None:
+        last = observed[0] - 1 if len(observed) else _days([end_date or start_date])[0]
+        sessions.append(business_sessions(start_date, last, holidays))
+    if end_date is not None:
+        first = observed[-1] + 1 if len(observed) else _days([start_date or end_date])[0]
+        sessions.append(business_sessions(first, end_date, holidays))
+    sessions = np.concatenate(sessions)
+    end = max(sessions.max(), _days([end_date])[0]) if len(sessions) and end_date is not None else None
+    return TradingCalendar(sessions, end)
+
+def _days(dates):
+    return np.atleast_1d(np.asarray(dates, dtype="datetime64[D]"))
@@ -0,0 +1,170 @@
+import os
+import tempfile
+import itertools
+import numpy as np
+import pandas as pd
+import Metrics
+import Sweep
+import Trace
+
+from concurrent.futures import ProcessPoolExecutor
+from CLI import println
+from Checkpoint import Checkpoint, array_digest
+from Scoring import momentum_scores, month_end_rows, top_n as top_n_of
+
+# Walk-forward evaluation: run the monthly 12-minus-1 strategy from every start
+# month for several horizons.
+#
+# A ranking only depends on (universe, date, lookback, skip), never on the path
+# it is used in, so every month-end is scored once and each path is a slice of
+# the same per-period portfolio returns. Metrics for all paths of a horizon come
+# out of one Metrics.summary call on a sliding window view.
+#
+# Configs run on a process pool that shares the panel the way Sweep does. Each
+# worker keeps a RankingCache, and configs with the same lookback are handed to
+# the same worker, so the scores are computed once per lookback.
+
+class RankingCache:
+
+    def __init__(self, universe="all"):
+        self.universe = universe
+        self.scores = {}
+
+    # Scores of the given rows, only computing the ones not seen before.
+    # `members` masks out tickers outside the universe on each row.
+    def scores_for(self, dates, closes, rows, lookback_months=12, skip_months=1, members=None):
+        keys = [(self.universe, dates[row], lookback_months, skip_months) for row in rows]
+        missing = [i for (i, key) in enumerate(keys) if key not in self.scores]
+        Trace.count("ranking_cache_hits", len(keys) - len(missing))
+        Trace.count("ranking_cache_misses", len(missing))
+        if missing:
+            computed = momentum_scores(dates, closes, dates[rows[missing]], lookback_months, skip_months)
+            if members is not None:
+                computed = np.where(members[missing], computed, np.nan)
+            for i, values in zip(missing, computed):
+                self.scores[keys[i]] = values
+        if not keys:
+            return np.empty((0, closes.shape[1]))
+        return np.vstack([self.scores[key] for key in keys])
+
+    def __str__(self):
+        return f"RankingCache(Universe: {self.universe}, Rankings: {len(self.scores)})"
+
+    def __repr__(self):
+        return str(self)
+
+
+# One row per (start month, horizon) path of a config
+def walk_forward_paths(dates, closes, cache, horizons, lookback_months=12, skip_months=1, top_n=10, members=None):
+    rows = month_end_rows(dates)
+    if len(rows) < 2:
+        return []
+    scores = cache.scores_for(dates, closes, rows, lookback_months, skip_months, members)
+    picks = top_n_of(scores[:-1], top_n)
+    returns = Sweep.equal_weight_returns(Sweep.period_returns(closes, rows), picks)
+
+    # Paths only start once the first full lookback window is available
+    first_start = int(np.argmax(np.isfinite(scores).any(axis=1))) if np.isfinite(scores).any() else len(returns)
+    results = []
+    for horizon in horizons:
+        n_paths = len(returns) - horizon + 1 - first_start
+        if n_paths <= 0:
+            continue
+        paths = np.lib.stride_tricks.sliding_window_view(returns[first_start:], horizon).T
+        metrics = Metrics.summary(paths, 12)
+        for i in range(n_paths):
+            start = first_start + i
+            results.append({
+                "start": dates[rows[start]],
+                "end": dates[rows[start + horizon]],
+                "horizon_months": horizon,
+                "lookback_months": lookback_months,
+                "skip_months": skip_months,
+                "top_n": top_n,
+                **{name: values[i] for (name, values) in metrics.items()},
+            })
+    return results
+
+
+_cache = None
+_members = None
+
+def _open_shared(folder, universe):
+    global _cache, _members
+    Sweep._open_panel(folder)
+    _cache = RankingCache(universe)
+    members_file = os.path.join(folder, "members.npy")
+    _members = np.load(members_file, mmap_mode="r") if os.path.exists(members_file) else None
+
+def _run_shared(task):
+    lookback_months, skip_months, top_n, horizons = task
+    dates, closes = Sweep._panel
+    return walk_forward_paths(dates, closes, _cache, horizons, lookback_months, skip_months, top_n, _members)
+
+# Evaluate every start month for each horizon (in months) and config.
+# `members` is an optional (month-end rows x tickers) universe mask, see
+# Constituents.masks, and `universe` names it for the ranking cache. With a
+# `checkpoint` file finished configs are saved every `checkpoint_every` configs
+# and a restart picks up after them.
+def walk_forward(dates, closes, horizons=(12, 24, 36), lookback_months=(12,), skip_months=(1,), top_ns=(10,),
+                 members=None, universe="all", output=None, workers=None, checkpoint=None, checkpoint_every=16):
+    tasks = [(lookback, skip, top_n, tuple(horizons)) for (lookback, skip, top_n) in itertools.product(lookback_months, skip_months, top_ns)]
+    println(f"Walking forward {len(tasks)} configurations over {len(horizons)} horizons and {len(month_end_rows(dates))} month ends")
+
+    results = []
+    if checkpoint is not None:
+        checkpoint = Checkpoint(checkpoint, {"runner": "walk_forward", "data": array_digest(closes), "dates": array_digest(dates), "tasks": tasks,
+                                             "members": array_digest(members) if members is not None else None, "universe": universe}, checkpoint_every)
+        _, state = checkpoint.load()
+        if state is not None:
+            results = [[{**row, "start": np.datetime64(row["start"]), "end": np.datetime64(row["end"])} for row in rows] for rows in state["results"]]
+    # Steps hold whole lookback groups, so each one still goes to a single worker
+    step = len(tasks) if checkpoint is None else -(-checkpoint_every // len(top_ns)) * len(top_ns)
+
+    def save():
+        if checkpoint is not None:
+            checkpoint.maybe_save(len(results), lambda: {"results": results})
+
+    with Trace.span("walk_forward", configs=len(tasks), horizons=len(horizons)):
+        if workers == 0:
+            cache = RankingCache(universe)
+            for (lookback, skip, top_n, _) in tasks[len(results):]:
+                results.append(walk_forward_paths(dates, closes, cache, horizons, lookback, skip, top_n, members))
+                save()
+        elif len(results) < len(tasks):
+            with tempfile.TemporaryDirectory(prefix="walk-forward-") as folder:
+                Sweep.share_panel(dates, closes, folder)
+                if members is not None:
+                    np.save(os.path.join(folder, "members.npy"), np.asarray(members, dtype=bool))
+                with ProcessPoolExecutor(max_workers=workers, initializer=_open_shared, initargs=(folder, universe)) as pool:
+                    for start in range(len(results), len(tasks), step):
+                        results += pool.map(_run_shared, tasks[start:start + step], chunksize=len(top_ns))
+                        save()
+    if checkpoint is not None:
+        checkpoint.clear()
+
+    table = pd.DataFrame([row for rows in results for row in rows])
+    if output is not None:
+        if output.endswith(".parquet"):
+            table.to_parquet(output, index=False)
+        else:
+            table.to_csv(output, index=False)
+        println(f"Walk-forward results written to {output}")
+    return table
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+    from YF import price_panel
+    from DateUtil import date_from
+
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation of the momentum strategy over an index's constituents")
+    parser.add_argument("index_csv")
+    parser.add_argument("--start", default="2015-01-01")
+    parser.add_argument("--end", default="2025-06-27")
+    args = parser.parse_args()
+
+    tickers = read_nse_index(args.index_csv)
+    dates, _, closes = price_panel(tickers, date_from(args.start), date_from(args.end))
+    table = walk_forward(dates, closes, horizons=(12, 24, 36), top_ns=(5, 10))
+    print(table.groupby(["horizon_months", "top_n"])[["cagr", "sharpe", "max_drawdown"]].describe())
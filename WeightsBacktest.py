@@ -0,0 +1,228 @@
+import numpy as np
+import Metrics
+import Trace
+
+from Scoring import as_of_rows, last_valid_rows, top_n as top_n_of
+
+# Weights matrix backtest.
+#
+# A strategy hands over a (rebalance dates x tickers) target weight matrix. At
+# each rebalance the book is reset to the targets, in between the weights drift
+# with prices. Everything is computed with matrix operations on the whole panel:
+#
+#   growth of period p on day t   = cash weight + sum_i w[p, i] * price[t, i] / price[start of p, i]
+#   drifted weights before p + 1  = w[p] * relative price at the end of p / growth at the end of p
+#   turnover at each rebalance    = sum |w[p + 1] - drifted weights|
+#   cost at each rebalance        = turnover * (commission + slippage)
+#
+# Weights left unallocated stay in cash at zero return.
+
+SCHEMES = ("equal", "score", "capped")
+
+class WeightsResult:
+
+    def __init__(self, dates, returns, equity, rebalance_dates, turnover, costs, weights=None, drifted=None):
+        self.dates = dates
+        self.returns = returns
+        self.equity = equity
+        self.rebalance_dates = rebalance_dates
+        self.turnover = turnover
+        self.costs = costs
+        self.weights = weights
+        self.drifted = drifted
+
+    # Every weight change as columns: date, ticker (panel column), weight before, weight after
+    def trades(self):
+        if self.weights is None or len(self.weights) == 0:
+            return {"date": np.empty(0, dtype="datetime64[D]"), "ticker": np.empty(0, dtype=np.int32), "weight_before": np.empty(0), "weight_after": np.empty(0)}
+        rows, cols = np.nonzero(np.abs(self.weights - self.drifted) > 1e-12)
+        return {
+            "date": self.rebalance_dates[rows],
+            "ticker": cols.astype(np.int32),
+            "weight_before": self.drifted[rows, cols],
+            "weight_after": self.weights[rows, cols],
+        }
+
+    def summary(self, periods_per_year=252):
+        metrics = {name: values[0] for (name, values) in Metrics.summary(self.returns, periods_per_year).items()}
+        return {**metrics, "turnover": float(self.turnover.sum()), "costs": float(self.costs.sum())}
+
+    def __str__(self):
+        return f"WeightsResult(Days: {len(self.dates)}, Rebalances: {len(self.rebalance_dates)}, Final equity: {self.equity[-1] if len(self.equity) else 1.0:.4f})"
+
+    def __repr__(self):
+        return str(self)
+
+
+# Target weights from scores. "equal" splits evenly over the top n, "score"
+# weights them by their (positive) score and "capped" is score weighted with no
+# position above `cap`, the excess redistributed over the positions below it.
+def target_weights(scores, scheme="equal", top_n=10, cap=0.2):
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown weighting scheme {scheme}, expected one of {SCHEMES}")
+    scores = np.asarray(scores, dtype=np.float64)
+    picks = top_n_of(scores, top_n)
+    picked = np.zeros(scores.shape, dtype=bool)
+    rows = np.repeat(np.arange(scores.shape[0]), picks.shape[1])
+    valid = picks.ravel() >= 0
+    picked[rows[valid], picks.ravel()[valid]] = True
+
+    if scheme == "equal":
+        raw = picked.astype(np.float64)
+    else:
+        raw = np.where(picked, np.maximum(scores, 0), 0.0)
+        # Rows where every pick has a non-positive score fall back to equal weights
+        raw = np.where((raw.sum(axis=1, keepdims=True) > 0), raw, picked.astype(np.float64))
+    totals = raw.sum(axis=1, keepdims=True)
+    weights = np.divide(raw, totals, out=np.zeros_like(raw), where=totals > 0)
+    if scheme == "capped":
+        weights = _cap(weights, cap)
+    return weights
+
+# Clip to the cap and hand the excess to uncapped positions pro rata. Each round
+# caps at least one more position, so there is at most one round per column.
+def _cap(weights, cap):
+    for _ in range(weights.shape[1]):
+        over = weights > cap + 1e-12
+        if not over.any():
+            break
+        excess = np.sum(np.where(over, weights - cap, 0), axis=1, keepdims=True)
+        weights = np.minimum(weights, cap)
+        room = np.where((weights > 0) & (weights < cap - 1e-12), weights, 0)
+        room_total = room.sum(axis=1, keepdims=True)
+        weights = weights + np.divide(room * excess, room_total, out=np.zeros_like(room), where=room_total > 0)
+    return weights
+
+# Daily returns, equity curve, turnover and costs of holding `weights` from each
+# rebalance date to the next. Costs are in basis points of traded value.
+def run_weights(dates, closes, rebalance_dates, weights, commission_bps=3.0, slippage_bps=5.0):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    closes = np.asarray(closes, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    with Trace.span("weights_backtest", days=len(dates), tickers=closes.shape[1], rebalances=len(rebalance_dates)):
+        n_rows, n_cols = closes.shape
+        # Forward filled prices so a ticker without a bar keeps its last value
+        last_valid = last_valid_rows(closes)
+        prices = np.where(last_valid >= 0, closes[np.maximum(last_valid, 0), np.arange(n_cols)], np.nan)
+
+        start_rows = as_of_rows(dates, np.asarray(rebalance_dates, dtype="datetime64[D]"))
+        keep = start_rows >= 0
+        start_rows, weights = start_rows[keep], weights[keep]
+        rebalance_dates = dates[start_rows]
+        if len(start_rows) == 0:
+            return WeightsResult(dates[:0], np.empty(0), np.empty(0), rebalance_dates, np.empty(0), np.empty(0))
+
+        # Tickers without a price at the rebalance cannot be bought, their weight stays in cash
+        base = prices[start_rows]
+        weights = np.where(np.isfinite(base) & (base > 0), weights, 0.0)
+        cash = 1 - weights.sum(axis=1)
+
+        # Return days (start of p, start of p + 1] belong to period p, the book
+        # bought at the close of a rebalance day is sold at the next one's close
+        days = np.arange(start_rows[0], n_rows)
+        period = np.maximum(np.searchsorted(start_rows, days, side="left") - 1, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative = np.nan_to_num(prices[days] / base[period], nan=0.0)
+            previous_relative = np.nan_to_num(prices[np.maximum(days - 1, 0)] / base[period], nan=0.0)
+        growth = cash[period] + np.sum(weights[period] * relative, axis=1)
+        previous_growth = cash[period] + np.sum(weights[period] * previous_relative, axis=1)
+        returns = np.divide(growth, previous_growth, out=np.ones_like(growth), where=previous_growth > 0) - 1
+        returns[0] = 0.0
+
+        # Weights drifted to the next rebalance, and what it costs to reset them
+        ends = start_rows[1:] - start_rows[0]
+        drifted = np.divide(weights[:-1] * relative[ends], growth[ends][:, None], out=np.zeros_like(weights[:-1]), where=growth[ends][:, None] > 0)
+        drifted = np.vstack([np.zeros((1, n_cols)), drifted])
+        turnover = np.abs(weights - drifted).sum(axis=1)
+        costs = turnover * (commission_bps + slippage_bps) / 10000
+
+        rebalance_days = start_rows - start_rows[0]
+        returns[rebalance_days] = (1 + returns[rebalance_days]) * (1 - costs) - 1
+        equity = np.cumprod(1 + returns)
+    return WeightsResult(dates[days], returns, equity, rebalance_dates, turnover, costs, weights, drifted)
+
+# run_weights for several strategies at once over the same prices and
+# rebalance timeline. `targets` is (strategies x rebalance dates x tickers) and
+# `rebalance` an optional (strategies x rebalance dates) mask: where it is False
+# the strategy keeps its drifted book instead of trading to the target. The
+# forward fill and the relative price matrix are computed once for all of them.
+# Costs may be one value or one per strategy. Returns a WeightsResult per strategy.
+def run_weights_batch(dates, closes, rebalance_dates, targets, rebalance=None, commission_bps=3.0, slippage_bps=5.0):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    closes = np.asarray(closes, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    n_strategies = targets.shape[0]
+    rebalance = np.ones(targets.shape[:2], dtype=bool) if rebalance is None else np.asarray(rebalance, dtype=bool)
+    cost_rates = np.broadcast_to((np.asarray(commission_bps, dtype=np.float64) + np.asarray(slippage_bps, dtype=np.float64)) / 10000, (n_strategies,))
+    with Trace.span("weights_backtest_batch", days=len(dates), tickers=closes.shape[1], strategies=n_strategies, rebalances=len(rebalance_dates)):
+        n_rows, n_cols = closes.shape
+        last_valid = last_valid_rows(closes)
+        prices = np.where(last_valid >= 0, closes[np.maximum(last_valid, 0), np.arange(n_cols)], np.nan)
+
+        start_rows = as_of_rows(dates, np.asarray(rebalance_dates, dtype="datetime64[D]"))
+        keep = start_rows >= 0
+        start_rows, targets, rebalance = start_rows[keep], targets[:, keep], rebalance[:, keep]
+        rebalance_dates = dates[start_rows]
+        if len(start_rows) == 0:
+            return [WeightsResult(dates[:0], np.empty(0), np.empty(0), rebalance_dates, np.empty(0), np.empty(0)) for _ in range(n_strategies)]
+
+        base = prices[start_rows]
+        buyable = np.isfinite(base) & (base > 0)
+        days = np.arange(start_rows[0], n_rows)
+        period = np.maximum(np.searchsorted(start_rows, days, side="left") - 1, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative = np.nan_to_num(prices[days] / base[period], nan=0.0)
+            previous_relative = np.nan_to_num(prices[np.maximum(days - 1, 0)] / base[period], nan=0.0)
+
+        # Periods run one after another since a held book depends on how the
+        # previous one drifted, the strategies within a period are one matmul
+        n_periods = len(start_rows)
+        bounds = np.searchsorted(period, np.arange(n_periods + 1), side="left")
+        growth = np.empty((len(days), n_strategies))
+        previous_growth = np.empty((len(days), n_strategies))
+        weights = np.zeros((n_strategies, n_periods, n_cols))
+        drifted = np.zeros((n_strategies, n_periods, n_cols))
+        for p in range(n_periods):
+            trade = rebalance[:, p] | (p == 0)
+            held = np.where(trade[:, None], targets[:, p], drifted[:, p])
+            weights[:, p] = np.where(buyable[p][None], held, 0.0)
+            cash = 1 - weights[:, p].sum(axis=1)
+            segment = slice(bounds[p], bounds[p + 1])
+            growth[segment] = cash + relative[segment] @ weights[:, p].T
+            previous_growth[segment] = cash + previous_relative[segment] @ weights[:, p].T
+            if p + 1 < n_periods:
+                end = start_rows[p + 1] - start_rows[0]
+                drifted[:, p + 1] = np.divide(weights[:, p] * relative[end], growth[end][:, None], out=np.zeros((n_strategies, n_cols)), where=growth[end][:, None] > 0)
+
+        returns = np.divide(growth, previous_growth, out=np.ones_like(growth), where=previous_growth > 0) - 1
+        returns[0] = 0.0
+        turnover = np.abs(weights - drifted).sum(axis=2)
+        costs = turnover * cost_rates[:, None]
+        rebalance_days = start_rows - start_rows[0]
+        returns[rebalance_days] = (1 + returns[rebalance_days]) * (1 - costs.T) - 1
+        equity = np.cumprod(1 + returns, axis=0)
+    return [WeightsResult(dates[days], returns[:, s], equity[:, s], rebalance_dates, turnover[s], costs[s], weights[s], drifted[s]) for s in range(n_strategies)]
+
+# Scores -> weights -> run for several schemes over the same prices
+def compare_schemes(dates, closes, rebalance_dates, scores, schemes=SCHEMES, top_n=10, cap=0.2, **costs):
+    return {scheme: run_weights(dates, closes, rebalance_dates, target_weights(scores, scheme, top_n, cap), **costs) for scheme in schemes}
+
+if __name__ == "__main__":
+    import argparse
+    from App import read_nse_index
+    from YF import price_panel
+    from DateUtil import date_from
+    from Scoring import momentum_scores, month_end_rows
+
+    parser = argparse.ArgumentParser(description="Compare weighting schemes of the momentum strategy over an index's constituents")
+    parser.add_argument("index_csv")
+    parser.add_argument("--start", default="2015-01-01")
+    parser.add_argument("--end", default="2025-06-27")
+    args = parser.parse_args()
+
+    tickers = read_nse_index(args.index_csv)
+    dates, _, closes = price_panel(tickers, date_from(args.start), date_from(args.end))
+    rebalance_dates = dates[month_end_rows(dates)]
+    scores = momentum_scores(dates, closes, rebalance_dates)
+    for scheme, result in compare_schemes(dates, closes, rebalance_dates, scores).items():
+        print(scheme, result, result.summary())
@@ -1,107 +1,214 @@
 import os
-import yfinance as yf
-import pandas as pd
+import numpy as np
 
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from CLI import println, debug
 from Ticker import Ticker, empty_ticker_from
 from Backtest import Backtest
-from DateUtil import to_string, nearest_friday_of, next_day_of
+from DateUtil import to_string, nearest_friday_of, next_day_of, to_datetimes
+from PriceStore import PriceStore, import_legacy_cache
+from Panel import current_panel
+from Constituents import ConstituentStore
+from TradingCalendar import build_calendar, business_sessions, read_holidays
+import Trace
+from Scoring import close_panel, window_returns, momentum_scores, prices_as_of
 
-def returns_of_12_minus_1_months(tickers, curr_date):
+def returns_of_12_minus_1_months(tickers, curr_date, store=None):
         
     # Revisit the date range again. Needs to be more accurate    
-    end_date = nearest_friday_of((curr_date.replace(day=1) - timedelta(days=1)).replace(hour=23, minute=59, second=59)) # last day of the previous month
-    start_date = (end_date - relativedelta(months=12)).replace(day=1) # Start of the 12th month ago
+    start_date, end_date = window_of(curr_date)
         
     # Convert with yf compatible tickers
     yf_tickers = [f"{ticker}.NS" for ticker in tickers]
-     
-    data = fetch_from_cache(curr_date)
-    if data is not None:
-        print("Reading data from cache...")
-        return Backtest(curr_date, extract_returns(yf_tickers, data, curr_date, end_date))
     
-    else:
-        try:
-            print(f"Fetching data from {start_date.strftime('%Y-%m-%d')} to {curr_date.strftime('%Y-%m-%d')}")
-
-            # Download data up till current date
-            downloaded_data = yf.download(yf_tickers, start=start_date, end=curr_date, auto_adjust=True, progress=False)
-            store_data_in_cache(curr_date, downloaded_data)
-            return Backtest(curr_date, extract_returns(yf_tickers, downloaded_data, curr_date, end_date))
-        
-        except Exception as e:
-            print(f"Error while trying to fetch data from YF: {e}")
-            return []
+    store = store or price_store()
+    failed = download_missing(store, yf_tickers, start_date, curr_date)
+    if failed:
+        print(f"Scoring {to_string(curr_date)} without {len(failed)} tickers that could not be fetched")
+    
+    print("Reading data from price store...")
+    data = store.read(yf_tickers, start_date, curr_date)
+    return Backtest(curr_date, extract_returns(yf_tickers, data, curr_date, end_date))
+
+# (start of the 12th month ago, last trading day of the previous month) for a rebalance date
+def window_of(curr_date):
+    last_day = (curr_date.replace(day=1) - timedelta(days=1)).replace(hour=23, minute=59, second=59) # last day of the previous month
+    end_date = to_datetimes(trading_calendar().as_of([last_day]))[0] or nearest_friday_of(last_day)
+    return window_start(curr_date), end_date
+
+def window_start(curr_date):
+    return (curr_date.replace(day=1) - relativedelta(months=13)).replace(day=1, hour=0, minute=0, second=0, microsecond=0) # Start of the 12th month ago
+
+# Download only the date ranges the store does not have yet. Tickers missing the
+# same range are grouped so that each distinct range is one concurrent fetch.
+# Returns {ticker: error} for tickers that could not be fetched.
+def download_missing(store, yf_tickers, start_date, end_date):
+    missing = store.missing_ranges(yf_tickers, start_date, end_date)
+    Trace.count("cache_hit_tickers", len(yf_tickers) - len(missing))
+    Trace.count("cache_miss_tickers", len(missing))
+    if not missing:
+        debug(f"Price store covers {len(yf_tickers)} tickers from {to_string(start_date)} to {to_string(end_date)}")
+        return {}
+    if offline:
+        print(f"  Offline mode: not fetching {len(missing)} tickers missing from the price store")
+        Trace.count("offline_refused_tickers", len(missing))
+        return {ticker: "offline mode" for ticker in missing}
+    
+    by_range = {}
+    for ticker, ranges in missing.items():
+        for date_range in ranges:
+            by_range.setdefault(date_range, []).append(ticker)
+    
+    failed = {}
+    holidays = read_holidays()
+    for (range_start, range_end), range_tickers in sorted(by_range.items()):
+        # Weekends and holidays have no bars, there is nothing to fetch
+        if len(business_sessions(range_start, range_end, holidays)) == 0:
+            store.mark_fetched(range_tickers, range_start, range_end)
+            continue
+        print(f"Fetching {len(range_tickers)} tickers from {to_string(range_start)} to {to_string(range_end)}")
+        with Trace.span("download", start_date=to_string(range_start), end_date=to_string(range_end), tickers=len(range_tickers)):
+            result = fetcher().fetch(range_tickers, range_start, range_end)
+            # Tickers whose chunk failed are not marked as fetched, so the next run retries them
+            store.write(result.data, [ticker for ticker in result.fetched_tickers(range_tickers) if ticker not in result.empty], range_start, range_end)
+            store.mark_empty(result.empty, range_start, range_end)
+        failed.update(result.failed)
+    
+    # New bars may add sessions the calendar has not seen yet
+    global _calendar
+    _calendar = None
+    return failed
+
+_calendar = None
+def trading_calendar():
+    global _calendar
+    if _calendar is None:
+        horizon = datetime.now() + timedelta(days=366)
+        _calendar = build_calendar(price_store().trading_days(), start_date="2000-01-01", end_date=horizon)
+        if _calendar.end is not None and _calendar.end < np.datetime64(horizon, "D"):
+            debug(f"Trading calendar ends on {_calendar.end}, extend nse_holidays.csv to cover later dates")
+    return _calendar
+
+# Offline mode never touches the network: tickers missing from the store are
+# reported as failed fetches. Also enabled with BACKTEST_OFFLINE=1.
+offline = os.environ.get("BACKTEST_OFFLINE", "") not in ("", "0")
+def set_offline(flag=True):
+    global offline
+    offline = flag
+
+# The fetch layer and providers (and through them pandas and yfinance) are only
+# imported once something actually has to be downloaded
+_fetcher = None
+def fetcher():
+    global _fetcher
+    if _fetcher is None:
+        from Providers import YahooProvider
+        from Fetcher import Fetcher
+        _fetcher = Fetcher(YahooProvider())
+    return _fetcher
+
+# Swap the data source, e.g. use_provider(LocalFileProvider("data/")) for tests and offline runs
+def use_provider(provider, **fetcher_options):
+    global _fetcher
+    from Fetcher import Fetcher
+    _fetcher = Fetcher(provider, **fetcher_options)
+
+_price_store = None
+def price_store():
+    global _price_store
+    if _price_store is None:
+        _price_store = PriceStore()
+        if _price_store.is_empty():
+            imported = import_legacy_cache(_price_store, window_start)
+            if imported > 0:
+                print(f"Imported {imported} legacy cache snapshots into the price store")
+    return _price_store
+
+_constituents = None
+def constituents():
+    global _constituents
+    if _constituents is None:
+        _constituents = ConstituentStore()
+    return _constituents
 
 def extract_returns(yf_tickers, data, curr_date, end_date):
-    results = []
-    try:
-        if data.empty:
-            print("No data retrieved for any of the tickers in the specified period.")
-            for ticker in yf_tickers:
-                results.append(empty_ticker_from(ticker))
-            return results
-        
-        # Get returns of past 12 month excluding the most recent month
-        for ticker in yf_tickers:
-            
-            if('Close', ticker) in data.columns:
-                ticker_data = data['Close'][ticker].dropna() # Drop NaNs if any
-            
-                if ticker_data.empty or len(ticker_data) < 2: # Need at least 2 points for a return
-                    debug(f"  Warning: Insufficient data for {ticker} to calculate return. Skipping.")
-                    results.append(empty_ticker_from(ticker))
-                    continue
-                    
-                # br()
-                # println(ticker_data)
-                beginning_price = ticker_data.iloc[0]
-                # ending_price = ticker_data.loc[to_string(end_date)]
-                # current_price = ticker_data.loc[to_string(curr_date)]
-                ending_price = safe_read(ticker, ticker_data, end_date)
-                current_price = safe_read(ticker, ticker_data, curr_date)
-                
-                price_return = int(((ending_price / beginning_price) - 1) * 100) # convert to simple int to readability
-                
-                results.append(Ticker(ticker, current_price, price_return))
-        
-            else:
-                print(f"  Warning: No 'Close' data found for {ticker} in the batch download. Skipping.")
-                results.append(empty_ticker_from(ticker))
-                
-    except Exception as e:
-        print(f"An error occurred during batch download or processing: {e}")
-        for ticker in yf_tickers:
-            results.append(empty_ticker_from(ticker))
+    with Trace.span("extract_returns", target_date=to_string(curr_date), tickers=len(yf_tickers)):
+        return _extract_returns(yf_tickers, data, curr_date, end_date)
+
+def _extract_returns(yf_tickers, data, curr_date, end_date):
+    dates, _, closes = close_panel(data, yf_tickers)
+    if len(dates) == 0:
+        print("No data retrieved for any of the tickers in the specified period.")
+        return [empty_ticker_from(ticker) for ticker in yf_tickers]
     
+    # Get returns of past 12 month excluding the most recent month
+    gains = window_returns(dates, closes, dates[:1], [end_date])[0]
+    prices = prices_as_of(dates, closes, [curr_date])[0]
+    return tickers_from(yf_tickers, gains, prices)
+
+# Download the union of all windows once and score every rebalance date in one pass.
+# With an index name the universe comes from the constituent history instead: only
+# tickers that were members at some point in the window are fetched, and each date
+# scores just the tickers that were members on that date.
+def backtests_for(tickers, rebalance_dates, store=None, index_name=None, factor="momentum_12_1"):
+    with Trace.span("backtests_for", dates=len(rebalance_dates), tickers=len(tickers), index=index_name, factor=factor):
+        return _backtests_for(tickers, rebalance_dates, store, index_name, factor)
+
+def _backtests_for(tickers, rebalance_dates, store, index_name, factor):
+    start_date = min(window_start(date) for date in rebalance_dates)
+    end_date = max(rebalance_dates)
+    point_in_time = index_name is not None and constituents().has_history(index_name)
+    if point_in_time:
+        tickers = constituents().ever_members(index_name, start_date, end_date)
+    yf_tickers = [f"{ticker}.NS" for ticker in tickers]
     
-    return results   
-
-def fetch_from_cache(target_date):
-    data_cache = f".cache/{target_date.strftime('%Y-%m-%d')}.parquet"
-    if os.path.exists(data_cache):
-        return pd.read_parquet(data_cache)
-    else:
-        return None
-
-def store_data_in_cache(target_date, data):
-    data_cache = f".cache/{target_date.strftime('%Y-%m-%d')}.parquet"
-    os.makedirs(".cache", exist_ok=True)
-    data.to_parquet(data_cache, index=True)
+    store = store or price_store()
+    failed = download_missing(store, yf_tickers, start_date, end_date)
+    if failed:
+        print(f"Scoring without {len(failed)} tickers that could not be fetched")
     
-# TODO: Improve logic    
-def safe_read(ticker_name, ticker_data, date, retry=True):
-    try:
-        return ticker_data.loc[to_string(date)]
-    except Exception as e: 
-        debug(f"Error while trying to fetch data for {ticker_name} for date: {to_string(date)}")
-        if retry == True:
-            next_day = next_day_of(date)
-            debug(f"Taking holidays into consideration, picking next date: {to_string(next_day)}")        
-            return safe_read(ticker_name, ticker_data, next_day, False)
+    dates, _, closes = current_panel(store).window(yf_tickers, start_date, end_date)
+    with Trace.span("score", dates=len(rebalance_dates), tickers=len(yf_tickers)):
+        if factor == "momentum_12_1":
+            scores = momentum_scores(dates, closes, rebalance_dates)
+        else:
+            from Factors import factor_scores
+            scores = factor_scores(dates, closes, rebalance_dates, [factor])[factor]
+        scores = np.where(eligible_tickers(store, yf_tickers, rebalance_dates), scores, np.nan)
+        prices = prices_as_of(dates, closes, rebalance_dates)
+        if point_in_time:
+            members = constituents().masks(index_name, rebalance_dates, tickers)
+            Trace.count("tickers_outside_universe", int((~members).sum()))
+            scores[~members] = np.nan
+    return [Backtest(date, tickers_from(yf_tickers, scores[i], prices[i])) for (i, date) in enumerate(rebalance_dates)]
+
+# Tickers with clean enough data over the 12-1 window of each rebalance date,
+# from the panel's quality index (see Quality.py)
+def eligible_tickers(store, yf_tickers, rebalance_dates, **rules):
+    quality = current_panel(store).quality()
+    if quality is None:
+        return np.ones((len(rebalance_dates), len(yf_tickers)), dtype=bool)
+    eligible = quality.eligible_for(yf_tickers, rebalance_dates, **rules)
+    Trace.count("tickers_ineligible", int((~eligible).sum()))
+    return eligible
+
+# (dates, yf_tickers, closes) for the tickers between two dates, fetching what the store misses
+def price_panel(tickers, start_date, end_date, store=None):
+    yf_tickers = [f"{ticker}.NS" for ticker in tickers]
+    store = store or price_store()
+    failed = download_missing(store, yf_tickers, start_date, end_date)
+    if failed:
+        print(f"Building price panel without {len(failed)} tickers that could not be fetched")
+    return current_panel(store).window(yf_tickers, start_date, end_date)
+
+def tickers_from(yf_tickers, gains, prices):
+    results = []
+    for (ticker, gain, price) in zip(yf_tickers, gains, prices):
+        if np.isnan(gain):
+            Trace.count("tickers_skipped_insufficient_data")
+            debug(f"  Warning: Insufficient data for {ticker} to calculate return. Skipping.")
+            results.append(empty_ticker_from(ticker))
         else:
-            debug(ticker_data)    
-            return 0
\ No newline at end of file
+            results.append(Ticker(ticker, price, float(gain * 100)))
+    return results